@@ -0,0 +1,150 @@
+"""asyncio front end to the organizer engine, for embedding in services.
+
+    import aio
+
+    result = await aio.organize("/srv/ingest", "/etc/organizer/extension_map.txt")
+
+    run = aio.start("/srv/ingest", rules, OrganizeOptions(recursive=True))
+    async for event in run:
+        log.info(event.format())
+    result = await run
+
+The engine is blocking, so each run executes on a bounded thread pool
+(MAX_RUNS threads shared by all runs unless an executor is passed in) and
+the event loop only receives throttled ProgressEvents. Cancelling the task
+that awaits a run cancels the run the same way RunControl.cancel does:
+the file being moved is finished, so every file is either at its source or
+at its destination, and only then is CancelledError raised. The partial
+OrganizeResult is left on `run.result`.
+"""
+import asyncio
+import functools
+import inspect
+
+import organizer
+from organizer import RunControl
+
+# Runs that execute at once on the shared executor; more wait their turn
+MAX_RUNS = 4
+# Progress events kept for a slow consumer; the oldest are dropped first
+EVENT_BUFFER = 64
+
+_executor = None
+_DONE = object()
+
+
+def _default_executor():
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(max_workers=MAX_RUNS, thread_name_prefix="organizer")
+    return _executor
+
+
+class OrganizeRun:
+    """A running organize: await it for the OrganizeResult and iterate it
+    with `async for` for ProgressEvents. Create it with start().
+    """
+
+    def __init__(self, root, rules=None, options=None, executor=None):
+        loop = asyncio.get_running_loop()
+        self.root = root
+        self.control = RunControl()
+        self.result = None
+        self._events = asyncio.Queue(maxsize=EVENT_BUFFER)
+
+        def on_progress(event):
+            # Called on the engine's thread
+            loop.call_soon_threadsafe(self._push, event)
+
+        call = functools.partial(organizer.organize, root, rules, options,
+                                 on_progress, self.control)
+        self._task = loop.create_task(self._run(loop, executor or _default_executor(), call))
+        self._task.add_done_callback(lambda task: self._push(_DONE))
+
+    def _push(self, item):
+        if self._events.full():
+            self._events.get_nowait()
+        self._events.put_nowait(item)
+
+    async def _run(self, loop, executor, call):
+        future = loop.run_in_executor(executor, call)
+        try:
+            self.result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self.control.cancel()
+            # Let the file being moved finish before giving up, even if
+            # cancelled again meanwhile
+            while not future.done():
+                try:
+                    await asyncio.wait([future])
+                except asyncio.CancelledError:
+                    pass
+            if not future.cancelled() and future.exception() is None:
+                self.result = future.result()
+            raise
+        return self.result
+
+    def __await__(self):
+        return self._task.__await__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._events.get()
+        if item is _DONE:
+            # Leave it there so iterating again also stops
+            self._events.put_nowait(_DONE)
+            raise StopAsyncIteration
+        return item
+
+    def done(self):
+        return self._task.done()
+
+    async def settled(self):
+        """Wait until the run has stopped, without raising its outcome"""
+        await asyncio.wait([self._task])
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    def cancel(self):
+        """Cancel the run; awaiting it then raises CancelledError once the
+        file being moved is finished
+        """
+        self._task.cancel()
+
+
+def start(root, rules=None, options=None, executor=None):
+    """Start organizing `root` and return its OrganizeRun.
+
+    `rules` is an extension map path (None for the default map), a plain
+    extension dict or an ExtensionIndex; `options` an OrganizeOptions.
+    Must be called from a running event loop.
+    """
+    return OrganizeRun(root, rules, options, executor)
+
+
+async def organize(root, rules=None, options=None, on_progress=None, executor=None):
+    """Organize `root` without blocking the event loop; returns the
+    OrganizeResult. `on_progress(event)` may be a plain function or a
+    coroutine function.
+    """
+    run = start(root, rules, options, executor)
+    try:
+        if on_progress is not None:
+            async for event in run:
+                value = on_progress(event)
+                if inspect.isawaitable(value):
+                    await value
+        return await run
+    except BaseException:
+        # Cancelled, or on_progress failed: stop the run as well
+        if not run.done():
+            run.cancel()
+            await run.settled()
+        raise
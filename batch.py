@@ -0,0 +1,249 @@
+"""Organize many folders in one batch.
+
+Folders come from the command line, a drag-and-drop or a manifest file and
+are run concurrently by a small scheduler. Concurrency is limited per
+physical disk: on Linux a partition is traced back to its whole disk
+through /sys/dev/block, elsewhere the filesystem's st_dev stands in for it.
+So two folders on the same spinning disk are organized one after the other
+(with the default `per_device=1`) while folders on other disks run next to
+them. Folders organized into the same destination root always take turns,
+since their files may compete for the same names.
+
+Each folder is a normal organize() run with its own journal; the results
+are combined into one BatchReport.
+"""
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from organizer import OrganizeOptions, RunControl, organize
+
+
+def read_manifest(path):
+    """Folders listed in a manifest file, one per line.
+
+    Blank lines and lines starting with # are ignored; relative paths are
+    relative to the manifest. `path` "-" reads standard input.
+    """
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+        base = os.getcwd()
+    else:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        base = os.path.dirname(os.path.abspath(path))
+    folders = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            folders.append(os.path.join(base, os.path.expanduser(line)))
+    return folders
+
+
+def physical_device(path):
+    """Key of the disk holding `path`: the whole-disk block device on Linux,
+    the filesystem's st_dev elsewhere (or for network and virtual filesystems).
+    """
+    dev = os.stat(path).st_dev
+    sys_path = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+    try:
+        real = os.path.realpath(sys_path)
+    except OSError:
+        return dev
+    if not os.path.exists(real):
+        return dev
+    if os.path.exists(os.path.join(real, "partition")):
+        # .../block/sda/sda1 -> the disk is the parent
+        real = os.path.dirname(real)
+    return real
+
+
+class FolderResult:
+    """How one folder of a batch went: its OrganizeResult, or the error that
+    stopped it before it could run
+    """
+
+    def __init__(self, folder, result=None, error=None):
+        self.folder = folder
+        self.result = result
+        self.error = error
+
+
+class BatchReport:
+    """Per-folder results of a batch plus their totals"""
+
+    def __init__(self, folders):
+        self.folders = [FolderResult(folder) for folder in folders]
+        self.elapsed = 0.0
+
+    def _results(self):
+        return [f.result for f in self.folders if f.result is not None]
+
+    @property
+    def files_moved(self):
+        return sum(r.files_moved for r in self._results())
+
+    @property
+    def files_skipped(self):
+        return sum(r.files_skipped for r in self._results())
+
+    @property
+    def errors(self):
+        errors = [(f.folder, f.error) for f in self.folders if f.error is not None]
+        for result in self._results():
+            errors.extend(result.errors)
+        return errors
+
+    @property
+    def error_count(self):
+        return (sum(1 for f in self.folders if f.error is not None)
+                + sum(r.error_count for r in self._results()))
+
+    @property
+    def cancelled(self):
+        return any(r.cancelled for r in self._results()) or any(
+            f.result is None and f.error is None for f in self.folders)
+
+    def summary(self):
+        results = self._results()
+        done = sum(1 for r in results if not r.cancelled)
+        failed = sum(1 for f in self.folders if f.error is not None)
+        text = (f"{done} of {len(self.folders)} folders organized, "
+                f"{self.files_moved} moved, {self.files_skipped} skipped")
+        renamed = sum(r.renamed for r in results)
+        duplicates = sum(r.duplicates for r in results)
+        if renamed:
+            text += f", {renamed} renamed"
+        if duplicates:
+            text += f", {duplicates} duplicates"
+        if failed:
+            text += f", {failed} failed"
+        text += f" in {self.elapsed:.2f}s"
+        if self.cancelled:
+            text += ", cancelled"
+        return text
+
+    def as_dict(self):
+        folders = []
+        for f in self.folders:
+            entry = {"folder": f.folder}
+            if f.error is not None:
+                entry["error"] = f.error
+            elif f.result is None:
+                entry["status"] = "not started"
+            else:
+                r = f.result
+                entry.update(status="cancelled" if r.cancelled else "done",
+                             moved=r.files_moved, skipped=r.files_skipped,
+                             renamed=r.renamed, duplicates=r.duplicates,
+                             errors=r.error_count, elapsed=round(r.elapsed, 3))
+                if r.stats is not None:
+                    entry["stats"] = r.stats.as_dict()
+            folders.append(entry)
+        return {"folders": folders, "moved": self.files_moved,
+                "skipped": self.files_skipped, "errors": self.error_count,
+                "elapsed": round(self.elapsed, 3)}
+
+
+def _resources(folder, options):
+    """The scheduling resources a run over `folder` holds while it runs"""
+    keys = [("device", physical_device(folder))]
+    if options.dest_root:
+        keys.append(("dest", os.path.realpath(options.dest_root)))
+    return keys
+
+
+def _unique_folders(folders, recursive, report_error):
+    """Drop repeated folders and, for recursive runs, folders inside another
+    queued folder, which that folder's run already covers
+    """
+    seen = {}
+    for folder in folders:
+        real = os.path.realpath(folder)
+        if real not in seen:
+            seen[real] = folder
+    unique = []
+    for real, folder in seen.items():
+        parent = None
+        if recursive:
+            parent = next((p for p in seen if p != real
+                           and real.startswith(p.rstrip(os.sep) + os.sep)), None)
+        if parent is None:
+            unique.append(folder)
+        else:
+            report_error(folder, f"inside {seen[parent]}, which is organized recursively")
+    return unique
+
+
+def organize_many(folders, ext_map_path=None, options=None, per_device=1, max_workers=None,
+                  on_progress=None, control=None, on_folder_done=None):
+    """Organize each of `folders` and return a BatchReport.
+
+    At most `per_device` folders on the same disk, and `max_workers`
+    folders overall (default: no limit beyond the disks), run at once.
+    `on_progress(folder, event)` gets each folder's ProgressEvents and
+    `on_folder_done(folder_result)` is called as each folder finishes; both
+    are called from the folder's worker thread. A RunControl in `control`
+    pauses or cancels every run, and folders not started yet stay put.
+    """
+    if per_device < 1:
+        raise ValueError("per_device must be at least 1")
+    options = options or OrganizeOptions()
+    control = control or RunControl()
+    start = time.perf_counter()
+    errors = []
+    folders = _unique_folders(folders, options.recursive,
+                              lambda folder, error: errors.append((folder, error)))
+    report = BatchReport(folders + [folder for folder, _ in errors])
+    entries = {f.folder: f for f in report.folders}
+    pending = []
+    for folder in folders:
+        try:
+            pending.append((folder, _resources(folder, options)))
+        except OSError as e:
+            errors.append((folder, str(e)))
+    for folder, error in errors:
+        entries[folder].error = error
+        if on_folder_done is not None:
+            on_folder_done(entries[folder])
+
+    def run(folder):
+        entry = entries[folder]
+        progress = None
+        if on_progress is not None:
+            progress = lambda event: on_progress(folder, event)
+        try:
+            entry.result = organize(folder, ext_map_path, options, progress, control)
+        except Exception as e:
+            entry.error = str(e)
+        if on_folder_done is not None:
+            on_folder_done(entry)
+
+    in_use = {}
+    running = {}
+    limit = lambda key: 1 if key[0] == "dest" else per_device
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(pending), 1)) as pool:
+        while pending or running:
+            if control.cancelled:
+                pending.clear()
+            # Start every queued folder whose disks have a free slot, in order
+            for job in list(pending):
+                if max_workers is not None and len(running) >= max_workers:
+                    break
+                folder, keys = job
+                if all(in_use.get(key, 0) < limit(key) for key in keys):
+                    pending.remove(job)
+                    for key in keys:
+                        in_use[key] = in_use.get(key, 0) + 1
+                    running[pool.submit(run, folder)] = keys
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                for key in running.pop(future):
+                    in_use[key] -= 1
+                future.result()
+
+    report.elapsed = time.perf_counter() - start
+    return report
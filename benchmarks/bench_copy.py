@@ -0,0 +1,63 @@
+"""Cross-device move throughput: shutil.move versus transfer.Mover.
+
+Writes a few large files of random data into --src-dir, moves them to
+--dest-dir with each method and prints MB/s. Point the two directories at
+different filesystems (e.g. /dev/shm and a disk) to measure the copy path;
+on the same filesystem both are plain renames.
+
+    python benchmarks/bench_copy.py --src-dir /dev/shm --dest-dir /var/tmp --mb 256
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transfer
+
+
+def make_files(folder, count, size):
+    block = os.urandom(1024 * 1024)
+    for i in range(count):
+        with open(os.path.join(folder, f"video_{i}.mp4"), "wb") as f:
+            for _ in range(size // len(block)):
+                f.write(block)
+
+
+def timed(label, move, src, dest, count, size):
+    make_files(src, count, size)
+    start = time.perf_counter()
+    for name in os.listdir(src):
+        move(os.path.join(src, name), os.path.join(dest, name))
+    elapsed = time.perf_counter() - start
+    for name in os.listdir(dest):
+        os.unlink(os.path.join(dest, name))
+    print(f"{label:<16} {count * size / elapsed / 1e6:>10,.0f} MB/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--src-dir", default=None)
+    parser.add_argument("--dest-dir", default=None)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--mb", type=int, default=256, help="size of each file")
+    args = parser.parse_args(argv)
+
+    src = tempfile.mkdtemp(prefix="bench_copy_src_", dir=args.src_dir)
+    dest = tempfile.mkdtemp(prefix="bench_copy_dest_", dir=args.dest_dir)
+    try:
+        same = os.stat(src).st_dev == os.stat(dest).st_dev
+        print(f"{args.files} x {args.mb} MB, {'same device' if same else 'cross-device'}")
+        size = args.mb * 1024 * 1024
+        timed("shutil.move", shutil.move, src, dest, args.files, size)
+        timed("transfer.Mover", transfer.Mover().move, src, dest, args.files, size)
+    finally:
+        shutil.rmtree(src, ignore_errors=True)
+        shutil.rmtree(dest, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Lookups per second of the compiled extension index on a synthetic corpus.
+
+Compares the original splitext + dict lookup with ExtensionIndex.classify,
+with and without a handful of pattern rules. Only file names are generated;
+nothing is written to disk.
+
+    python benchmarks/bench_lookup.py --names 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import organizer
+from extension_index import ExtensionIndex
+
+PATTERN_RULES = """
+glob:IMG_*=Camera
+glob:Screenshot*=Screenshots
+re:^\\d{8}_report=Reports
+"""
+
+
+def make_names(n, ext_map, seed=1):
+    rng = random.Random(seed)
+    extensions = [ext.lower() for ext in ext_map] + ["tar.gz", "unknownext", ""]
+    names = []
+    for i in range(n):
+        ext = rng.choice(extensions)
+        stem = f"{rng.choice(['IMG_', 'doc', 'Screenshot ', '20240101_report', 'x'])}{i}"
+        names.append(f"{stem}.{ext}" if ext else stem)
+    return names
+
+
+def legacy_classify(filename, ext_map):
+    _, extension = os.path.splitext(filename)
+    extension = extension[1:].upper()
+    if not extension:
+        return None
+    return ext_map.get(extension, f"Other_{extension}")
+
+
+def timed(label, fn, names):
+    start = time.perf_counter()
+    for name in names:
+        fn(name)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(names) / elapsed:>12,.0f} lookups/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    ext_map = organizer.parse_extension_map(organizer.DEFAULT_EXTENSION_MAP)
+    names = make_names(args.names, ext_map)
+    plain = ExtensionIndex.from_text(organizer.DEFAULT_EXTENSION_MAP)
+    with_patterns = ExtensionIndex.from_text(organizer.DEFAULT_EXTENSION_MAP + PATTERN_RULES)
+
+    print(f"{len(names):,} names")
+    timed("splitext + dict (before)", lambda n: legacy_classify(n, ext_map), names)
+    timed("index, suffixes only", plain.classify, names)
+    timed("index, suffixes + patterns", with_patterns.classify, names)
+
+
+if __name__ == "__main__":
+    main()
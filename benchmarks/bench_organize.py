@@ -0,0 +1,195 @@
+"""End-to-end benchmark of the organize path on synthetic folders.
+
+For each fixture size a throwaway folder is filled with empty files whose
+extensions are drawn from DEFAULT_EXTENSION_MAP, plus unknown extensions,
+files without one and very long names. Then these phases are timed
+separately:
+
+    load_map   parse extension_map.txt and compile it (cold, then cached)
+    scan       one scandir pass over the folder
+    classify   ExtensionIndex.classify on every name
+    plan       scan + classify + MoveOp creation, as in a dry run
+    move       executing that plan (destination folders and renames)
+
+Each size runs in its own child process so the reported peak RSS belongs
+to that size alone. Results are printed and, with --out, saved as JSON;
+--compare prints the change against an earlier JSON file.
+
+    python benchmarks/bench_organize.py --sizes 1k,100k --dir /dev/shm --out after.json
+    python benchmarks/bench_organize.py --sizes 1k,100k --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import organizer
+
+UNKNOWN_EXTENSIONS = ["xyz", "bak2", "part", "dat", "tmp1"]
+PHASES = ["load_map", "scan", "classify", "plan", "move"]
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def make_fixture(root, n_files, seed=1):
+    rng = random.Random(seed)
+    known = [ext.lower() for ext in organizer.parse_extension_map(organizer.DEFAULT_EXTENSION_MAP)]
+    for i in range(n_files):
+        roll = rng.random()
+        if roll < 0.80:
+            ext = rng.choice(known)
+        elif roll < 0.95:
+            ext = rng.choice(UNKNOWN_EXTENSIONS)
+        else:
+            ext = ""
+        stem = f"file_{i:07d}"
+        if rng.random() < 0.05:
+            # Long names, close to the usual 255-byte limit
+            stem += "_" + "x" * (230 - len(stem))
+        name = f"{stem}.{ext}" if ext else stem
+        open(os.path.join(root, name), "wb").close()
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KB, or None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return time.perf_counter() - start, value
+
+
+def run_one(n_files, base_dir, workers):
+    """Benchmark one fixture size in this process; returns the result dict"""
+    root = tempfile.mkdtemp(prefix="organizer-bench-", dir=base_dir)
+    map_path = root + "-map.txt"
+    phases = {}
+    try:
+        with open(map_path, "w", encoding="utf-8") as f:
+            f.write(organizer.DEFAULT_EXTENSION_MAP)
+        fixture_seconds, _ = timed(lambda: make_fixture(root, n_files))
+
+        cold, index = timed(lambda: organizer.load_rules(map_path))
+        cached, _ = timed(lambda: organizer.load_rules(map_path))
+        phases["load_map"] = {"seconds": cold, "cached_seconds": cached}
+
+        seconds, names = timed(lambda: [entry.name for entry in organizer.scan_folder(root)])
+        phases["scan"] = {"seconds": seconds}
+
+        classify = index.classify
+        seconds, _ = timed(lambda: [classify(name) for name in names])
+        phases["classify"] = {"seconds": seconds}
+        del names
+
+        seconds, plan = timed(lambda: organizer.plan_organize(root, index))
+        phases["plan"] = {"seconds": seconds}
+
+        seconds, result = timed(lambda: organizer.execute_plan(plan, workers=workers))
+        phases["move"] = {"seconds": seconds, "moved": result.files_moved,
+                          "errors": len(result.errors)}
+        del plan
+
+        for name, phase in phases.items():
+            if name != "load_map":
+                phase["files_per_second"] = n_files / phase["seconds"] if phase["seconds"] else None
+        return {"files": n_files, "workers": workers, "fixture_seconds": fixture_seconds,
+                "phases": phases, "peak_rss_kb": peak_rss_kb()}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        try:
+            os.unlink(map_path)
+        except OSError:
+            pass
+
+
+def run_in_child(n_files, base_dir, workers):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", str(n_files),
+           "--workers", str(workers)]
+    if base_dir:
+        cmd += ["--dir", base_dir]
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(out)
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              check=True, universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result, baseline=None):
+    rss = result["peak_rss_kb"]
+    print(f"{result['files']:,} files (peak RSS {rss / 1024:.0f} MB)" if rss is not None
+          else f"{result['files']:,} files")
+    for name in PHASES:
+        phase = result["phases"][name]
+        line = f"  {name:<10} {phase['seconds'] * 1000:>10.1f} ms"
+        if phase.get("files_per_second"):
+            line += f"  {phase['files_per_second']:>12,.0f} files/s"
+        if baseline is not None and baseline["phases"].get(name, {}).get("seconds"):
+            change = phase["seconds"] / baseline["phases"][name]["seconds"] - 1
+            line += f"  {change:+.0%} vs baseline"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1k,100k",
+                        help="comma-separated fixture sizes, e.g. 1k,100k,1m (default: 1k,100k)")
+    parser.add_argument("--dir", default=None,
+                        help="where to build fixtures (default: the system temp dir)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--out", metavar="PATH", help="save the results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="earlier JSON results to compare with")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        json.dump(run_one(args.child, args.dir, args.workers), sys.stdout)
+        return
+
+    baselines = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baselines = {r["files"]: r for r in json.load(f)["results"]}
+
+    results = []
+    for size in args.sizes.split(","):
+        result = run_in_child(parse_size(size), args.dir, args.workers)
+        print_result(result, baselines.get(result["files"]))
+        results.append(result)
+
+    if args.out:
+        report = {"version": git_version(), "python": platform.python_version(),
+                  "platform": platform.platform(),
+                  "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compare the old listdir/isdir/exists scan with the scandir-based planner.
+
+Builds a throwaway folder of synthetic files, runs the scan + destination
+folder phase both ways (no files are moved) and prints wall time and the
+number of filesystem calls made from Python per 10k files.
+
+    python benchmarks/bench_scan.py --files 10000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import organizer
+
+EXTENSIONS = ["pdf", "jpg", "png", "mp4", "mp3", "zip", "docx", "txt", "xyz", ""]
+
+# os-level calls that turn into stat/listing/mkdir syscalls
+COUNTED_CALLS = ["stat", "lstat", "listdir", "scandir", "mkdir"]
+
+
+class SyscallCounter:
+    """Wrap the os functions above and count how often they are called"""
+
+    def __init__(self):
+        self.count = 0
+        self._originals = {}
+
+    def __enter__(self):
+        for name in COUNTED_CALLS:
+            original = getattr(os, name)
+            self._originals[name] = original
+            setattr(os, name, self._wrap(original))
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self._originals.items():
+            setattr(os, name, original)
+
+    def _wrap(self, fn):
+        def counted(*args, **kwargs):
+            self.count += 1
+            return fn(*args, **kwargs)
+        return counted
+
+
+def make_fixture(root, n_files):
+    for i in range(n_files):
+        ext = EXTENSIONS[i % len(EXTENSIONS)]
+        name = f"file_{i:07d}.{ext}" if ext else f"file_{i:07d}"
+        open(os.path.join(root, name), "w").close()
+    os.mkdir(os.path.join(root, "already_here"))
+
+
+def legacy_scan(folder, ext_map):
+    """The pre-scandir loop from _organize_files_thread, minus the moves"""
+    planned = 0
+    for filename in os.listdir(folder):
+        file_path = os.path.join(folder, filename)
+        if os.path.isdir(file_path):
+            continue
+        _, extension = os.path.splitext(filename)
+        extension = extension[1:].upper()
+        if not extension:
+            continue
+        folder_name = ext_map.get(extension, f"Other_{extension}")
+        dest_folder = os.path.join(folder, folder_name)
+        if not os.path.exists(dest_folder):
+            os.makedirs(dest_folder)
+        planned += 1
+    return planned
+
+
+def scandir_scan(folder, ext_map):
+    plan = organizer.plan_organize(folder, ext_map)
+    for op in plan.moves:
+        plan.folders.ensure(op.dest_folder)
+    return len(plan.moves)
+
+
+def run(label, scan, n_files, ext_map):
+    root = tempfile.mkdtemp(prefix="organizer-bench-")
+    try:
+        make_fixture(root, n_files)
+        with SyscallCounter() as counter:
+            start = time.perf_counter()
+            scan(root, ext_map)
+            elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    per_10k = 10000 / n_files
+    print(f"{label:<10} {counter.count * per_10k:>12.0f} calls/10k  "
+          f"{elapsed * per_10k * 1000:>10.1f} ms/10k")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    ext_map = organizer.parse_extension_map(organizer.DEFAULT_EXTENSION_MAP)
+
+    print(f"{args.files} files")
+    run("before", legacy_scan, args.files, ext_map)
+    run("after", scandir_scan, args.files, ext_map)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Cold-start benchmark of the GUI: import time and time to first frame.
+
+Launches the app (python main.py, or a PyInstaller build with --exe) with
+ORGANIZER_STARTUP_TRACE naming a file it writes its own timings to (a
+windowed build has no stderr), and ORGANIZER_STARTUP_EXIT so it closes
+itself once the window is fully built. For each run it records:
+
+    launch        from starting the process to the first frame being drawn,
+                  including the interpreter (or the exe's bootloader/unpack)
+    imports       main.py's module imports, measured inside the app
+    first_frame   from main.py starting to run until the window is drawn
+    ready         ... until the secondary widgets and drag & drop are set up
+
+Medians and minimums are printed. --budget fails the run (exit status 1)
+when the median launch time is over the given milliseconds, and for the
+python build --imports lists the slowest modules from -X importtime.
+
+    python benchmarks/bench_startup.py --runs 10 --budget 1500
+    python benchmarks/bench_startup.py --exe "dist/FolderOrganizer/FolderOrganizer.exe"
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+METRICS = ["launch", "imports", "first_frame", "ready"]
+
+_TRACE = re.compile(r"startup imports=([\d.]+)ms (\w+)=([\d.]+)ms")
+# How often the trace file is checked for the first frame
+POLL_INTERVAL = 0.002
+
+
+def _read_trace(path):
+    """{stage: (imports ms, stage ms)} reported so far in the trace file"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return {}
+    return {stage: (float(imports), float(ms))
+            for imports, stage, ms in _TRACE.findall(text)}
+
+
+def run_once(command, timeout):
+    """Timings in ms of one launch of `command`"""
+    fd, trace = tempfile.mkstemp(prefix="startup-", suffix=".log")
+    os.close(fd)
+    env = dict(os.environ, ORGANIZER_STARTUP_TRACE=trace, ORGANIZER_STARTUP_EXIT="1")
+    timings = {}
+    try:
+        start = time.perf_counter()
+        proc = subprocess.Popen(command, cwd=REPO, env=env, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
+        deadline = start + timeout
+        # Watch for the first frame while the app runs, to time the launch
+        while "launch" not in timings:
+            if "first_frame" in _read_trace(trace):
+                timings["launch"] = (time.perf_counter() - start) * 1000
+            elif proc.poll() is not None or time.perf_counter() > deadline:
+                break
+            else:
+                time.sleep(POLL_INTERVAL)
+        try:
+            proc.wait(timeout=max(deadline - time.perf_counter(), 0))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise SystemExit(f"{command[0]} did not close within {timeout}s")
+        stages = _read_trace(trace)
+    finally:
+        os.unlink(trace)
+    if "ready" not in stages:
+        raise SystemExit(f"{' '.join(command)} exited with status {proc.returncode} "
+                         "without reporting its startup; is a display available?")
+    for stage, (imports, ms) in stages.items():
+        timings["imports"] = imports
+        timings[stage] = ms
+    return timings
+
+
+def slowest_imports(count):
+    """(cumulative ms, module) of the slowest imports of main.py"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=REPO, capture_output=True, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            modules.append((int(parts[1]) / 1000, parts[2].strip()))
+    modules.sort(reverse=True)
+    return modules[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--exe", metavar="PATH", help="a built executable to launch instead of main.py")
+    parser.add_argument("--budget", type=float, metavar="MS",
+                        help="fail if the median launch time is over this many milliseconds")
+    parser.add_argument("--imports", type=int, default=10, metavar="N",
+                        help="list the N slowest imports (python build only, 0 to skip)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--out", metavar="PATH", help="save the results as JSON")
+    args = parser.parse_args(argv)
+
+    command = [os.path.abspath(args.exe)] if args.exe else [sys.executable, "main.py"]
+    runs = [run_once(command, args.timeout) for _ in range(args.runs)]
+
+    summary = {}
+    for metric in METRICS:
+        values = [run[metric] for run in runs]
+        summary[metric] = {"median": round(statistics.median(values), 1),
+                           "min": round(min(values), 1)}
+        print(f"{metric:<12} median {summary[metric]['median']:8.1f} ms   "
+              f"min {summary[metric]['min']:8.1f} ms")
+
+    modules = []
+    if args.imports and not args.exe:
+        modules = slowest_imports(args.imports)
+        print("\nslowest imports (cumulative):")
+        for ms, name in modules:
+            print(f"  {ms:8.1f} ms  {name}")
+
+    if args.out:
+        report = {"command": command, "python": platform.python_version(),
+                  "platform": platform.platform(),
+                  "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "runs": runs,
+                  "summary": summary, "imports": modules}
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.budget is not None and summary["launch"]["median"] > args.budget:
+        print(f"\nover budget: median launch {summary['launch']['median']:.1f} ms "
+              f"> {args.budget:.0f} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""Year/month folders for photos and videos, by when they were taken.
+
+Files the map sends to an Images/ or Videos/ folder get a YYYY/MM subfolder
+from the capture date stored in the file itself, not the filesystem mtime
+(which changes on every copy). Only header bytes are read, with the
+standard library alone:
+
+  * JPEG: the EXIF block in the APP1 segment;
+  * TIFF and TIFF-based raw formats (DNG, CR2, NEF, ARW...): the EXIF IFD;
+  * HEIC/HEIF: the Exif item, found through the meta box's iinf and iloc;
+  * MP4/MOV/3GP: the creation time in the movie header (moov/mvhd), found by
+    hopping from box header to box header, so a moov at the end of a large
+    file costs a few seeks.
+
+EXIF's DateTimeOriginal wins over CreateDate, which wins over the plain
+DateTime tag. Files with no usable date stay in their category folder.
+
+Headers are read in batches on a thread pool, and results are cached in
+<root>/.organizer/capture-dates.sqlite by (inode, size, mtime), so re-runs
+over large photo libraries skip the parsing.
+"""
+import os
+import struct
+import time
+
+BATCH_SIZE = 256
+CACHE_NAME = "capture-dates.sqlite"
+DATED_CATEGORIES = ("Images", "Videos")
+# Limits on untrusted counts, so a corrupt file can't make a parser spin
+MAX_BOXES = 4096
+MAX_IFD_ENTRIES = 1024
+
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_CREATE_DATE = 0x9004
+# Seconds from the QuickTime epoch (1904-01-01) to the Unix one
+MAC_EPOCH_OFFSET = 2082844800
+HEIF_BRANDS = {b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"mif1", b"msf1", b"avif"}
+
+
+def is_dated_category(folder):
+    """Whether files in this map folder get year/month subfolders"""
+    return folder is not None and folder.replace("\\", "/").split("/", 1)[0] in DATED_CATEGORIES
+
+
+def _file_reader(f, base=0):
+    def read(offset, n):
+        f.seek(base + offset)
+        return f.read(n)
+    return read
+
+
+def _bytes_reader(data):
+    return lambda offset, n: data[offset:offset + n]
+
+
+def _exif_date(text):
+    """(year, month) from an EXIF "YYYY:MM:DD HH:MM:SS" value, or None"""
+    try:
+        year, month = int(text[0:4]), int(text[5:7])
+    except ValueError:
+        return None
+    if 1900 <= year <= 2200 and 1 <= month <= 12:
+        return year, month
+    return None
+
+
+def _ifd(read, endian, offset):
+    """{tag: (type, count, raw 4-byte value)} of the IFD at `offset`"""
+    head = read(offset, 2)
+    if len(head) < 2:
+        return {}
+    count = min(struct.unpack(endian + "H", head)[0], MAX_IFD_ENTRIES)
+    data = read(offset + 2, count * 12)
+    entries = {}
+    for i in range(len(data) // 12):
+        tag, kind, n = struct.unpack_from(endian + "HHI", data, i * 12)
+        entries[tag] = (kind, n, data[i * 12 + 8:i * 12 + 12])
+    return entries
+
+
+def _ascii(read, endian, entry):
+    kind, count, raw = entry
+    if kind != 2:
+        return None
+    value = raw[:count] if count <= 4 else read(struct.unpack(endian + "I", raw)[0], count)
+    return value.split(b"\0", 1)[0].decode("ascii", "replace")
+
+
+def tiff_date(read):
+    """Capture (year, month) from a TIFF structure read through `read(offset, n)`"""
+    head = read(0, 8)
+    if head[:2] == b"II":
+        endian = "<"
+    elif head[:2] == b"MM":
+        endian = ">"
+    else:
+        return None
+    if len(head) < 8 or struct.unpack(endian + "H", head[2:4])[0] != 42:
+        return None
+    ifd0 = _ifd(read, endian, struct.unpack(endian + "I", head[4:8])[0])
+    exif = ifd0.get(TAG_EXIF_IFD)
+    if exif is not None:
+        entries = _ifd(read, endian, struct.unpack(endian + "I", exif[2])[0])
+        for tag in (TAG_DATETIME_ORIGINAL, TAG_CREATE_DATE):
+            if tag in entries:
+                date = _exif_date(_ascii(read, endian, entries[tag]) or "")
+                if date is not None:
+                    return date
+    if TAG_DATETIME in ifd0:
+        return _exif_date(_ascii(read, endian, ifd0[TAG_DATETIME]) or "")
+    return None
+
+
+def jpeg_date(f):
+    f.seek(2)
+    while True:
+        marker = f.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return None
+        kind = marker[1]
+        length = struct.unpack(">H", marker[2:4])[0]
+        if kind == 0xE1:
+            data = f.read(length - 2)
+            if data.startswith(b"Exif\0\0"):
+                return tiff_date(_bytes_reader(data[6:]))
+        elif kind in (0xD9, 0xDA):
+            # End of image, or start of the compressed data: no EXIF
+            return None
+        else:
+            f.seek(length - 2, 1)
+
+
+def _boxes(read, start, end):
+    """(type, payload offset, box end) of the ISO-BMFF boxes in [start, end)"""
+    offset = start
+    for _ in range(MAX_BOXES):
+        if end is not None and offset + 8 > end:
+            return
+        head = read(offset, 16)
+        if len(head) < 8:
+            return
+        size, kind = struct.unpack(">I4s", head[:8])
+        payload = offset + 8
+        if size == 1:
+            if len(head) < 16:
+                return
+            size = struct.unpack(">Q", head[8:16])[0]
+            payload += 8
+        elif size == 0:
+            # Runs to the end of the file (or enclosing box)
+            yield kind, payload, end
+            return
+        if size < payload - offset:
+            return
+        yield kind, payload, offset + size
+        offset += size
+
+
+def _find_box(read, kind, start, end):
+    for found, payload, box_end in _boxes(read, start, end):
+        if found == kind:
+            return payload, box_end
+    return None
+
+
+def mvhd_date(read):
+    """Capture (year, month) from the movie header of an MP4/MOV file"""
+    moov = _find_box(read, b"moov", 0, None)
+    if moov is None:
+        return None
+    mvhd = _find_box(read, b"mvhd", *moov)
+    if mvhd is None:
+        return None
+    data = read(mvhd[0], 12)
+    if len(data) < 8:
+        return None
+    if data[0] == 1:
+        if len(data) < 12:
+            return None
+        created = struct.unpack(">Q", data[4:12])[0]
+    else:
+        created = struct.unpack(">I", data[4:8])[0]
+    if created <= MAC_EPOCH_OFFSET:
+        # Unset (zero) or before 1970: not a real capture time
+        return None
+    t = time.localtime(created - MAC_EPOCH_OFFSET)
+    return t.tm_year, t.tm_mon
+
+
+def _uint(data, pos, size):
+    if size == 0:
+        return 0, pos
+    fmt = {2: ">H", 4: ">I", 8: ">Q"}[size]
+    return struct.unpack_from(fmt, data, pos)[0], pos + size
+
+
+def heif_date(f):
+    """Capture (year, month) from the Exif item of a HEIC/HEIF image"""
+    read = _file_reader(f)
+    meta = _find_box(read, b"meta", 0, None)
+    if meta is None:
+        return None
+    # meta is a full box: skip version and flags
+    start, end = meta[0] + 4, meta[1]
+
+    iinf = _find_box(read, b"iinf", start, end)
+    if iinf is None:
+        return None
+    data = read(iinf[0], iinf[1] - iinf[0])
+    version = data[0]
+    pos = 4 + (2 if version == 0 else 4)
+    exif_id = None
+    for kind, payload, box_end in _boxes(_bytes_reader(data), pos, len(data)):
+        if kind != b"infe" or data[payload] < 2:
+            continue
+        infe_version = data[payload]
+        pos = payload + 4
+        item_id, pos = _uint(data, pos, 2 if infe_version == 2 else 4)
+        # Skip item_protection_index
+        if data[pos + 2:pos + 6] == b"Exif":
+            exif_id = item_id
+            break
+    if exif_id is None:
+        return None
+
+    iloc = _find_box(read, b"iloc", start, end)
+    if iloc is None:
+        return None
+    data = read(iloc[0], iloc[1] - iloc[0])
+    version = data[0]
+    offset_size, length_size = data[4] >> 4, data[4] & 15
+    base_offset_size = data[5] >> 4
+    index_size = data[5] & 15 if version in (1, 2) else 0
+    count, pos = _uint(data, 6, 2 if version < 2 else 4)
+    for _ in range(count):
+        item_id, pos = _uint(data, pos, 2 if version < 2 else 4)
+        method = 0
+        if version in (1, 2):
+            method, pos = _uint(data, pos, 2)
+            method &= 15
+        pos += 2  # data_reference_index
+        base, pos = _uint(data, pos, base_offset_size)
+        extents, pos = _uint(data, pos, 2)
+        first = None
+        for _ in range(extents):
+            _, pos = _uint(data, pos, index_size)
+            extent_offset, pos = _uint(data, pos, offset_size)
+            _, pos = _uint(data, pos, length_size)
+            if first is None:
+                first = extent_offset
+        if item_id == exif_id:
+            if method != 0 or first is None:
+                # Stored in an idat box or by reference; rare for Exif
+                return None
+            exif_start = base + first
+            # The item starts with the offset of the TIFF header within it
+            head = read(exif_start, 4)
+            if len(head) < 4:
+                return None
+            tiff_start = exif_start + 4 + struct.unpack(">I", head)[0]
+            return tiff_date(_file_reader(f, tiff_start))
+    return None
+
+
+def read_capture_date(path):
+    """(year, month) the photo or video at `path` was taken, or None"""
+    with open(path, "rb") as f:
+        head = f.read(16)
+        if head[:3] == b"\xff\xd8\xff":
+            return jpeg_date(f)
+        if head[:4] in (b"II*\x00", b"MM\x00*"):
+            return tiff_date(_file_reader(f))
+        if head[4:8] == b"ftyp" and head[8:12] in HEIF_BRANDS:
+            return heif_date(f)
+        if head[4:8] in (b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip"):
+            return mvhd_date(_file_reader(f))
+    return None
+
+
+def _date_bytes(path):
+    """Cache value for a file: b"YYYY-MM", or b"" when it has no date"""
+    try:
+        date = read_capture_date(path)
+    except (struct.error, ValueError, IndexError, KeyError):
+        # Malformed metadata; it won't improve until the file changes
+        date = None
+    return b"%04d-%02d" % date if date is not None else b""
+
+
+class Dater:
+    """Resolves batches of files to their capture (year, month)"""
+
+    def __init__(self, cache_path=None, workers=4, batch_size=BATCH_SIZE):
+        import hashing
+
+        if cache_path is not None:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.cache = hashing.HashCache(cache_path)
+        self.workers = workers
+        self.batch_size = batch_size
+        self._pool = None
+
+    def date_of(self, path, st):
+        """(year, month) of the file at `path` with stat result `st`, or None"""
+        try:
+            value = self.cache.file_hash(path, st, "date", _date_bytes)
+        except OSError:
+            return None
+        if not value:
+            return None
+        return int(value[:4]), int(value[5:7])
+
+    def _one(self, item):
+        return self.date_of(*item)
+
+    def resolve(self, items):
+        """(year, month) or None for each (path, stat result) pair, in order"""
+        if self.workers > 1 and len(items) > 1:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            return list(self._pool.map(self._one, items))
+        return [self._one(item) for item in items]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.cache.close()
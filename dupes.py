@@ -0,0 +1,370 @@
+"""Duplicate files across a whole (organized) tree.
+
+Candidates are narrowed in stages so that as few bytes as possible are read:
+
+  1. size: one walk records every file's size, inode and path in a
+     temporary on-disk SQLite table, which is then read back one size at a
+     time for the sizes that occur more than once, so memory stays flat
+     however many files the library holds;
+  2. a partial hash of the first and last EDGE_SIZE bytes of each candidate;
+  3. a full hash, only for files whose partial hashes match.
+
+Hashing runs on a thread pool, in batches of BATCH_FILES candidates, and
+hashes are cached in .organizer/hashes.sqlite by (inode, size, mtime) like
+the dedupe collision policy's, so a re-run only reads new or changed files.
+Files that are already hardlinks of each other count as one.
+
+Found groups can be reported only, or the extra copies can be replaced by
+hardlinks to the first one or deleted.
+"""
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import hashing
+from organizer import STATE_DIR, format_bytes, walk_files
+
+BATCH_FILES = 1024
+ACTIONS = ("hardlink", "delete")
+# Page cache of the candidate spill table, in KiB
+SPILL_CACHE_KB = 8192
+
+
+class FileRecord:
+    """The fields of a stat result the search uses, without the rest"""
+    __slots__ = ('st_size', 'st_dev', 'st_ino', 'st_mtime_ns')
+
+    def __init__(self, size, dev, ino, mtime_ns):
+        self.st_size = size
+        self.st_dev = dev
+        self.st_ino = ino
+        self.st_mtime_ns = mtime_ns
+
+
+class DuplicateGroup:
+    """Files with identical contents; `paths[0]` is the one that is kept"""
+    __slots__ = ('size', 'digest', 'paths', 'mtimes')
+
+    def __init__(self, size, digest, paths, mtimes):
+        self.size = size
+        self.digest = digest
+        self.paths = paths
+        self.mtimes = mtimes
+
+    @property
+    def reclaimable(self):
+        return self.size * (len(self.paths) - 1)
+
+    def as_dict(self):
+        return {"size": self.size, "hash": self.digest.hex(), "files": self.paths}
+
+
+class DuplicateReport:
+    """Totals of a duplicate search, and of the action taken, if any"""
+
+    def __init__(self, root):
+        self.root = root
+        self.files_scanned = 0
+        self.candidates = 0
+        self.groups = 0
+        self.duplicate_files = 0
+        self.reclaimable_bytes = 0
+        self.reclaimed_bytes = 0
+        self.files_hashed = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def add(self, group):
+        self.groups += 1
+        self.duplicate_files += len(group.paths) - 1
+        self.reclaimable_bytes += group.reclaimable
+
+    def summary(self):
+        text = (f"{self.groups} groups, {self.duplicate_files} duplicate files, "
+                f"{format_bytes(self.reclaimable_bytes)} reclaimable "
+                f"({self.files_scanned} files scanned, {self.files_hashed} hashed, "
+                f"{self.elapsed:.2f}s)")
+        if self.reclaimed_bytes:
+            text += f", {format_bytes(self.reclaimed_bytes)} reclaimed"
+        return text
+
+    def as_dict(self):
+        return {"root": self.root, "files_scanned": self.files_scanned,
+                "groups": self.groups, "duplicate_files": self.duplicate_files,
+                "reclaimable_bytes": self.reclaimable_bytes,
+                "reclaimed_bytes": self.reclaimed_bytes,
+                "errors": len(self.errors), "elapsed": round(self.elapsed, 3)}
+
+
+def _candidates(root, exclude, min_size, report, batch_files=BATCH_FILES):
+    """Yield (size, [(path, FileRecord)]) for every size shared by two or
+    more files, largest first
+    """
+    def on_error(path, e):
+        report.errors.append((path, str(e)))
+
+    # An empty name gives a private temporary database on disk, deleted on close
+    db = sqlite3.connect("")
+    try:
+        db.execute(f"PRAGMA cache_size = -{SPILL_CACHE_KB}")
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.execute("CREATE TABLE files (size INTEGER, dev INTEGER, ino INTEGER, "
+                   "mtime_ns INTEGER, path TEXT)")
+        rows = []
+        for entry in walk_files(root, exclude, on_error):
+            report.files_scanned += 1
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if st.st_size >= min_size:
+                rows.append((st.st_size, st.st_dev, st.st_ino, st.st_mtime_ns, entry.path))
+                if len(rows) >= batch_files:
+                    db.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?)", rows)
+                    rows.clear()
+        db.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?)", rows)
+        del rows
+        db.execute("CREATE INDEX files_size ON files (size)")
+
+        members = []
+        current = None
+        for size, dev, ino, mtime_ns, path in db.execute(
+                "SELECT size, dev, ino, mtime_ns, path FROM files WHERE size IN "
+                "(SELECT size FROM files GROUP BY size HAVING COUNT(*) > 1) "
+                "ORDER BY size DESC"):
+            if size != current:
+                if members:
+                    yield current, members
+                members = []
+                current = size
+            if ino == 0:
+                # DirEntry.stat() on Windows leaves the inode and device at
+                # 0; only a real stat tells hardlinks apart and keys the cache
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if st.st_size != size:
+                    continue
+                dev, ino, mtime_ns = st.st_dev, st.st_ino, st.st_mtime_ns
+            members.append((path, FileRecord(size, dev, ino, mtime_ns)))
+        if members:
+            yield current, members
+    finally:
+        db.close()
+
+
+def _distinct_inodes(members):
+    seen = set()
+    for path, st in members:
+        if st.st_ino == 0:
+            # No inode numbers on this filesystem: can't tell links apart
+            yield path, st
+            continue
+        key = (st.st_dev, st.st_ino)
+        if key not in seen:
+            seen.add(key)
+            yield path, st
+
+
+class _Hasher:
+    def __init__(self, cache, pool, report):
+        self.cache = cache
+        self.pool = pool
+        self.report = report
+
+    def _one(self, item, kind):
+        path, st = item
+        if kind == "edges":
+            compute = lambda p: hashing.hash_edges(p, st.st_size)
+        else:
+            compute = hashing.hash_file
+        try:
+            return self.cache.file_hash(path, st, kind, compute)
+        except OSError as e:
+            self.report.errors.append((path, str(e)))
+            return None
+
+    def digests(self, items, kind):
+        if self.pool is None:
+            return [self._one(item, kind) for item in items]
+        return list(self.pool.map(lambda item: self._one(item, kind), items))
+
+
+def _regroup(items, digests):
+    groups = {}
+    for item, digest in zip(items, digests):
+        if digest is not None:
+            groups.setdefault(digest, []).append(item)
+    return [(digest, members) for digest, members in groups.items() if len(members) > 1]
+
+
+def _process_batch(batch, hasher):
+    """Yield the DuplicateGroups in a batch of same-size candidate lists"""
+    items = [item for members in batch for item in members]
+    edge_groups = {}
+    for digest, members in _regroup(items, hasher.digests(items, "edges")):
+        edge_groups[(members[0][1].st_size, digest)] = members
+
+    # Small files were hashed whole already
+    need_full = []
+    for (size, digest), members in edge_groups.items():
+        if size <= 2 * hashing.EDGE_SIZE:
+            yield _make_group(size, digest, members)
+        else:
+            need_full.append(members)
+
+    items = [item for members in need_full for item in members]
+    if items:
+        for digest, members in _regroup(items, hasher.digests(items, "full")):
+            # Full hashes of different sizes can't collide, but regroup by
+            # size anyway so one group never mixes them
+            by_size = {}
+            for item in members:
+                by_size.setdefault(item[1].st_size, []).append(item)
+            for size, same in by_size.items():
+                if len(same) > 1:
+                    yield _make_group(size, digest, same)
+
+def _make_group(size, digest, members):
+    members.sort(key=lambda item: item[0])
+    return DuplicateGroup(size, digest, [path for path, _ in members],
+                          [st.st_mtime_ns for _, st in members])
+
+
+def find_duplicates(root, workers=4, min_size=1, exclude=(), on_group=None,
+                    use_cache=True, report=None, batch_size=None):
+    """Search `root` for files with identical contents.
+
+    `on_group(group)` is called with each DuplicateGroup as soon as it is
+    confirmed, so groups never have to be held all at once. Returns the
+    DuplicateReport (`report`, if given). Empty files are ignored unless
+    `min_size` is 0. Candidates are hashed `batch_size` files at a time
+    (default BATCH_FILES).
+    """
+    batch_size = batch_size or BATCH_FILES
+    report = report or DuplicateReport(root)
+    start = time.perf_counter()
+    cache = hashing.HashCache(os.path.join(root, STATE_DIR, hashing.CACHE_NAME)
+                              if use_cache else None)
+    pool = None
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        hasher = _Hasher(cache, pool, report)
+        batch = []
+        batch_files = 0
+        # Biggest files first, since they free the most space
+        for size, members in _candidates(root, exclude, min_size, report, batch_size):
+            members = list(_distinct_inodes(members))
+            if len(members) < 2:
+                continue
+            report.candidates += len(members)
+            batch.append(members)
+            batch_files += len(members)
+            if batch_files >= batch_size:
+                for group in _process_batch(batch, hasher):
+                    report.add(group)
+                    if on_group is not None:
+                        on_group(group)
+                batch = []
+                batch_files = 0
+        if batch:
+            for group in _process_batch(batch, hasher):
+                report.add(group)
+                if on_group is not None:
+                    on_group(group)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        # Hashes that had to be computed rather than found in the cache
+        report.files_hashed = cache.misses
+        cache.close()
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def reclaim(group, action, report):
+    """Replace the extra copies in `group` by hardlinks to the first file, or
+    delete them. Files that changed since they were hashed are left alone.
+    """
+    keep = group.paths[0]
+    try:
+        st = os.stat(keep)
+        if st.st_size != group.size or st.st_mtime_ns != group.mtimes[0]:
+            raise OSError(f"{keep} changed since it was hashed")
+    except OSError as e:
+        # The copies may now hold the only instance of the hashed content
+        report.errors.append((keep, str(e)))
+        return
+    for path, mtime in zip(group.paths[1:], group.mtimes[1:]):
+        try:
+            st = os.stat(path)
+            if st.st_size != group.size or st.st_mtime_ns != mtime:
+                raise OSError(f"{path} changed since it was hashed")
+            if action == "hardlink":
+                folder, name = os.path.split(path)
+                tmp = os.path.join(folder, f".{name}.{os.getpid()}.link")
+                os.link(keep, tmp)
+                try:
+                    os.replace(tmp, path)
+                except OSError:
+                    os.unlink(tmp)
+                    raise
+            else:
+                os.unlink(path)
+        except OSError as e:
+            report.errors.append((path, str(e)))
+            continue
+        report.reclaimed_bytes += group.size
+
+
+class JsonGroupWriter:
+    """Streams duplicate groups into a JSON document, with the totals last"""
+
+    def __init__(self, f):
+        self.f = f
+        self.first = True
+        f.write('{"groups": [')
+
+    def write(self, group):
+        if not self.first:
+            self.f.write(",")
+        self.first = False
+        self.f.write("\n  " + json.dumps(group.as_dict()))
+
+    def finish(self, report):
+        self.f.write("\n],\n")
+        for key, value in report.as_dict().items():
+            self.f.write(f" {json.dumps(key)}: {json.dumps(value)},\n")
+        self.f.write(' "complete": true\n}\n')
+
+
+def run(root, workers=4, out=None, action=None, min_size=1, exclude=(), batch_size=None):
+    """find_duplicates with an optional JSON report on `out` and `action`
+    ("hardlink" or "delete") applied to each group as it is found.
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Folder not found: {root}")
+    if action is not None and action not in ACTIONS:
+        raise ValueError(f"Unknown action {action!r}; use one of {', '.join(ACTIONS)}")
+    writer = JsonGroupWriter(out) if out is not None else None
+    report = DuplicateReport(root)
+
+    def on_group(group):
+        if writer is not None:
+            writer.write(group)
+        if action is not None:
+            reclaim(group, action, report)
+
+    find_duplicates(root, workers, min_size, exclude, on_group, report=report,
+                    batch_size=batch_size)
+    if writer is not None:
+        writer.finish(report)
+    for path, error in report.errors:
+        print(f"Error: {path}: {error}", file=sys.stderr)
+    return report
@@ -0,0 +1,279 @@
+"""Compiled extension-map rules.
+
+Besides the classic `EXT=Folder` lines, extension_map.txt understands:
+
+    TAR.GZ=Archives/Tarballs      multi-part extensions; the longest matching
+                                  suffix wins, so a.tar.gz beats GZ=...
+    glob:IMG_*=Camera             fnmatch pattern on the file name (any case)
+    re:^\\d{8}_report=Reports      regular expression searched in the file name
+    rule: in=Videos/* size>4GB -> Videos/Large
+                                  routing by size, age or name on top of the
+                                  above (see rules.py)
+
+Pattern rules are checked first, in file order. On pattern lines everything
+up to the last `=` is the pattern. All pattern rules are compiled into one
+alternation, so classifying a file costs one regex match plus at most one
+dict lookup per dot in its extension, however many rules there are.
+
+Compiled indexes are cached per file path and rebuilt when the file's
+mtime or size changes.
+"""
+import os
+import re
+import threading
+from fnmatch import translate
+
+GLOB_PREFIX = "glob:"
+REGEX_PREFIX = "re:"
+RULE_PREFIX = "rule:"
+
+
+# Not allowed in folder names on Windows, where the map is most often edited
+INVALID_FOLDER_CHARS = set('<>:"|?*')
+RESERVED_FOLDER_NAMES = ({"CON", "PRN", "AUX", "NUL"} | {f"COM{i}" for i in range(1, 10)}
+                         | {f"LPT{i}" for i in range(1, 10)})
+
+
+def parse_line(line):
+    """(kind, key, folder) for one map line, or None for blanks and comments.
+
+    `kind` is "ext", "glob", "re" or "rule"; extension keys come back
+    upper-cased, and for rules the key is the conditions. Raises ValueError
+    for a line that is none of these.
+    """
+    line = line.strip()
+    lowered = line.lower()
+    if lowered.startswith(RULE_PREFIX):
+        from rules import parse_rule
+        conditions, folder = parse_rule(line[len(RULE_PREFIX):])
+        return "rule", conditions, folder
+    if not line or line.startswith("#"):
+        return None
+    if "=" not in line:
+        raise ValueError(f"Not a rule (expected EXT=Folder): {line!r}")
+    if lowered.startswith(GLOB_PREFIX):
+        pattern, folder = line[len(GLOB_PREFIX):].rsplit("=", 1)
+        return "glob", pattern.strip(), folder.strip()
+    if lowered.startswith(REGEX_PREFIX):
+        pattern, folder = line[len(REGEX_PREFIX):].rsplit("=", 1)
+        return "re", pattern.strip(), folder.strip()
+    ext, folder = line.split("=", 1)
+    return "ext", ext.strip().lstrip(".").upper(), folder.strip()
+
+
+def format_line(kind, key, folder):
+    """Inverse of parse_line"""
+    if kind == "rule":
+        return f"{RULE_PREFIX} {key} -> {folder}"
+    if kind == "glob":
+        return f"{GLOB_PREFIX}{key}={folder}"
+    if kind == "re":
+        return f"{REGEX_PREFIX}{key}={folder}"
+    return f"{key}={folder}"
+
+
+def parse_rules(text):
+    """Yield (line number, kind, key, folder) for every rule line in `text`
+    (see parse_line). Lines that are not rules are skipped, except broken
+    `rule:` lines, which raise ValueError.
+    """
+    for lineno, line in enumerate(text.splitlines(), 1):
+        try:
+            parsed = parse_line(line)
+        except ValueError:
+            if line.strip().lower().startswith(RULE_PREFIX):
+                raise
+            continue
+        if parsed is not None:
+            yield (lineno,) + parsed
+
+
+def folder_problem(folder):
+    """Why `folder` can't be a destination folder, or None if it can"""
+    if not folder:
+        return "missing folder"
+    path = folder.replace("\\", "/")
+    if path.startswith("/") or folder[1:2] == ":":
+        return f"folder {folder!r} must be relative"
+    for part in path.split("/"):
+        if not part:
+            return f"folder {folder!r} has an empty name in it"
+        if part in (".", ".."):
+            return f"folder {folder!r} may not contain {part!r}"
+        if any(c in INVALID_FOLDER_CHARS or ord(c) < 32 for c in part):
+            return f"folder name {part!r} contains characters that are not allowed"
+        if part != part.rstrip(" ."):
+            return f"folder name {part!r} ends with a space or dot"
+        if part.split(".", 1)[0].upper() in RESERVED_FOLDER_NAMES:
+            return f"folder name {part!r} is reserved on Windows"
+        if len(part.encode("utf-8")) > 255:
+            return f"folder name {part[:20]!r}... is too long"
+    return None
+
+
+def validate_rules(text):
+    """Problems in an extension map, as (line number, level, message) with
+    level "error" (the line is wrong or contradicts another) or "warning"
+    (the line is redundant).
+    """
+    problems = []
+    # extension -> (line number, folder) of its first definition
+    seen = {}
+    for lineno, line in enumerate(text.splitlines(), 1):
+        try:
+            parsed = parse_line(line)
+        except ValueError as e:
+            problems.append((lineno, "error", str(e)))
+            continue
+        if parsed is None:
+            continue
+        kind, key, folder = parsed
+        if not key:
+            problems.append((lineno, "error", "missing extension" if kind == "ext"
+                             else "missing pattern"))
+            continue
+        problem = folder_problem(folder.replace("{", "").replace("}", "")
+                                 if kind == "rule" else folder)
+        if problem is not None:
+            problems.append((lineno, "error", problem))
+            continue
+        if kind == "ext":
+            if any(c in key for c in "/\\ *?"):
+                problems.append((lineno, "error", f"invalid extension {key!r}"))
+                continue
+            first = seen.get(key)
+            if first is None:
+                seen[key] = (lineno, folder)
+            elif first[1] == folder:
+                problems.append((lineno, "warning", f"{key} repeats line {first[0]}"))
+            else:
+                problems.append((lineno, "error",
+                                 f"{key} conflicts with line {first[0]}, which sends it "
+                                 f"to {first[1]!r}"))
+            continue
+        try:
+            if kind == "rule":
+                from rules import Rule
+                Rule(key, folder)
+            else:
+                ExtensionIndex({}, [(kind, key, folder)])
+        except ValueError as e:
+            problems.append((lineno, "error", str(e)))
+    return problems
+
+
+class ExtensionIndex:
+    """Compiled form of an extension map: pattern rules plus a suffix table,
+    and the routing rules (`router`, a rules.RuleSet, or None) applied after them
+    """
+
+    def __init__(self, suffixes, patterns=(), rules=()):
+        self.suffixes = dict(suffixes)
+        # Longest key in dots decides how many suffixes a lookup may try
+        self.max_parts = max((key.count(".") + 1 for key in self.suffixes), default=1)
+        self.patterns = [tuple(p) for p in patterns]
+        self.pattern_folders = {}
+        self.pattern_re = None
+
+        alternatives = []
+        for i, (kind, pattern, folder) in enumerate(patterns):
+            group = f"r{i}"
+            if kind == "glob":
+                body = f"(?i:{translate(pattern)})"
+            else:
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    raise ValueError(f"Invalid regular expression {pattern!r}: {e}")
+                body = f".*?(?:{pattern})"
+            alternatives.append(f"(?P<{group}>{body})")
+            self.pattern_folders[group] = folder
+        if alternatives:
+            self.pattern_re = re.compile("|".join(alternatives), re.DOTALL)
+
+        self.rules = [tuple(r) for r in rules]
+        self.router = None
+        if self.rules:
+            from rules import RuleSet
+            self.router = RuleSet(self.rules)
+
+    @classmethod
+    def from_text(cls, text):
+        suffixes = {}
+        patterns = []
+        rules = []
+        for lineno, kind, key, folder in parse_rules(text):
+            if kind == "ext":
+                suffixes[key] = folder
+            elif kind == "rule":
+                rules.append((key, folder))
+            else:
+                patterns.append((kind, key, folder))
+        return cls(suffixes, patterns, rules)
+
+    def classify(self, filename):
+        """Return the destination folder for a file name, or None to skip it"""
+        if self.pattern_re is not None:
+            match = self.pattern_re.match(filename)
+            if match is not None:
+                return self.pattern_folders[match.lastgroup]
+
+        # Leading dots mark hidden files, not extensions (as in os.path.splitext)
+        parts = filename.lstrip(".").upper().rsplit(".", self.max_parts)
+        if len(parts) < 2 or not parts[-1]:
+            return None
+        for n in range(min(self.max_parts, len(parts) - 1), 0, -1):
+            folder = self.suffixes.get(".".join(parts[-n:]))
+            if folder is not None:
+                return folder
+        return f"Other_{parts[-1]}"
+
+    def route(self, filename, folder, stat=None):
+        """Apply the routing rules to a file classify() sent to `folder`;
+        `stat()` is only called when a rule needs the size or mtime
+        """
+        if self.router is None:
+            return folder
+        return self.router.route(filename, folder, stat)
+
+    def describe(self):
+        """JSON-friendly form of the rules, for spotting map changes between runs"""
+        return {"suffixes": self.suffixes, "patterns": [list(p) for p in self.patterns],
+                "rules": [list(r) for r in self.rules]}
+
+    def folders(self):
+        """Every destination folder a rule can send files to; routing rule
+        destinations keep their {fields}
+        """
+        folders = list(self.suffixes.values()) + list(self.pattern_folders.values())
+        if self.router is not None:
+            folders.extend(self.router.folders())
+        return folders
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def load_extension_index(filepath):
+    """Compiled index for `filepath`, reusing the cached one while the file is unchanged"""
+    st = os.stat(filepath)
+    key = os.path.abspath(filepath)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+    with open(filepath, "r", encoding="utf-8") as f:
+        index = ExtensionIndex.from_text(f.read())
+    with _cache_lock:
+        _cache[key] = (stamp, index)
+    return index
+
+def invalidate_extension_index(filepath=None):
+    """Drop the cached index for `filepath`, or every cached index"""
+    with _cache_lock:
+        if filepath is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(filepath), None)
@@ -0,0 +1,147 @@
+"""Content hashes for telling identical files apart, cached on disk.
+
+Files are read in large chunks and hashed with BLAKE2b. Hashes are kept
+in .organizer/hashes.sqlite keyed by (inode, size, mtime), so a file is
+only read again after it changes, and re-runs over a library of large
+videos cost a lookup per file instead of a full read.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+
+CACHE_NAME = "hashes.sqlite"
+READ_SIZE = 1024 * 1024
+# Bytes read from each end of a file for its partial ("edges") hash
+EDGE_SIZE = 64 * 1024
+COMMIT_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    kind TEXT NOT NULL,         -- "full", or a partial hash like "edges"
+    digest BLOB NOT NULL,
+    PRIMARY KEY (ino, size, mtime_ns, kind)
+);
+"""
+
+
+def hash_file(path):
+    """BLAKE2b digest of the whole file at `path`"""
+    h = hashlib.blake2b()
+    buf = bytearray(READ_SIZE)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    return h.digest()
+
+
+def hash_edges(path, size=None):
+    """BLAKE2b digest of the first and last EDGE_SIZE bytes of a file.
+
+    Files no bigger than both edges are hashed whole, so for them the
+    partial hash is also the full one.
+    """
+    if size is None:
+        size = os.path.getsize(path)
+    if size <= 2 * EDGE_SIZE:
+        return hash_file(path)
+    h = hashlib.blake2b()
+    with open(path, "rb", buffering=0) as f:
+        h.update(f.read(EDGE_SIZE))
+        f.seek(size - EDGE_SIZE)
+        h.update(f.read(EDGE_SIZE))
+    return h.digest()
+
+
+def entry_stat(entry):
+    """Stat result of a DirEntry fit to key the cache. DirEntry.stat() on
+    Windows leaves st_ino at 0, so those files are stat'ed again by path.
+    """
+    st = entry.stat()
+    if st.st_ino == 0:
+        st = os.stat(entry.path)
+    return st
+
+
+class HashCache:
+    """(inode, size, mtime, kind) -> digest; in memory only when `path` is None.
+
+    Shared by worker threads, so every access takes a lock; the hashing
+    itself happens outside it.
+    """
+
+    def __init__(self, path=None):
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, st, kind="full"):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT digest FROM hashes WHERE ino = ? AND size = ? AND mtime_ns = ? AND kind = ?",
+                (st.st_ino, st.st_size, st.st_mtime_ns, kind)).fetchone()
+        return row[0] if row else None
+
+    def put(self, st, digest, kind="full"):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)",
+                            (st.st_ino, st.st_size, st.st_mtime_ns, kind, digest))
+            self.pending += 1
+            if self.pending >= COMMIT_EVERY:
+                self.db.commit()
+                self.pending = 0
+
+    def file_hash(self, path, st=None, kind="full", compute=None):
+        """Digest of the file at `path`, from the cache when it hasn't changed.
+
+        `compute(path)` makes the digest for `kind`; the default is hash_file.
+        """
+        if st is None:
+            st = os.stat(path)
+        if st.st_ino == 0:
+            # No inode numbers here, so nothing safe to key on
+            return (compute or hash_file)(path)
+        digest = self.get(st, kind)
+        with self.lock:
+            if digest is not None:
+                self.hits += 1
+                return digest
+            self.misses += 1
+        digest = (compute or hash_file)(path)
+        self.put(st, digest, kind)
+        return digest
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+
+def same_content(path_a, path_b, cache=None, st_a=None, st_b=None):
+    """True if the two files have identical contents.
+
+    Sizes are compared first; the files are only hashed when those match.
+    """
+    st_a = st_a or os.stat(path_a)
+    st_b = st_b or os.stat(path_b)
+    if st_a.st_size != st_b.st_size:
+        return False
+    if (st_a.st_dev, st_a.st_ino) == (st_b.st_dev, st_b.st_ino):
+        return True
+    if cache is None:
+        return hash_file(path_a) == hash_file(path_b)
+    return cache.file_hash(path_a, st_a) == cache.file_hash(path_b, st_b)
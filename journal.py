@@ -0,0 +1,519 @@
+"""Append-only run journal for crash recovery, resume and undo.
+
+A journaled run first streams its whole plan into
+.organizer/journal-<run id>.jsonl under the destination root and fsyncs it, then moves the files
+and appends a record for each one that finished. Completion records are
+fsynced in batches, so the journal costs one fsync per `SYNC_EVERY` moves
+rather than one per file. Moves whose completion record was lost in a
+crash are recognised on resume because their source is gone and their
+destination exists.
+
+Records are one JSON object per line:
+
+    {"run": id, "folder": root, "mode": mode, "collisions": policy,
+     "started": iso time}                                header
+    {"p": i, "s": src, "d": dest_folder, "f": filename, "c": category, "z": size,
+     "m": mode, only when it differs from the run's}
+    {"planned": count, "skipped": n}                  plan is complete
+    {"ok": i} / {"err": i, "e": message}              move finished / failed
+    {"ok": i, "n": name}                               placed under a new name
+    {"skip": i} / {"dup": i, "n": name}                name taken / identical to name
+    {"end": true}                                      run finished
+    {"undone": i} / {"undo_end": true}                 undo progress
+"""
+import itertools
+import json
+import os
+import time
+from array import array
+from datetime import datetime
+
+from organizer import (
+    DUPLICATE,
+    RENAMED,
+    SKIPPED,
+    STATE_DIR,
+    MoveOp,
+    state_root,
+    OrganizePlan,
+    OrganizeResult,
+    ProgressReporter,
+    execute_plan,
+    iter_moves,
+)
+from transfer import Mover, copy_file
+
+SYNC_EVERY = 1000
+SYNC_INTERVAL = 1.0
+# Journals kept per organized folder; older ones are deleted after a run
+KEEP_JOURNALS = 10
+# Planned moves read back at once when the plan is walked backwards (undo)
+CHUNK_OPS = 10000
+
+# Values in JournalState.done
+PENDING, DONE, DONE_SKIPPED, DONE_DUPLICATE = 0, 1, 2, 3
+
+
+class JournalOp(MoveOp):
+    """A MoveOp that remembers its position in the journaled plan"""
+    __slots__ = ('index',)
+
+    def __init__(self, index, filename, src, dest_folder, category, size=None, mode=None):
+        super().__init__(filename, src, dest_folder, category, size, mode)
+        self.index = index
+
+
+class Journal:
+    """Buffered append-only writer that fsyncs in batches"""
+
+    def __init__(self, path, sync_every=SYNC_EVERY, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.f = open(path, "ab")
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def append(self, record):
+        self.append_line(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+
+    def append_line(self, line):
+        """Append an already encoded record (without the newline)"""
+        self.f.write(line + b"\n")
+        self.pending += 1
+        if (self.pending >= self.sync_every
+                or time.monotonic() - self.last_sync >= self.sync_interval):
+            self.sync()
+
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self.f.close()
+
+
+def journal_dir(folder):
+    return os.path.join(folder, STATE_DIR)
+
+def new_journal_path(folder):
+    """Create a new, empty journal file under `folder` and return its path.
+
+    Several runs can share one state folder (folders organized into the same
+    destination, even from one process within a second), so the file is
+    created exclusively, with a sequence number to tell such runs apart.
+    """
+    os.makedirs(journal_dir(folder), exist_ok=True)
+    stamp = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    for seq in itertools.count():
+        path = os.path.join(journal_dir(folder), f"journal-{stamp}-{seq:04d}.jsonl")
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+        except FileExistsError:
+            continue
+        return path
+
+def _journal_folder(path):
+    """The organized folder named in a journal's header, or None"""
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.readline()).get("folder")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def journal_paths(folder, dest_root=None):
+    """Paths of the journals of runs over `folder`, newest first. They live
+    under `dest_root` when the runs had one, which other folders' runs may
+    share.
+    """
+    state_dir = journal_dir(dest_root or folder)
+    try:
+        names = [n for n in os.listdir(state_dir)
+                 if n.startswith("journal-") and n.endswith(".jsonl")]
+    except FileNotFoundError:
+        return
+    target = os.path.realpath(folder)
+    for name in sorted(names, reverse=True):
+        path = os.path.join(state_dir, name)
+        run_folder = _journal_folder(path)
+        if run_folder is not None and os.path.realpath(run_folder) == target:
+            yield path
+
+def latest_journal_path(folder, dest_root=None):
+    """Path of the newest journal for `folder`, or None"""
+    return next(journal_paths(folder, dest_root), None)
+
+def prune_journals(folder, dest_root=None, keep=KEEP_JOURNALS):
+    """Delete all but the newest `keep` journals of runs over `folder`"""
+    for path in itertools.islice(journal_paths(folder, dest_root), keep, None):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def read_records(path):
+    """Yield the records of a journal, ignoring a torn last line"""
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+OK_PREFIX = b'{"ok":'
+PLAN_PREFIX = b'{"p":'
+
+
+class JournalState:
+    """What a journal says about its run, gathered in one read"""
+
+    def __init__(self, path, read=True):
+        self.path = path
+        self.folder = None
+        self.mode = "move"
+        self.collisions = "rename"
+        self.planned = None
+        self.planned_bytes = 0
+        self.skipped = 0
+        # One of the DONE* values per planned move, PENDING if not finished
+        self.done = None
+        # index -> new file name, for the few moves renamed on a collision
+        self.renamed = {}
+        self.ended = False
+        self.undone = None
+        self.undo_ended = False
+        # True when nothing can have moved yet, so there is nothing to reconcile
+        self.fresh = False
+        if read:
+            self._read()
+
+    @classmethod
+    def for_new_run(cls, path, folder, options, planned, skipped, planned_bytes):
+        """State of a journal whose plan was just written, without re-reading it"""
+        state = cls(path, read=False)
+        state.folder = folder
+        state.mode = options.mode
+        state.collisions = options.collisions
+        state.planned = planned
+        state.skipped = skipped
+        state.planned_bytes = planned_bytes
+        state.done = bytearray(planned)
+        state.fresh = True
+        return state
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            lines = iter(f)
+            for line in lines:
+                # Completion records are the bulk of a journal; skip the json
+                # decoder for them
+                if line.startswith(OK_PREFIX) and line.endswith(b"}\n") and b"," not in line:
+                    self.done[int(line[len(OK_PREFIX):-2])] = 1
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(record)
+
+    def _apply(self, record):
+        if "ok" in record:
+            self.done[record["ok"]] = DONE
+            if "n" in record:
+                self.renamed[record["ok"]] = record["n"]
+        elif "skip" in record:
+            self.done[record["skip"]] = DONE_SKIPPED
+        elif "dup" in record:
+            self.done[record["dup"]] = DONE_DUPLICATE
+            self.renamed[record["dup"]] = record.get("n")
+        elif "p" in record:
+            self.planned_bytes += record.get("z") or 0
+        elif "undone" in record:
+            if self.undone is None:
+                self.undone = bytearray(self.planned or 0)
+            self.undone[record["undone"]] = 1
+        elif "planned" in record:
+            self.planned = record["planned"]
+            self.skipped = record.get("skipped", 0)
+            # One byte per planned move, so a 500k-file run needs ~500 KB
+            self.done = bytearray(self.planned)
+        elif "run" in record:
+            self.folder = record.get("folder")
+            self.mode = record.get("mode", "move")
+            self.collisions = record.get("collisions", "rename")
+        elif "end" in record:
+            self.ended = True
+        elif "undo_end" in record:
+            self.undo_ended = True
+
+    def planned_ops(self):
+        """Yield a JournalOp for every planned move, in plan order"""
+        for record in read_records(self.path):
+            if "p" in record:
+                yield _planned_op(record)
+            elif "planned" in record:
+                return
+
+    def planned_ops_reversed(self, chunk=CHUNK_OPS):
+        """Yield the planned moves newest first.
+
+        One pass notes the file offset of every `chunk`-th plan record; the
+        plan is then read back a chunk at a time from the end, so only one
+        chunk of ops and an offset per chunk are held in memory.
+        """
+        starts = array("Q")
+        with open(self.path, "rb") as f:
+            offset = 0
+            count = 0
+            for line in f:
+                if line.startswith(PLAN_PREFIX):
+                    if count % chunk == 0:
+                        starts.append(offset)
+                    count += 1
+                elif count:
+                    break
+                offset += len(line)
+            for start in reversed(starts):
+                f.seek(start)
+                ops = []
+                for line in f:
+                    if not line.startswith(PLAN_PREFIX) or len(ops) == chunk:
+                        break
+                    try:
+                        ops.append(_planned_op(json.loads(line)))
+                    except ValueError:
+                        continue
+                yield from reversed(ops)
+
+
+def _planned_op(record):
+    return JournalOp(record["p"], record["f"], record["s"], record["d"], record["c"],
+                     record.get("z"), record.get("m"))
+
+
+def _log_result(journal, then=None):
+    def on_result(op, error):
+        if error is None:
+            if op.outcome is None:
+                journal.append_line(b'{"ok":%d}' % op.index)
+            elif op.outcome == RENAMED:
+                journal.append({"ok": op.index, "n": op.filename})
+            elif op.outcome == SKIPPED:
+                journal.append({"skip": op.index})
+            elif op.outcome == DUPLICATE:
+                journal.append({"dup": op.index, "n": op.filename})
+        else:
+            journal.append({"err": op.index, "e": str(error)})
+        if then is not None:
+            then(op, error)
+    return on_result
+
+def _looks_done(op, run_mode):
+    """Whether a move with no completion record happened before a crash"""
+    if (op.mode or run_mode) == "move":
+        return not os.path.lexists(op.src) and os.path.lexists(op.dest)
+    # Copies and links are made under a temporary name and renamed into place,
+    # so an existing destination is a complete one
+    return os.path.lexists(op.dest)
+
+def _run_pending(state, journal, workers, progress=None, control=None, on_result=None,
+                 stats=None):
+    """Execute the planned moves that the journal has no completion for"""
+    plan = OrganizePlan(state.folder)
+    plan.stats = stats
+    # The journal lives in <state root>/STATE_DIR
+    plan.state_root = os.path.dirname(os.path.dirname(state.path))
+    prior = OrganizeResult(state.folder)
+    finished = 0
+    log = _log_result(journal, on_result)
+    if progress is not None:
+        progress.start("move", state.planned, state.planned_bytes,
+                       files_done=state.planned - state.done.count(PENDING))
+
+    def pending():
+        nonlocal finished
+        for op in state.planned_ops():
+            done = state.done[op.index]
+            if done == PENDING and not state.fresh and _looks_done(op, state.mode):
+                # Moved before the crash, but the completion record was lost
+                journal.append({"ok": op.index})
+                done = DONE
+                if progress is not None:
+                    progress.advance(op.size or 0)
+            elif done != PENDING and progress is not None:
+                progress.bytes_done += op.size or 0
+            if done == PENDING:
+                yield op
+                continue
+            finished += 1
+            if done == DONE:
+                prior.files_moved += 1
+            elif done == DONE_SKIPPED:
+                prior.files_skipped += 1
+            else:
+                prior.duplicates += 1
+
+    def record(op, error):
+        nonlocal finished
+        finished += 1
+        log(op, error)
+
+    result = execute_plan(plan, workers=workers, moves=pending(), on_result=record,
+                          progress=progress, control=control, mode=state.mode,
+                          collisions=state.collisions)
+    result.files_moved += prior.files_moved
+    result.files_skipped += state.skipped + prior.files_skipped
+    result.duplicates += prior.duplicates
+    if result.cancelled:
+        # No end record, so the rest can be picked up with resume()
+        result.files_remaining = state.planned - finished
+    else:
+        journal.append({"end": True})
+    if progress is not None:
+        progress.finish()
+    return result
+
+def journaled_organize(folder, ext_map, options, progress=None, control=None,
+                       plan=None, moves=None, on_result=None):
+    """Organize `folder` like organizer.organize, writing a journal as it goes.
+
+    `moves` (with the `plan` it counts skips on) replaces the default scan,
+    and `on_result(op, error)` is called after each move as in execute_plan.
+    """
+    path = new_journal_path(state_root(folder, options))
+    journal = Journal(path)
+    empty = False
+    try:
+        journal.append({"run": os.path.basename(path), "folder": os.path.abspath(folder),
+                        "mode": options.mode,
+                        "collisions": options.collisions,
+                        "started": datetime.now().isoformat(timespec="seconds")})
+
+        # Write-ahead: the full plan is on disk before the first file moves
+        if plan is None:
+            plan = OrganizePlan(folder)
+        if moves is None:
+            moves = iter_moves(plan, ext_map, options, want_sizes=progress is not None)
+        count = 0
+        planned_bytes = 0
+        if progress is not None:
+            progress.start("scan")
+        for op in moves:
+            record = {"p": count, "s": op.src, "d": op.dest_folder,
+                      "f": op.filename, "c": op.category, "z": op.size}
+            if op.mode is not None and op.mode != options.mode:
+                record["m"] = op.mode
+            journal.append(record)
+            count += 1
+            planned_bytes += op.size or 0
+            if progress is not None:
+                progress.advance(op.size or 0)
+            if control is not None and not control.checkpoint():
+                # Nothing has moved yet; leave the half-written plan behind
+                result = OrganizeResult(folder)
+                result.cancelled = True
+                return result
+        journal.append({"planned": count, "skipped": plan.skipped})
+        journal.sync()
+        empty = count == 0
+
+        state = JournalState.for_new_run(path, folder, options, count, plan.skipped,
+                                         planned_bytes)
+        return _run_pending(state, journal, options.workers, progress, control, on_result,
+                            plan.stats)
+    finally:
+        journal.close()
+        if empty:
+            # Nothing to resume or undo; keep the last real run undoable
+            os.remove(path)
+        else:
+            prune_journals(folder, options.dest_root)
+
+def resume(folder, workers=1, on_progress=None, control=None, dest_root=None):
+    """Finish the newest unfinished journaled run of `folder`.
+
+    The plan comes from the journal, so the folder is not rescanned. Pass the
+    run's `dest_root` if it had one, since that is where the journal is.
+    """
+    path = latest_journal_path(folder, dest_root)
+    if path is None:
+        raise FileNotFoundError(f"No journal found for {folder}")
+    state = JournalState(path)
+    if state.planned is None:
+        # Interrupted while planning: nothing was moved yet, so the run can
+        # simply be started again
+        raise RuntimeError(f"The last run of {folder} never finished planning; "
+                           "start a new run instead")
+    if state.ended or state.undone is not None:
+        raise RuntimeError(f"The last run of {folder} has nothing left to resume")
+
+    progress = ProgressReporter(on_progress) if on_progress is not None else None
+    journal = Journal(path)
+    try:
+        return _run_pending(state, journal, workers, progress, control)
+    finally:
+        journal.close()
+
+def undo(folder, dest_root=None, batch_size=None):
+    """Move the files of the newest journaled run of `folder` back, newest
+    first. Copies and links are removed, as long as the original is still there,
+    and files dropped as duplicates are restored from the identical copy.
+    The plan is read back from the journal `batch_size` moves at a time.
+    """
+    state = None
+    for path in journal_paths(folder, dest_root):
+        state = JournalState(path)
+        # Runs that found nothing to move have nothing to undo either
+        if state.planned != 0:
+            break
+    if state is None:
+        raise FileNotFoundError(f"No journal found for {folder}")
+    if not state.planned or state.undo_ended:
+        raise RuntimeError(f"The last run of {folder} has nothing to undo")
+
+    undone = state.undone or bytearray(state.planned)
+
+    def moved():
+        for op in state.planned_ops_reversed(batch_size or CHUNK_OPS):
+            if (not undone[op.index] and state.done[op.index] != DONE_SKIPPED
+                    and (state.done[op.index] or
+                         # A destination that was already there must not be
+                         # deleted, so only moves are reconciled here
+                         ((op.mode or state.mode) == "move" and _looks_done(op, state.mode)))):
+                yield op
+
+    result = OrganizeResult(folder)
+    start = time.perf_counter()
+    mover = Mover()
+    journal = Journal(path)
+    try:
+        for op in moved():
+            op.filename = state.renamed.get(op.index) or op.filename
+            try:
+                if state.done[op.index] == DONE_DUPLICATE:
+                    # The file itself was deleted in favour of an identical one
+                    if not os.path.lexists(op.src):
+                        os.makedirs(os.path.dirname(op.src), exist_ok=True)
+                        copy_file(op.dest, op.src, overwrite=False)
+                elif (op.mode or state.mode) != "move" and os.path.lexists(op.src):
+                    os.unlink(op.dest)
+                else:
+                    if os.path.lexists(op.src):
+                        raise FileExistsError(f"{op.src} already exists")
+                    os.makedirs(os.path.dirname(op.src), exist_ok=True)
+                    mover.move(op.dest, op.src)
+            except OSError as e:
+                result.files_skipped += 1
+                result.add_error(op.dest, str(e))
+                continue
+            journal.append({"undone": op.index})
+            result.files_moved += 1
+        journal.append({"undo_end": True})
+    finally:
+        journal.close()
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -1,224 +1,79 @@
+import time
+
+_START = time.perf_counter()
+
 import os
-import shutil
+import queue
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-import sys
+from tkinter import messagebox, ttk
 import threading
-from datetime import datetime
-
-# Add import for drag and drop
-try:
-    from tkinterdnd2 import DND_FILES, TkinterDnD
-    DND_AVAILABLE = True
-except ImportError:
-    DND_AVAILABLE = False
-
-# Get the directory where the script or exe is located
-def get_app_dir():
-    if getattr(sys, 'frozen', False):
-        return os.path.dirname(sys.executable)
-    else:
-        return os.path.dirname(os.path.abspath(__file__))
-
-# Default extension map content
-DEFAULT_EXTENSION_MAP = """
-PDF=Documents/PDF Files
-DOC=Documents/Word Files
-DOCX=Documents/Word Files
-TXT=Documents/Text Files
-XLS=Documents/Excel Files
-XLSX=Documents/Excel Files
-XLSB=Documents/Excel Files
-PPT=Documents/PowerPoint Files
-PPTX=Documents/PowerPoint Files
-ODT=Documents/OpenDocument Files
-ODS=Documents/OpenDocument Files
-CSV=Documents/CSV Files
-RTF=Documents/Text Files
-MD=Documents/Markdown Files
-LOG=Documents/Log Files
-EPUB=Documents/eBooks
-MOBI=Documents/eBooks
-CBZ=Documents/Comic Books
-CBR=Documents/Comic Books
-
-JPG=Images/JPG Images
-JPEG=Images/JPG Images
-PNG=Images/PNG Images
-GIF=Images/GIF Images
-BMP=Images/BMP Images
-SVG=Images/SVG Images
-WEBP=Images/WEBP Images
-TIFF=Images/TIFF Images
-ICO=Images/Icon Files
-HEIC=Images/HEIC Images
-RAW=Images/RAW Images
-CR2=Images/RAW Images
-NEF=Images/RAW Images
-ARW=Images/RAW Images
-DNG=Images/RAW Images
-
-MP4=Videos/MP4 Videos
-MKV=Videos/MKV Videos
-AVI=Videos/AVI Videos
-MOV=Videos/MOV Videos
-WMV=Videos/WMV Videos
-FLV=Videos/FLV Videos
-WEBM=Videos/WEBM Videos
-MPEG=Videos/MPEG Videos
-MPG=Videos/MPEG Videos
-3GP=Videos/3GP Videos
-M4V=Videos/M4V Videos
-TS=Videos/TS Videos
-VOB=Videos/VOB Videos
-OGV=Videos/OGV Videos
-F4V=Videos/F4V Videos
-
-MP3=Audio/MP3 Audio
-WAV=Audio/WAV Audio
-AAC=Audio/AAC Audio
-FLAC=Audio/FLAC Audio
-OGG=Audio/OGG Audio
-M4A=Audio/M4A Audio
-WMA=Audio/WMA Audio
-AMR=Audio/AMR Audio
-AIF=Audio/AIF Audio
-AIFF=Audio/AIF Audio
-APE=Audio/APE Audio
-OPUS=Audio/OPUS Audio
-MID=Audio/MIDI Audio
-MIDI=Audio/MIDI Audio
 
-ZIP=Archives/ZIP Archives
-RAR=Archives/RAR Archives
-7Z=Archives/7Z Archives
-TAR=Archives/TAR Archives
-GZ=Archives/GZ Archives
-BZ2=Archives/BZ2 Archives
-XZ=Archives/XZ Archives
-ISO=Archives/ISO Archives
-CAB=Archives/CAB Archives
-ARJ=Archives/ARJ Archives
-LZH=Archives/LZH Archives
-ACE=Archives/ACE Archives
-Z=Archives/Z Archives
-JAR=Archives/JAR Archives
+from extension_index import format_line, parse_line, validate_rules
+from organizer import (
+    MODES,
+    OrganizeOptions,
+    RunControl,
+    default_extension_map_path,
+    ensure_extension_map,
+    organize,
+    save_extension_map,
+)
 
-PY=Code/Python
-JS=Code/JavaScript
-JAVA=Code/Java
-CPP=Code/C++
-C=Code/C
-CS=Code/CSharp
-HTML=Code/HTML
-CSS=Code/CSS
-PHP=Code/PHP
-RB=Code/Ruby
-GO=Code/Go
-RS=Code/Rust
-TS=Code/TypeScript
-SH=Code/Shell
-BAT=Code/Batch
-PL=Code/Perl
-SWIFT=Code/Swift
-KOTLIN=Code/Kotlin
-SCALA=Code/Scala
-R=Code/R
-IPYNB=Code/Jupyter
-JSON=Code/JSON
-XML=Code/XML
-YML=Code/YAML
-YAML=Code/YAML
-ASP=Code/ASP
-ASPX=Code/ASP.NET
-VBS=Code/VBScript
-SQL=Code/SQL
-LUA=Code/Lua
-H=Code/C-Headers
-HPP=Code/C++-Headers
+_IMPORTED = time.perf_counter()
 
-EXE=Applications/Windows Executables
-MSI=Applications/Windows Installers
-APK=Applications/Android Packages
-APPX=Applications/Windows App Packages
-DMG=Applications/Mac Installers
-PKG=Applications/Mac Packages
-APP=Applications/Mac Apps
-IPA=Applications/iOS Apps
+RULE_KINDS = ("ext", "glob", "re", "rule")
 
-TTF=Fonts/TrueType
-OTF=Fonts/OpenType
-FON=Fonts/Bitmap
-WOFF=Fonts/Web Open Font
-WOFF2=Fonts/Web Open Font 2
-EOT=Fonts/Embedded OpenType
-PFA=Fonts/PostScript
-PFB=Fonts/PostScript
+# A file to append startup timings to, and whether to close the window once
+# it is fully built; used by benchmarks/bench_startup.py. A file rather than
+# stderr, which a windowed (console=False) build doesn't have
+STARTUP_TRACE = os.environ.get("ORGANIZER_STARTUP_TRACE")
+STARTUP_EXIT = bool(os.environ.get("ORGANIZER_STARTUP_EXIT"))
 
-KEY=Presentations/Keynote
-ODP=Presentations/OpenDocument
-NUMBERS=Spreadsheets/Numbers
-XLSM=Spreadsheets/Excel Macro
-
-AI=VectorGraphics/Illustrator
-EPS=VectorGraphics/EPS
-CDR=VectorGraphics/CorelDRAW
-PSD=VectorGraphics/Photoshop
-SVGZ=VectorGraphics/SVG Compressed
-SVGZ=VectorGraphics/SVG Compressed
-SVG=VectorGraphics/SVG
-PDF=VectorGraphics/PDF
-
-
-# Add more extensions as needed
-# You can add more extensions and their corresponding folders here
-# Example:
-# TXT=Documents/Text Files
-# TXT=Documents/Text Files
-# MP3=Audio/MP3 Audio
-# 
-"""
-
-def ensure_extension_map(filepath):
-    if not os.path.exists(filepath):
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(DEFAULT_EXTENSION_MAP)
-
-def load_extension_map(filepath):
-    ext_map = {}
-    ensure_extension_map(filepath)
-    with open(filepath, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" in line:
-                ext, folder = line.split("=", 1)
-                ext_map[ext.strip().upper()] = folder.strip()
-    return ext_map
+# The drag and drop extension (tkinterdnd2) is only loaded once the window is up
+DND_FILES = 'DND_Files'
 
 class ModernFolderOrganizer:
     def __init__(self):
-        # Use TkinterDnD.Tk if available, else fallback to tk.Tk
-        if DND_AVAILABLE:
-            self.root = TkinterDnD.Tk()
-        else:
-            self.root = tk.Tk()
+        self.root = tk.Tk()
+        self.dnd_available = False
         self.setup_window()
-        self.create_widgets()
         self.setup_styles()
+        self.create_widgets()
+        
+        # Draw the window now; the rest is built on the first idle callback
+        self.root.update()
+        self._startup_trace("first_frame")
+        self.root.after_idle(self.finish_startup)
+        
+    def _startup_trace(self, stage):
+        if STARTUP_TRACE:
+            now = time.perf_counter()
+            try:
+                with open(STARTUP_TRACE, "a", encoding="utf-8") as f:
+                    f.write(f"startup imports={(_IMPORTED - _START) * 1000:.1f}ms "
+                            f"{stage}={(now - _START) * 1000:.1f}ms\n")
+            except OSError:
+                pass
+            
+    def finish_startup(self):
+        """Build the widgets that aren't needed for the first frame"""
+        self.create_secondary_widgets()
+        self.enable_drag_and_drop()
+        self._startup_trace("ready")
+        if STARTUP_EXIT:
+            self.root.after(0, self.root.destroy)
         
     def setup_window(self):
         self.root.title("✨ Modern Folder Organizer")
-        self.root.geometry("650x500")  # Slightly larger for better drag area
+        self.root.geometry("650x540")  # Slightly larger for better drag area
         self.root.configure(bg='#1a1a1a')
         self.root.resizable(False, False)
         
         # Center the window
         self.root.update_idletasks()
         x = (self.root.winfo_screenwidth() // 2) - (650 // 2)
-        y = (self.root.winfo_screenheight() // 2) - (500 // 2)
-        self.root.geometry(f"650x500+{x}+{y}")
+        y = (self.root.winfo_screenheight() // 2) - (540 // 2)
+        self.root.geometry(f"650x540+{x}+{y}")
         
     def setup_styles(self):
         style = ttk.Style()
@@ -247,6 +102,17 @@ class ModernFolderOrganizer:
                  background=[('active', '#545b62'),
                            ('pressed', '#495057')])
         
+        style.configure('Control.TButton',
+                       background='#6c757d',
+                       foreground='white',
+                       borderwidth=0,
+                       focuscolor='none',
+                       padding=(8, 2))
+        
+        style.map('Control.TButton',
+                 background=[('active', '#545b62'),
+                           ('pressed', '#495057')])
+        
         style.configure('TProgressbar',
                        background='#4a9eff',
                        troughcolor='#2d2d2d',
@@ -255,6 +121,10 @@ class ModernFolderOrganizer:
                        darkcolor='#4a9eff')
         
     def create_widgets(self):
+        """Build what the first frame shows. The rows that
+        create_secondary_widgets fills in are packed here as empty frames,
+        so the layout doesn't shift when they appear.
+        """
         # Main container with gradient effect
         main_frame = tk.Frame(self.root, bg='#1a1a1a')
         main_frame.pack(fill='both', expand=True, padx=20, pady=(20, 10))
@@ -330,6 +200,9 @@ class ModernFolderOrganizer:
                                     justify='left')
         self.folder_label.pack(anchor='w', pady=(5, 0))
         
+        self.options_frame = tk.Frame(folder_frame, bg='#2d2d2d')
+        self.options_frame.pack(fill='x')
+        
         # Button container
         button_frame = tk.Frame(content_frame, bg='#2d2d2d')
         button_frame.pack(pady=15)
@@ -358,13 +231,17 @@ class ModernFolderOrganizer:
         progress_frame = tk.Frame(content_frame, bg='#2d2d2d')
         progress_frame.pack(fill='x', padx=30, pady=(15, 20))
         
+        status_row = tk.Frame(progress_frame, bg='#2d2d2d')
+        status_row.pack(fill='x')
+        self.status_row = status_row
+        
         self.progress_var = tk.StringVar(value="Ready to organize files")
-        self.progress_label = tk.Label(progress_frame,
+        self.progress_label = tk.Label(status_row,
                                       textvariable=self.progress_var,
                                       font=('Segoe UI', 10),
                                       fg='#a0a0a0',
                                       bg='#2d2d2d')
-        self.progress_label.pack(anchor='w')
+        self.progress_label.pack(side='left', anchor='w')
         
         self.progress_bar = ttk.Progressbar(progress_frame,
                                            mode='indeterminate',
@@ -374,149 +251,211 @@ class ModernFolderOrganizer:
         
         # Initialize variables
         self.selected_folder = None
+        self.selected_folders = []
+        self.output_folder = None
+        self.organizing = False
+        self.progress_queue = queue.Queue()
+        self.run_control = None
+        
+    def create_secondary_widgets(self):
+        """Option rows and run controls, built right after the first frame"""
+        options_row = tk.Frame(self.options_frame, bg='#2d2d2d')
+        options_row.pack(fill='x', pady=(5, 0))
+        
+        self.recursive_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(options_row,
+                      text="Include subfolders",
+                      variable=self.recursive_var,
+                      font=('Segoe UI', 10),
+                      fg='#a0a0a0',
+                      bg='#2d2d2d',
+                      activebackground='#2d2d2d',
+                      activeforeground='#ffffff',
+                      selectcolor='#1a1a1a').pack(side='left')
+        
+        self.date_folders_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(options_row,
+                      text="Photos & videos by date taken",
+                      variable=self.date_folders_var,
+                      font=('Segoe UI', 10),
+                      fg='#a0a0a0',
+                      bg='#2d2d2d',
+                      activebackground='#2d2d2d',
+                      activeforeground='#ffffff',
+                      selectcolor='#1a1a1a').pack(side='left', padx=(15, 0))
+        
+        # Optional output root (e.g. another volume) and how files get there
+        output_row = tk.Frame(self.options_frame, bg='#2d2d2d')
+        output_row.pack(fill='x', pady=(5, 0))
+        
+        self.output_var = tk.StringVar(value="Output: same folder")
+        tk.Label(output_row,
+                textvariable=self.output_var,
+                font=('Segoe UI', 10),
+                fg='#a0a0a0',
+                bg='#2d2d2d').pack(side='left')
+        
+        # Copy and link modes leave the originals behind, so they only make
+        # sense with a separate output folder
+        self.mode_var = tk.StringVar(value=MODES[0])
+        self.mode_box = ttk.Combobox(output_row,
+                                     textvariable=self.mode_var,
+                                     values=MODES,
+                                     state='disabled',
+                                     width=9)
+        self.mode_box.pack(side='right')
+        
+        ttk.Button(output_row,
+                  text="✖",
+                  style='Control.TButton',
+                  command=self.clear_output_folder).pack(side='right', padx=(0, 10))
+        
+        ttk.Button(output_row,
+                  text="📂 Output...",
+                  style='Control.TButton',
+                  command=self.select_output_folder).pack(side='right', padx=(0, 5))
+        
+        # Run controls, only enabled while organizing
+        self.cancel_btn = ttk.Button(self.status_row,
+                                    text="✖ Cancel",
+                                    style='Control.TButton',
+                                    command=self.cancel_organize,
+                                    state='disabled')
+        self.cancel_btn.pack(side='right')
+        
+        self.pause_btn = ttk.Button(self.status_row,
+                                   text="⏸ Pause",
+                                   style='Control.TButton',
+                                   command=self.toggle_pause,
+                                   state='disabled')
+        self.pause_btn.pack(side='right', padx=(0, 5))
         
     def create_drag_drop_area(self, parent):
-        """Create an enhanced drag and drop area"""
-        if DND_AVAILABLE:
-            # Main drag and drop container
-            self.dnd_container = tk.Frame(parent, bg='#1a1a1a')
-            self.dnd_container.pack(fill='x', pady=(0, 15))
-            
-            # Drag and drop frame with enhanced styling
-            self.dnd_frame = tk.Frame(self.dnd_container, 
-                                     bg='#23272e', 
-                                     height=80, 
-                                     bd=2, 
-                                     relief='ridge',
-                                     highlightbackground='#4a9eff',
-                                     highlightthickness=2)
-            self.dnd_frame.pack(fill='x', padx=10)
-            self.dnd_frame.pack_propagate(False)  # Maintain fixed height
-            
-            # Inner content frame
-            inner_frame = tk.Frame(self.dnd_frame, bg='#23272e')
-            inner_frame.pack(expand=True, fill='both')
-            
-            # Main drag text
-            self.dnd_main_label = tk.Label(inner_frame, 
-                                          text="📁 Drag & Drop Folder Here", 
-                                          font=('Segoe UI', 14, 'bold'), 
-                                          fg='#4a9eff', 
-                                          bg='#23272e')
-            self.dnd_main_label.pack(expand=True)
-            
-            # Subtitle
-            self.dnd_sub_label = tk.Label(inner_frame,
-                                         text="Or use the 'Select Folder' button below",
-                                         font=('Segoe UI', 10),
-                                         fg='#888888',
-                                         bg='#23272e')
-            self.dnd_sub_label.pack()
-            
-            # Register drop events for multiple components
-            self.dnd_frame.drop_target_register(DND_FILES)
-            self.dnd_frame.dnd_bind('<<Drop>>', self.on_drop_folder)
-            self.dnd_frame.dnd_bind('<<DragEnter>>', self.on_drag_enter)
-            self.dnd_frame.dnd_bind('<<DragLeave>>', self.on_drag_leave)
-            
-            # Also register for inner components
-            inner_frame.drop_target_register(DND_FILES)
-            inner_frame.dnd_bind('<<Drop>>', self.on_drop_folder)
-            inner_frame.dnd_bind('<<DragEnter>>', self.on_drag_enter)
-            inner_frame.dnd_bind('<<DragLeave>>', self.on_drag_leave)
-            
-            self.dnd_main_label.drop_target_register(DND_FILES)
-            self.dnd_main_label.dnd_bind('<<Drop>>', self.on_drop_folder)
-            self.dnd_main_label.dnd_bind('<<DragEnter>>', self.on_drag_enter)
-            self.dnd_main_label.dnd_bind('<<DragLeave>>', self.on_drag_leave)
-            
-        else:
+        """Create an enhanced drag and drop area. It only accepts drops once
+        enable_drag_and_drop has loaded the extension.
+        """
+        # Main drag and drop container
+        self.dnd_container = tk.Frame(parent, bg='#1a1a1a')
+        self.dnd_container.pack(fill='x', pady=(0, 15))
+        
+        # Drag and drop frame with enhanced styling
+        self.dnd_frame = tk.Frame(self.dnd_container, 
+                                 bg='#23272e', 
+                                 height=80, 
+                                 bd=2, 
+                                 relief='ridge',
+                                 highlightbackground='#4a9eff',
+                                 highlightthickness=2)
+        self.dnd_frame.pack(fill='x', padx=10)
+        self.dnd_frame.pack_propagate(False)  # Maintain fixed height
+        
+        # Inner content frame
+        self.dnd_inner_frame = tk.Frame(self.dnd_frame, bg='#23272e')
+        self.dnd_inner_frame.pack(expand=True, fill='both')
+        
+        # Main drag text
+        self.dnd_main_label = tk.Label(self.dnd_inner_frame, 
+                                      text="📁 Drag & Drop Folder Here", 
+                                      font=('Segoe UI', 14, 'bold'), 
+                                      fg='#4a9eff', 
+                                      bg='#23272e')
+        self.dnd_main_label.pack(expand=True)
+        
+        # Subtitle
+        self.dnd_sub_label = tk.Label(self.dnd_inner_frame,
+                                     text="Or use the 'Select Folder' button below",
+                                     font=('Segoe UI', 10),
+                                     fg='#888888',
+                                     bg='#23272e')
+        self.dnd_sub_label.pack()
+        
+    def enable_drag_and_drop(self):
+        """Load tkinterdnd2 into the running Tk and register the drop area"""
+        try:
+            from tkinterdnd2 import TkinterDnD
+            # Same as what TkinterDnD.Tk() does when it creates its root
+            require = getattr(TkinterDnD, 'require', None) or TkinterDnD._require
+            require(self.root)
+        except (ImportError, RuntimeError, tk.TclError):
             # Fallback message when drag and drop is not available
-            fallback_frame = tk.Frame(parent, bg='#2d2d2d', height=60, bd=1, relief='ridge')
-            fallback_frame.pack(fill='x', padx=10, pady=(0, 15))
-            fallback_label = tk.Label(fallback_frame, 
-                                     text="⚠️  Drag & Drop not available. Please use 'Select Folder' button.", 
-                                     font=('Segoe UI', 11), 
-                                     fg='#ffa500', 
-                                     bg='#2d2d2d')
-            fallback_label.pack(expand=True)
+            self.dnd_frame.configure(bg='#2d2d2d', highlightthickness=0, height=60)
+            self.dnd_inner_frame.configure(bg='#2d2d2d')
+            self.dnd_main_label.configure(text="⚠️  Drag & Drop not available. Please use 'Select Folder' button.",
+                                          font=('Segoe UI', 11),
+                                          fg='#ffa500',
+                                          bg='#2d2d2d')
+            self.dnd_sub_label.pack_forget()
+            return
+        self.dnd_available = True
+        
+        # Register drop events for multiple components
+        for widget in (self.dnd_frame, self.dnd_inner_frame, self.dnd_main_label):
+            widget.drop_target_register(DND_FILES)
+            widget.dnd_bind('<<Drop>>', self.on_drop_folder)
+            widget.dnd_bind('<<DragEnter>>', self.on_drag_enter)
+            widget.dnd_bind('<<DragLeave>>', self.on_drag_leave)
             
     def on_drag_enter(self, event):
         """Handle drag enter event - change appearance"""
-        if DND_AVAILABLE and hasattr(self, 'dnd_frame'):
+        if self.dnd_available:
             self.dnd_frame.configure(bg='#2d4a3e', highlightbackground='#5cb85c')
             self.dnd_main_label.configure(text="📂 Drop Folder Here!", fg='#5cb85c', bg='#2d4a3e')
             self.dnd_sub_label.configure(fg='#aaaaaa', bg='#2d4a3e')
             
     def on_drag_leave(self, event):
         """Handle drag leave event - restore appearance"""
-        if DND_AVAILABLE and hasattr(self, 'dnd_frame'):
+        if self.dnd_available:
             self.dnd_frame.configure(bg='#23272e', highlightbackground='#4a9eff')
             self.dnd_main_label.configure(text="📁 Drag & Drop Folder Here", fg='#4a9eff', bg='#23272e')
             self.dnd_sub_label.configure(fg='#888888', bg='#23272e')
             
     def on_drop_folder(self, event):
-        """Enhanced drop handler with better error handling and feedback"""
+        """Queue every dropped folder; dropped files are ignored"""
         try:
-            # Handle the dropped data
-            dropped = event.data.strip()
+            # Tcl list syntax: paths with spaces come wrapped in braces
+            items = [item.strip('{}') for item in self.root.tk.splitlist(event.data.strip())]
+            folders = [item for item in items if os.path.isdir(item)]
             
-            # Handle multiple files/folders (take the first folder)
-            if '\n' in dropped or ' ' in dropped and '{' in dropped:
-                # Parse multiple items or spaces in paths
-                items = []
-                if dropped.startswith('{'):
-                    # Windows style with braces
-                    import re
-                    items = re.findall(r'{([^}]+)}', dropped)
+            if not folders:
+                if not any(os.path.exists(item) for item in items):
+                    self.show_drop_error("Path does not exist!")
                 else:
-                    # Split by newlines or spaces
-                    items = dropped.replace('\n', ' ').split()
-                
-                # Find the first directory
-                for item in items:
-                    item = item.strip('{}')
-                    if os.path.isdir(item):
-                        dropped = item
-                        break
-            else:
-                # Single item, remove braces if present
-                dropped = dropped.strip('{}')
-            
-            # Validate that it's a directory
-            if not os.path.exists(dropped):
-                self.show_drop_error("Path does not exist!")
-                return
-                
-            if not os.path.isdir(dropped):
-                self.show_drop_error("Please drop a folder, not a file!")
+                    self.show_drop_error("Please drop a folder, not a file!")
                 return
             
-            # Check if folder is accessible
-            try:
-                os.listdir(dropped)
-            except PermissionError:
-                self.show_drop_error("Cannot access this folder! Permission denied.")
-                return
-            except Exception as e:
-                self.show_drop_error(f"Cannot access folder: {str(e)}")
-                return
+            # Check that every folder is accessible
+            for folder in folders:
+                try:
+                    # One entry is enough; listing a huge folder would stall the drop
+                    with os.scandir(folder) as it:
+                        next(it, None)
+                except PermissionError:
+                    self.show_drop_error(f"Cannot access {os.path.basename(folder)}! Permission denied.")
+                    return
+                except Exception as e:
+                    self.show_drop_error(f"Cannot access folder: {str(e)}")
+                    return
             
-            # Success - set the folder
-            self.selected_folder = dropped
-            display_path = dropped
-            if len(display_path) > 70:
-                display_path = "..." + display_path[-67:]
-            self.folder_var.set(display_path)
-            self.organize_btn.configure(state='normal')
-            self.progress_var.set("Folder selected via Drag & Drop - Ready to organize!")
+            # Success - queue the folders
+            self.set_selected_folders(folders)
+            self.progress_var.set("Folder selected via Drag & Drop - Ready to organize!"
+                                  if len(folders) == 1 else
+                                  f"{len(folders)} folders queued via Drag & Drop - Ready to organize!")
             
             # Visual feedback for successful drop
-            if DND_AVAILABLE and hasattr(self, 'dnd_frame'):
+            if self.dnd_available:
                 # Briefly show success state
                 self.dnd_frame.configure(bg='#2d4a2d', highlightbackground='#28a745')
-                self.dnd_main_label.configure(text="✅ Folder Selected!", fg='#28a745', bg='#2d4a2d')
-                self.dnd_sub_label.configure(text=f"Ready to organize: {os.path.basename(dropped)}", fg='#aaaaaa', bg='#2d4a2d')
+                if len(folders) == 1:
+                    main_text = "✅ Folder Selected!"
+                    sub_text = f"Ready to organize: {os.path.basename(folders[0])}"
+                else:
+                    main_text = f"✅ {len(folders)} Folders Queued!"
+                    sub_text = "Ready to organize: " + ", ".join(os.path.basename(f) for f in folders)
+                    if len(sub_text) > 70:
+                        sub_text = sub_text[:67] + "..."
+                self.dnd_main_label.configure(text=main_text, fg='#28a745', bg='#2d4a2d')
+                self.dnd_sub_label.configure(text=sub_text, fg='#aaaaaa', bg='#2d4a2d')
                 
                 # Reset to normal after 2 seconds
                 self.root.after(2000, self.reset_drag_area)
@@ -524,9 +463,21 @@ class ModernFolderOrganizer:
         except Exception as e:
             self.show_drop_error(f"Error processing drop: {str(e)}")
             
+    def set_selected_folders(self, folders):
+        self.selected_folders = list(folders)
+        self.selected_folder = folders[0]
+        if len(folders) == 1:
+            display_path = folders[0]
+        else:
+            display_path = f"{len(folders)} folders: " + ", ".join(os.path.basename(f) for f in folders)
+        if len(display_path) > 70:
+            display_path = "..." + display_path[-67:]
+        self.folder_var.set(display_path)
+        self.organize_btn.configure(state='normal')
+            
     def show_drop_error(self, message):
         """Show error feedback in drag area and messagebox"""
-        if DND_AVAILABLE and hasattr(self, 'dnd_frame'):
+        if self.dnd_available:
             self.dnd_frame.configure(bg='#4a2d2d', highlightbackground='#dc3545')
             self.dnd_main_label.configure(text="❌ Error!", fg='#dc3545', bg='#4a2d2d')
             self.dnd_sub_label.configure(text=message, fg='#aaaaaa', bg='#4a2d2d')
@@ -538,25 +489,43 @@ class ModernFolderOrganizer:
         
     def reset_drag_area(self):
         """Reset drag area to normal appearance"""
-        if DND_AVAILABLE and hasattr(self, 'dnd_frame'):
+        if self.dnd_available:
             self.dnd_frame.configure(bg='#23272e', highlightbackground='#4a9eff')
             self.dnd_main_label.configure(text="📁 Drag & Drop Folder Here", fg='#4a9eff', bg='#23272e')
             self.dnd_sub_label.configure(text="Or use the 'Select Folder' button below", fg='#888888', bg='#23272e')
         
     def select_folder(self):
+        from tkinter import filedialog
+        
         folder_selected = filedialog.askdirectory(
             title="Select Folder to Organize",
             parent=self.root
         )
         if folder_selected:
-            self.selected_folder = folder_selected
-            display_path = folder_selected
-            if len(display_path) > 70:
-                display_path = "..." + display_path[-67:]
-            self.folder_var.set(display_path)
-            self.organize_btn.configure(state='normal')
+            self.set_selected_folders([folder_selected])
             self.progress_var.set("Folder selected - Ready to organize!")
             
+    def select_output_folder(self):
+        from tkinter import filedialog
+        
+        folder_selected = filedialog.askdirectory(
+            title="Select Output Folder",
+            parent=self.root
+        )
+        if folder_selected:
+            self.output_folder = folder_selected
+            display_path = folder_selected
+            if len(display_path) > 45:
+                display_path = "..." + display_path[-42:]
+            self.output_var.set(f"Output: {display_path}")
+            self.mode_box.configure(state='readonly')
+            
+    def clear_output_folder(self):
+        self.output_folder = None
+        self.output_var.set("Output: same folder")
+        self.mode_var.set("move")
+        self.mode_box.configure(state='disabled')
+        
     def organize_files(self):
         if not self.selected_folder:
             messagebox.showwarning("Warning", "Please select a folder first!")
@@ -565,63 +534,154 @@ class ModernFolderOrganizer:
         # Start organizing in a separate thread to prevent GUI freezing
         self.organize_btn.configure(state='disabled')
         self.select_btn.configure(state='disabled')
+        self.progress_bar.configure(mode='indeterminate', value=0)
         self.progress_bar.start(10)
         self.progress_var.set("Organizing files...")
         
-        threading.Thread(target=self._organize_files_thread, daemon=True).start()
+        # The worker only puts throttled progress events on this queue; the
+        # GUI drains it on a timer instead of the worker calling root.after
+        self.progress_queue = queue.Queue()
+        self.organizing = True
+        self.run_control = RunControl()
+        self.pause_btn.configure(state='normal', text="⏸ Pause")
+        self.cancel_btn.configure(state='normal')
+        options = OrganizeOptions(recursive=self.recursive_var.get(),
+                                  dest_root=self.output_folder,
+                                  mode=self.mode_var.get(),
+                                  date_folders=self.date_folders_var.get())
+        target = self._organize_batch_thread if len(self.selected_folders) > 1 \
+            else self._organize_files_thread
+        threading.Thread(target=target, args=(options,), daemon=True).start()
+        self.root.after(100, self._poll_progress)
+        
+    def toggle_pause(self):
+        if self.run_control is None:
+            return
+        if self.run_control.paused:
+            self.run_control.resume()
+            self.pause_btn.configure(text="⏸ Pause")
+        else:
+            self.run_control.pause()
+            self.pause_btn.configure(text="▶ Resume")
+            self.progress_var.set("Paused - no files are being moved")
+            
+    def cancel_organize(self):
+        if self.run_control is None:
+            return
+        self.run_control.cancel()
+        self.pause_btn.configure(state='disabled')
+        self.cancel_btn.configure(state='disabled')
+        self.progress_var.set("Cancelling after the current file...")
         
-    def _organize_files_thread(self):
+    def _poll_progress(self):
+        event = None
         try:
-            app_dir = get_app_dir()
-            ext_map_path = os.path.join(app_dir, "extension_map.txt")
-            ext_map = load_extension_map(ext_map_path)
+            while True:
+                event = self.progress_queue.get_nowait()
+        except queue.Empty:
+            pass
+        
+        if isinstance(event, str):
+            # Batch runs report whole folders as plain status text
+            if self.organizing and not self.run_control.paused \
+                    and not self.run_control.cancelled:
+                self.progress_var.set(event)
+        elif event is not None and self.organizing and not self.run_control.paused \
+                and not self.run_control.cancelled:
+            if event.files_total:
+                if str(self.progress_bar.cget('mode')) != 'determinate':
+                    self.progress_bar.stop()
+                    self.progress_bar.configure(mode='determinate')
+                self.progress_bar.configure(maximum=event.files_total, value=event.files_done)
+            self.progress_var.set(event.format())
+        
+        if self.organizing:
+            self.root.after(100, self._poll_progress)
             
+    def _organize_files_thread(self, options):
+        try:
             if not os.path.exists(self.selected_folder):
                 self.root.after(0, lambda: messagebox.showerror("Error", f"Folder not found: {self.selected_folder}"))
+                self.root.after(0, self._reset_ui)
                 return
-                
-            files_moved = 0
-            files_skipped = 0
-            
-            for filename in os.listdir(self.selected_folder):
-                file_path = os.path.join(self.selected_folder, filename)
-                if os.path.isdir(file_path):
-                    files_skipped += 1
-                    continue
-                    
-                _, extension = os.path.splitext(filename)
-                extension = extension[1:].upper()
-                
-                if not extension:
-                    files_skipped += 1
-                    continue
-                    
-                folder_name = ext_map.get(extension, f"Other_{extension}")
-                dest_folder = os.path.join(self.selected_folder, folder_name)
-                
-                if not os.path.exists(dest_folder):
-                    os.makedirs(dest_folder)
-                    
-                try:
-                    shutil.move(file_path, os.path.join(dest_folder, filename))
-                    files_moved += 1
-                except Exception as e:
-                    files_skipped += 1
-                    print(f"Error moving {filename}: {e}")
+
+            result = organize(self.selected_folder, default_extension_map_path(), options,
+                              on_progress=self.progress_queue.put,
+                              control=self.run_control)
             
             # Update UI on main thread
-            self.root.after(0, lambda: self._organization_complete(files_moved, files_skipped))
+            if result.cancelled:
+                self.root.after(0, lambda: self._organization_cancelled(result))
+            else:
+                self.root.after(0, lambda: self._organization_complete(result.files_moved, result.files_skipped))
             
         except Exception as e:
             self.root.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {str(e)}"))
             self.root.after(0, self._reset_ui)
             
-    def _organization_complete(self, files_moved, files_skipped):
+    def _organize_batch_thread(self, options):
+        import batch
+        
+        folders = list(self.selected_folders)
+        finished = 0
+        lock = threading.Lock()
+        
+        # Several folders run at once, so the status line counts folders
+        # rather than showing one run's file progress
+        def folder_done(entry):
+            nonlocal finished
+            with lock:
+                finished += 1
+                self.progress_queue.put(f"Organized {finished} of {len(folders)} folders "
+                                        f"(last: {os.path.basename(entry.folder)})")
+        
+        try:
+            self.progress_queue.put(f"Organizing {len(folders)} folders...")
+            report = batch.organize_many(folders, default_extension_map_path(), options,
+                                         control=self.run_control, on_folder_done=folder_done)
+            if report.cancelled:
+                self.root.after(0, lambda: self._batch_cancelled(report))
+            else:
+                self.root.after(0, lambda: self._batch_complete(report))
+        except Exception as e:
+            self.root.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {str(e)}"))
+            self.root.after(0, self._reset_ui)
+            
+    def _batch_complete(self, report):
+        failed = [f for f in report.folders if f.error is not None]
+        if not failed:
+            self._organization_complete(report.files_moved, report.files_skipped,
+                                        len(report.folders))
+            return
+        self._finish_run()
         self.progress_bar.stop()
-        self.organize_btn.configure(state='normal')
-        self.select_btn.configure(state='normal')
+        message = f"⚠️ {len(report.folders) - len(failed)} of {len(report.folders)} folders organized.\n\n"
+        message += f"📁 Files moved: {report.files_moved}\n\n"
+        message += "\n".join(f"❌ {os.path.basename(f.folder)}: {f.error}" for f in failed[:10])
+        messagebox.showwarning("Finished with errors", message)
+        self.progress_var.set(f"Complete! {report.files_moved} files organized")
+        
+    def _batch_cancelled(self, report):
+        self._finish_run()
+        self.progress_bar.stop()
+        not_started = sum(1 for f in report.folders if f.result is None and f.error is None)
+        message = f"⏹️ Organizing cancelled.\n\n"
+        message += f"📁 Files moved: {report.files_moved}\n"
+        message += f"📂 Folders not started: {not_started}\n\n"
+        message += "Every file is either in its original place or its new folder."
+        messagebox.showinfo("Cancelled", message)
+        self.progress_var.set(f"Cancelled - {report.files_moved} files organized")
+        
+    def _organization_complete(self, files_moved, files_skipped, folders=1):
+        from datetime import datetime
+        
+        self._finish_run()
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode='determinate', maximum=1, value=1)
         
         success_msg = f"✅ Organization Complete!\n\n"
+        if folders > 1:
+            success_msg += f"📂 Folders: {folders}\n"
         success_msg += f"📁 Files moved: {files_moved}\n"
         success_msg += f"⏭️ Files skipped: {files_skipped}\n"
         success_msg += f"📅 Completed at: {datetime.now().strftime('%H:%M:%S')}"
@@ -629,25 +689,45 @@ class ModernFolderOrganizer:
         messagebox.showinfo("Success", success_msg)
         self.progress_var.set(f"Complete! {files_moved} files organized")
         
-    def _reset_ui(self):
+    def _organization_cancelled(self, result):
+        self._finish_run()
         self.progress_bar.stop()
+        
+        message = f"⏹️ Organizing cancelled.\n\n"
+        message += f"📁 Files moved: {result.files_moved}\n"
+        if result.files_remaining is not None:
+            message += f"📄 Files left in place: {result.files_remaining}\n\n"
+            message += "Every file is either in its original place or its new folder.\n"
+            message += "Run the command line with --resume to finish the run."
+        messagebox.showinfo("Cancelled", message)
+        self.progress_var.set(f"Cancelled - {result.files_moved} files organized")
+        
+    def _finish_run(self):
+        self.organizing = False
         self.organize_btn.configure(state='normal')
         self.select_btn.configure(state='normal')
+        self.pause_btn.configure(state='disabled', text="⏸ Pause")
+        self.cancel_btn.configure(state='disabled')
+        
+    def _reset_ui(self):
+        self._finish_run()
+        self.progress_bar.stop()
+        self.progress_bar.configure(value=0)
         self.progress_var.set("An error occurred - Please try again")
         
     def open_settings(self):
         settings_window = tk.Toplevel(self.root)
         settings_window.title("⚙️ Organizer Settings")
-        settings_window.geometry("500x400")
+        settings_window.geometry("640x520")
         settings_window.configure(bg='#1a1a1a')
         settings_window.transient(self.root)
         settings_window.grab_set()
         
         # Center settings window
         settings_window.update_idletasks()
-        x = self.root.winfo_x() + 50
-        y = self.root.winfo_y() + 50
-        settings_window.geometry(f"500x400+{x}+{y}")
+        x = self.root.winfo_x() + 5
+        y = self.root.winfo_y() + 10
+        settings_window.geometry(f"640x520+{x}+{y}")
         
         # Settings content
         settings_frame = tk.Frame(settings_window, bg='#2d2d2d')
@@ -657,44 +737,77 @@ class ModernFolderOrganizer:
                 text="File Extension Mappings",
                 font=('Segoe UI', 16, 'bold'),
                 fg='#ffffff',
-                bg='#2d2d2d').pack(pady=(0, 15))
-        
-        tk.Label(settings_frame,
-                text="Edit the mappings below (format: EXTENSION=FOLDER)",
-                font=('Segoe UI', 10),
-                fg='#a0a0a0',
                 bg='#2d2d2d').pack(pady=(0, 10))
         
-        # Text editor for extension map
-        text_frame = tk.Frame(settings_frame, bg='#2d2d2d')
-        text_frame.pack(fill='both', expand=True, pady=(0, 15))
-        
-        self.settings_text = tk.Text(text_frame,
-                                    bg='#1a1a1a',
-                                    fg='#ffffff',
-                                    font=('Consolas', 10),
-                                    insertbackground='#4a9eff',
-                                    selectbackground='#4a9eff',
-                                    selectforeground='#ffffff',
-                                    wrap='none')
-        
-        scrollbar = tk.Scrollbar(text_frame, orient='vertical', command=self.settings_text.yview)
-        self.settings_text.configure(yscrollcommand=scrollbar.set)
-        
-        self.settings_text.pack(side='left', fill='both', expand=True)
+        # Search box; the table is refiltered shortly after typing stops
+        search_row = tk.Frame(settings_frame, bg='#2d2d2d')
+        search_row.pack(fill='x', pady=(0, 8))
+        tk.Label(search_row, text="🔍", font=('Segoe UI', 10),
+                fg='#a0a0a0', bg='#2d2d2d').pack(side='left')
+        self.settings_search_var = tk.StringVar()
+        tk.Entry(search_row, textvariable=self.settings_search_var,
+                bg='#1a1a1a', fg='#ffffff', insertbackground='#4a9eff',
+                font=('Segoe UI', 10)).pack(side='left', fill='x', expand=True, padx=(5, 0))
+        self.settings_count_var = tk.StringVar()
+        tk.Label(search_row, textvariable=self.settings_count_var, font=('Segoe UI', 9),
+                fg='#a0a0a0', bg='#2d2d2d').pack(side='left', padx=(8, 0))
+        
+        # Buttons (packed before the table so they keep their space)
+        btn_frame = tk.Frame(settings_frame, bg='#2d2d2d')
+        btn_frame.pack(side='bottom', fill='x')
+        
+        # Editor for the selected rule
+        edit_row = tk.Frame(settings_frame, bg='#2d2d2d')
+        edit_row.pack(side='bottom', fill='x', pady=(8, 10))
+        self.settings_kind_var = tk.StringVar(value="ext")
+        ttk.Combobox(edit_row, textvariable=self.settings_kind_var,
+                    values=list(RULE_KINDS), state='readonly',
+                    width=5).pack(side='left')
+        self.settings_key_var = tk.StringVar()
+        tk.Entry(edit_row, textvariable=self.settings_key_var, width=18,
+                bg='#1a1a1a', fg='#ffffff', insertbackground='#4a9eff',
+                font=('Consolas', 10)).pack(side='left', padx=(5, 0))
+        tk.Label(edit_row, text="→", font=('Segoe UI', 10),
+                fg='#a0a0a0', bg='#2d2d2d').pack(side='left', padx=4)
+        self.settings_folder_var = tk.StringVar()
+        tk.Entry(edit_row, textvariable=self.settings_folder_var,
+                bg='#1a1a1a', fg='#ffffff', insertbackground='#4a9eff',
+                font=('Consolas', 10)).pack(side='left', fill='x', expand=True)
+        ttk.Button(edit_row, text="➕", width=3, style='Secondary.TButton',
+                  command=self.add_settings_rule).pack(side='left', padx=(5, 0))
+        ttk.Button(edit_row, text="✔", width=3, style='Secondary.TButton',
+                  command=self.update_settings_rule).pack(side='left', padx=(3, 0))
+        ttk.Button(edit_row, text="🗑", width=3, style='Secondary.TButton',
+                  command=self.delete_settings_rule).pack(side='left', padx=(3, 0))
+        
+        # The rules table
+        table_frame = tk.Frame(settings_frame, bg='#2d2d2d')
+        table_frame.pack(fill='both', expand=True)
+        self.settings_table = ttk.Treeview(table_frame, columns=('kind', 'key', 'folder'),
+                                           show='headings', selectmode='browse')
+        self.settings_table.heading('kind', text="Type")
+        self.settings_table.heading('key', text="Extension / pattern")
+        self.settings_table.heading('folder', text="Folder")
+        self.settings_table.column('kind', width=50, stretch=False)
+        self.settings_table.column('key', width=180)
+        self.settings_table.column('folder', width=300)
+        scrollbar = ttk.Scrollbar(table_frame, orient='vertical',
+                                  command=self.settings_table.yview)
+        self.settings_table.configure(yscrollcommand=scrollbar.set)
+        self.settings_table.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
+        self.settings_table.bind('<<TreeviewSelect>>', self.on_settings_select)
         
-        # Load current settings
-        app_dir = get_app_dir()
-        ext_map_path = os.path.join(app_dir, "extension_map.txt")
+        # Load current settings. Every line is kept as a row, so comments
+        # and their positions survive a save; only rules are shown
+        ext_map_path = default_extension_map_path()
         ensure_extension_map(ext_map_path)
-        
         with open(ext_map_path, 'r', encoding='utf-8') as f:
-            self.settings_text.insert('1.0', f.read())
-        
-        # Buttons
-        btn_frame = tk.Frame(settings_frame, bg='#2d2d2d')
-        btn_frame.pack(fill='x')
+            self.settings_rows = [self._settings_row(line) for line in f.read().splitlines()]
+        self._settings_fill_job = None
+        self._settings_search_job = None
+        self.settings_search_var.trace_add('write', lambda *args: self._schedule_settings_search())
+        self.refresh_settings_table()
         
         ttk.Button(btn_frame,
                   text="💾 Save Changes",
@@ -706,11 +819,141 @@ class ModernFolderOrganizer:
                   style='Secondary.TButton',
                   command=settings_window.destroy).pack(side='left')
         
+    @staticmethod
+    def _settings_row(line):
+        """[kind, key, folder] for a map line; comments and broken lines are
+        kept as ["#", line, ""] and ["?", line, ""]
+        """
+        try:
+            parsed = parse_line(line)
+        except ValueError:
+            return ["?", line.strip(), ""]
+        if parsed is None:
+            return ["#", line, ""]
+        return list(parsed)
+        
+    def _settings_text(self):
+        lines = []
+        for kind, key, folder in self.settings_rows:
+            if kind in ("#", "?"):
+                lines.append(key)
+            else:
+                lines.append(format_line(kind, key, folder))
+        return "\n".join(lines) + "\n"
+        
+    def _schedule_settings_search(self):
+        if self._settings_search_job is not None:
+            self.root.after_cancel(self._settings_search_job)
+        self._settings_search_job = self.root.after(150, self.refresh_settings_table)
+        
+    def refresh_settings_table(self, select=None):
+        """Refill the table with the rows matching the search. Rows go in a
+        few hundred at a time so big maps don't freeze the window.
+        """
+        self._settings_search_job = None
+        if self._settings_fill_job is not None:
+            self.root.after_cancel(self._settings_fill_job)
+            self._settings_fill_job = None
+        table = self.settings_table
+        table.delete(*table.get_children())
+        needle = self.settings_search_var.get().strip().lower()
+        matches = [i for i, (kind, key, folder) in enumerate(
+                       row or (None, "", "") for row in self.settings_rows)
+                   if kind not in ("#", None) and (not needle or needle in key.lower()
+                                       or needle in folder.lower())]
+        rule_count = sum(1 for row in self.settings_rows if row and row[0] != "#")
+        self.settings_count_var.set(f"{len(matches)} of {rule_count}")
+        
+        def fill(start):
+            for i in matches[start:start + 300]:
+                kind, key, folder = self.settings_rows[i]
+                table.insert('', 'end', iid=str(i), values=(kind, key, folder))
+            if start + 300 < len(matches):
+                self._settings_fill_job = self.root.after(1, lambda: fill(start + 300))
+            else:
+                self._settings_fill_job = None
+                if select is not None and table.exists(str(select)):
+                    table.selection_set(str(select))
+                    table.see(str(select))
+        fill(0)
+        
+    def on_settings_select(self, event=None):
+        selection = self.settings_table.selection()
+        if not selection:
+            return
+        kind, key, folder = self.settings_rows[int(selection[0])]
+        self.settings_kind_var.set(kind if kind in RULE_KINDS else "ext")
+        self.settings_key_var.set(key)
+        self.settings_folder_var.set(folder)
+        
+    def _settings_edited_row(self):
+        kind = self.settings_kind_var.get()
+        key = self.settings_key_var.get().strip()
+        folder = self.settings_folder_var.get().strip()
+        if not key or not folder:
+            messagebox.showwarning("Missing value", "Enter both an extension (or pattern) and a folder.")
+            return None
+        if kind == "ext":
+            key = key.lstrip(".").upper()
+        return [kind, key, folder]
+        
+    def add_settings_rule(self):
+        row = self._settings_edited_row()
+        if row is None:
+            return
+        self.settings_rows.append(row)
+        self.refresh_settings_table(select=len(self.settings_rows) - 1)
+        
+    def update_settings_rule(self):
+        selection = self.settings_table.selection()
+        if not selection:
+            self.add_settings_rule()
+            return
+        row = self._settings_edited_row()
+        if row is None:
+            return
+        i = int(selection[0])
+        self.settings_rows[i] = row
+        self.settings_table.item(selection[0], values=tuple(row))
+        
+    def delete_settings_rule(self):
+        selection = self.settings_table.selection()
+        if not selection:
+            return
+        i = int(selection[0])
+        # Keep row numbers (the table's ids) stable until the save
+        self.settings_rows[i] = None
+        self.settings_table.delete(selection[0])
+        
     def save_settings(self, ext_map_path, settings_window):
+        if None in self.settings_rows:
+            self.settings_rows = [row for row in self.settings_rows if row is not None]
+            self.refresh_settings_table()
+        content = self._settings_text()
+        problems = validate_rules(content)
+        errors = [p for p in problems if p[1] == "error"]
+        shown = errors or problems
+        if shown:
+            lines = []
+            for lineno, level, message in shown[:15]:
+                kind, key, folder = self.settings_rows[lineno - 1]
+                lines.append(f"• {key}: {message}")
+            if len(shown) > 15:
+                lines.append(f"... and {len(shown) - 15} more")
+            # Point the table at the first offending rule
+            self.settings_search_var.set("")
+            self.refresh_settings_table(select=shown[0][0] - 1)
+            if errors:
+                messagebox.showerror("Invalid mappings",
+                                     "Fix these mappings before saving:\n\n" + "\n".join(lines),
+                                     parent=settings_window)
+                return
+            if not messagebox.askyesno("Check mappings",
+                                       "\n".join(lines) + "\n\nSave anyway?",
+                                       parent=settings_window):
+                return
         try:
-            content = self.settings_text.get('1.0', 'end-1c')
-            with open(ext_map_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            save_extension_map(ext_map_path, content)
             messagebox.showinfo("Success", "Settings saved successfully!")
             settings_window.destroy()
         except Exception as e:
@@ -10,7 +10,8 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Not used by the app; left out to keep the bundle small
+    excludes=['unittest', 'pydoc', 'doctest', 'pdb', 'xmlrpc', 'lib2to3'],
     noarchive=False,
     optimize=0,
 )
@@ -26,7 +27,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
@@ -0,0 +1,1527 @@
+"""Headless organizing engine and command-line entry point.
+
+Everything in here runs without tkinter so it can be used on servers with no
+display, from cron, or imported by the GUI in main.py.
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+
+from extension_index import (
+    ExtensionIndex,
+    invalidate_extension_index,
+    load_extension_index,
+    parse_rules,
+    validate_rules,
+)
+from transfer import (
+    COLLISION_POLICIES,
+    DUPLICATE,
+    MODES,
+    RENAMED,
+    SKIPPED,
+    CopyCancelled,
+    Mover,
+)
+
+# Get the directory where the script or exe is located
+def get_app_dir():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    else:
+        return os.path.dirname(os.path.abspath(__file__))
+
+# Default extension map content
+DEFAULT_EXTENSION_MAP = """
+PDF=Documents/PDF Files
+DOC=Documents/Word Files
+DOCX=Documents/Word Files
+TXT=Documents/Text Files
+XLS=Documents/Excel Files
+XLSX=Documents/Excel Files
+XLSB=Documents/Excel Files
+PPT=Documents/PowerPoint Files
+PPTX=Documents/PowerPoint Files
+ODT=Documents/OpenDocument Files
+ODS=Documents/OpenDocument Files
+CSV=Documents/CSV Files
+RTF=Documents/Text Files
+MD=Documents/Markdown Files
+LOG=Documents/Log Files
+EPUB=Documents/eBooks
+MOBI=Documents/eBooks
+CBZ=Documents/Comic Books
+CBR=Documents/Comic Books
+
+JPG=Images/JPG Images
+JPEG=Images/JPG Images
+PNG=Images/PNG Images
+GIF=Images/GIF Images
+BMP=Images/BMP Images
+SVG=Images/SVG Images
+WEBP=Images/WEBP Images
+TIFF=Images/TIFF Images
+ICO=Images/Icon Files
+HEIC=Images/HEIC Images
+RAW=Images/RAW Images
+CR2=Images/RAW Images
+NEF=Images/RAW Images
+ARW=Images/RAW Images
+DNG=Images/RAW Images
+
+MP4=Videos/MP4 Videos
+MKV=Videos/MKV Videos
+AVI=Videos/AVI Videos
+MOV=Videos/MOV Videos
+WMV=Videos/WMV Videos
+FLV=Videos/FLV Videos
+WEBM=Videos/WEBM Videos
+MPEG=Videos/MPEG Videos
+MPG=Videos/MPEG Videos
+3GP=Videos/3GP Videos
+M4V=Videos/M4V Videos
+VOB=Videos/VOB Videos
+OGV=Videos/OGV Videos
+F4V=Videos/F4V Videos
+
+MP3=Audio/MP3 Audio
+WAV=Audio/WAV Audio
+AAC=Audio/AAC Audio
+FLAC=Audio/FLAC Audio
+OGG=Audio/OGG Audio
+M4A=Audio/M4A Audio
+WMA=Audio/WMA Audio
+AMR=Audio/AMR Audio
+AIF=Audio/AIF Audio
+AIFF=Audio/AIF Audio
+APE=Audio/APE Audio
+OPUS=Audio/OPUS Audio
+MID=Audio/MIDI Audio
+MIDI=Audio/MIDI Audio
+
+ZIP=Archives/ZIP Archives
+RAR=Archives/RAR Archives
+7Z=Archives/7Z Archives
+TAR=Archives/TAR Archives
+GZ=Archives/GZ Archives
+BZ2=Archives/BZ2 Archives
+XZ=Archives/XZ Archives
+TAR.GZ=Archives/TAR Archives
+TGZ=Archives/TAR Archives
+TAR.BZ2=Archives/TAR Archives
+TAR.XZ=Archives/TAR Archives
+ISO=Archives/ISO Archives
+CAB=Archives/CAB Archives
+ARJ=Archives/ARJ Archives
+LZH=Archives/LZH Archives
+ACE=Archives/ACE Archives
+Z=Archives/Z Archives
+JAR=Archives/JAR Archives
+
+PY=Code/Python
+JS=Code/JavaScript
+JAVA=Code/Java
+CPP=Code/C++
+C=Code/C
+CS=Code/CSharp
+HTML=Code/HTML
+CSS=Code/CSS
+PHP=Code/PHP
+RB=Code/Ruby
+GO=Code/Go
+RS=Code/Rust
+TS=Code/TypeScript
+SH=Code/Shell
+BAT=Code/Batch
+PL=Code/Perl
+SWIFT=Code/Swift
+KOTLIN=Code/Kotlin
+SCALA=Code/Scala
+R=Code/R
+IPYNB=Code/Jupyter
+JSON=Code/JSON
+XML=Code/XML
+YML=Code/YAML
+YAML=Code/YAML
+ASP=Code/ASP
+ASPX=Code/ASP.NET
+VBS=Code/VBScript
+SQL=Code/SQL
+LUA=Code/Lua
+H=Code/C-Headers
+HPP=Code/C++-Headers
+
+EXE=Applications/Windows Executables
+MSI=Applications/Windows Installers
+APK=Applications/Android Packages
+APPX=Applications/Windows App Packages
+DMG=Applications/Mac Installers
+PKG=Applications/Mac Packages
+APP=Applications/Mac Apps
+IPA=Applications/iOS Apps
+
+TTF=Fonts/TrueType
+OTF=Fonts/OpenType
+FON=Fonts/Bitmap
+WOFF=Fonts/Web Open Font
+WOFF2=Fonts/Web Open Font 2
+EOT=Fonts/Embedded OpenType
+PFA=Fonts/PostScript
+PFB=Fonts/PostScript
+
+KEY=Presentations/Keynote
+ODP=Presentations/OpenDocument
+NUMBERS=Spreadsheets/Numbers
+XLSM=Spreadsheets/Excel Macro
+
+AI=VectorGraphics/Illustrator
+EPS=VectorGraphics/EPS
+CDR=VectorGraphics/CorelDRAW
+PSD=VectorGraphics/Photoshop
+SVGZ=VectorGraphics/SVG Compressed
+
+
+# Add more extensions as needed
+# You can add more extensions and their corresponding folders here
+# Example:
+# TXT=Documents/Text Files
+# MP3=Audio/MP3 Audio
+# 
+"""
+
+def ensure_extension_map(filepath):
+    if not os.path.exists(filepath):
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write(DEFAULT_EXTENSION_MAP)
+
+def save_extension_map(filepath, text):
+    """Replace the map file with `text` atomically (write a temporary file
+    next to it, then rename it over) and drop its cached compiled index
+    """
+    import tempfile
+
+    fd, tmp_path = tempfile.mkstemp(prefix=".extension_map.", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(filepath)))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    invalidate_extension_index(filepath)
+
+def parse_extension_map(text):
+    """Plain EXT -> folder dict; pattern rules are only used by ExtensionIndex"""
+    return {key: folder for _, kind, key, folder in parse_rules(text) if kind == "ext"}
+
+def load_extension_map(filepath):
+    ensure_extension_map(filepath)
+    with open(filepath, "r", encoding="utf-8") as f:
+        return parse_extension_map(f.read())
+
+def default_extension_map_path():
+    return os.path.join(get_app_dir(), "extension_map.txt")
+
+def load_rules(ext_map_path=None):
+    """Compiled (and cached) rules for an extension map file"""
+    filepath = ext_map_path or default_extension_map_path()
+    ensure_extension_map(filepath)
+    return load_extension_index(filepath)
+
+def as_index(ext_map):
+    """Accept either a plain extension dict or a compiled ExtensionIndex"""
+    if isinstance(ext_map, ExtensionIndex):
+        return ext_map
+    return ExtensionIndex(ext_map)
+
+def classify(filename, ext_map):
+    """Return the destination folder for a file name, or None to skip it"""
+    return as_index(ext_map).classify(filename)
+
+
+class MoveOp:
+    """A single planned move of `src` into the `category` folder `dest_folder`.
+
+    `mode` overrides the run's transfer mode for this file, e.g. files that
+    are already organized are always moved, even in a copy run. `outcome` is
+    set by the executor when a name collision changed what happened (see
+    transfer.Mover.place); a renamed file also gets its new `filename`.
+    """
+    __slots__ = ('filename', 'src', 'dest_folder', 'category', 'size', 'mode', 'outcome')
+
+    def __init__(self, filename, src, dest_folder, category, size=None, mode=None):
+        self.filename = filename
+        self.src = src
+        self.dest_folder = dest_folder
+        self.category = category
+        self.size = size
+        self.mode = mode
+        self.outcome = None
+
+    @property
+    def dest(self):
+        return os.path.join(self.dest_folder, self.filename)
+
+
+class FolderCache:
+    """Remembers which directories are known to exist.
+
+    `ensure` only touches the disk the first time a folder is asked for, so
+    each destination costs at most one makedirs call per run.
+    """
+
+    def __init__(self, existing=()):
+        self.known = set(existing)
+
+    def ensure(self, path):
+        if path in self.known:
+            return
+        os.makedirs(path, exist_ok=True)
+        while path not in self.known:
+            self.known.add(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+
+class OrganizeOptions:
+    """Knobs for an organize run; the defaults match the original GUI behaviour.
+
+    recursive  -- also organize files in subfolders (into the top-level categories)
+    max_depth  -- how many folder levels below the root to descend, None for no limit
+    exclude    -- fnmatch patterns; matching names or root-relative paths are left alone
+    workers    -- number of concurrent moves
+    journal    -- write a crash-safe journal under <root>/.organizer (see journal.py)
+    sniff      -- detect the type of files with no or unknown extension by content
+    incremental -- keep a state index under <root>/.organizer so re-runs skip
+                   unchanged subfolders and a map change moves only the files
+                   whose category changed (see state_index.py)
+    dest_root  -- where the category folders go, None for the organized folder
+                  itself; the journal and other state are kept there too
+    mode       -- how files get there: "move", "copy", "hardlink" or "reflink";
+                  all but "move" leave the originals in place, so they need a
+                  dest_root outside the organized folder
+    collisions -- when the destination name is taken: "rename", "skip",
+                  "overwrite" or "dedupe" (drop identical files, rename others)
+    date_folders -- put files in Images/ and Videos/ folders into YYYY/MM
+                  subfolders by the capture date in their metadata
+    stats      -- collect per-phase timings, per-category totals, errors by
+                  errno and the slowest files in result.stats (see telemetry.py)
+    batch_size -- files held in memory at once by the batched stages (content
+                  sniffing, capture dates); None for their defaults
+    """
+
+    def __init__(self, recursive=False, max_depth=None, exclude=(), workers=1,
+                 journal=True, sniff=False, incremental=False, dest_root=None,
+                 mode="move", collisions="rename", date_folders=False, stats=False,
+                 batch_size=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown transfer mode {mode!r}; use one of {', '.join(MODES)}")
+        if mode != "move" and not dest_root:
+            raise ValueError(f"{mode} mode leaves the originals in place, so it needs a "
+                             "separate dest_root")
+        if collisions not in COLLISION_POLICIES:
+            raise ValueError(f"Unknown collision policy {collisions!r}; "
+                             f"use one of {', '.join(COLLISION_POLICIES)}")
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.recursive = recursive
+        self.max_depth = max_depth
+        self.exclude = tuple(exclude)
+        self.workers = workers
+        self.journal = journal
+        self.sniff = sniff
+        self.incremental = incremental
+        self.dest_root = dest_root
+        self.mode = mode
+        self.collisions = collisions
+        self.date_folders = date_folders
+        self.stats = stats
+        self.batch_size = batch_size
+
+
+class OrganizePlan:
+    """The moves an organize run would make plus the entries it skips"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.moves = []
+        self.skipped = 0
+        # Directories seen during the scan or made by the run, so they never
+        # need a stat later and are not mistaken for input
+        self.folders = FolderCache()
+        # Set for dry runs so no caches are written under the root
+        self.read_only = False
+        # A state_index.StateIndex for incremental runs
+        self.dir_index = None
+        # Folder whose STATE_DIR holds caches for this run (see state_root)
+        self.state_root = folder
+        # A telemetry.RunStats when the run collects telemetry
+        self.stats = None
+
+
+# Failures kept on an OrganizeResult; later ones are only counted
+MAX_ERRORS = 1000
+
+
+class OrganizeResult:
+    """Totals of an executed organize run"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.files_moved = 0
+        self.files_skipped = 0
+        # (path, message) of the first MAX_ERRORS failures; error_count has
+        # them all (each one is also printed, and journaled)
+        self.errors = []
+        self.error_count = 0
+        # Files placed under a numbered name, and identical files dropped,
+        # because the destination name was taken
+        self.renamed = 0
+        self.duplicates = 0
+        self.elapsed = 0.0
+        self.cancelled = False
+        # Planned moves left undone by a cancel; None when the total is unknown
+        self.files_remaining = None
+        # The plan's telemetry.RunStats, if it collected any
+        self.stats = None
+
+    def add_error(self, path, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((path, message))
+
+    @property
+    def files_per_second(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.files_moved / self.elapsed
+
+    def summary(self):
+        text = f"{self.files_moved} moved, {self.files_skipped} skipped"
+        if self.renamed:
+            text += f", {self.renamed} renamed"
+        if self.duplicates:
+            text += f", {self.duplicates} duplicates"
+        if self.error_count:
+            text += f", {self.error_count} errors"
+        text += f" in {self.elapsed:.2f}s ({self.files_per_second:.0f} files/s)"
+        if self.cancelled:
+            text += ", cancelled"
+            if self.files_remaining is not None:
+                text += f" with {self.files_remaining} files left"
+        return text
+
+
+class RunControl:
+    """Pause/resume/cancel switch shared between a run and whoever controls it.
+
+    The engine calls `checkpoint()` before every move, so a pause or cancel
+    takes effect before the next file is touched; moves already under way
+    are allowed to finish, so every file is either at its source or its
+    destination.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # Wake anything waiting in a pause so it can see the cancel
+        self._running.set()
+
+    def pause(self):
+        if not self._cancelled.is_set():
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def checkpoint(self):
+        """Block while paused; return False once the run has been cancelled"""
+        while not self._running.is_set():
+            # Short waits keep the main thread responsive to signals
+            self._running.wait(0.5)
+        return not self._cancelled.is_set()
+
+
+class ProgressEvent:
+    """A snapshot of how far a run has got.
+
+    `files_total`, `bytes_total` and `eta` are None while the totals are unknown.
+    """
+    __slots__ = ('phase', 'files_done', 'files_total', 'bytes_done', 'bytes_total',
+                 'rate', 'eta')
+
+    def __init__(self, phase, files_done, files_total, bytes_done, bytes_total, rate, eta):
+        self.phase = phase
+        self.files_done = files_done
+        self.files_total = files_total
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.rate = rate
+        self.eta = eta
+
+    @property
+    def fraction(self):
+        if not self.files_total:
+            return None
+        return min(self.files_done / self.files_total, 1.0)
+
+    def format(self):
+        if self.phase == "scan":
+            return f"Scanning... {self.files_done} files found"
+        done = f"{self.files_done}"
+        if self.files_total is not None:
+            done += f"/{self.files_total}"
+        text = f"{done} files, {format_bytes(self.bytes_done)}, {self.rate:.0f} files/s"
+        if self.eta is not None:
+            text += f", ETA {format_duration(self.eta)}"
+        return text
+
+
+class ProgressReporter:
+    """Counts finished files and calls `callback` with a ProgressEvent at most
+    once per `interval` seconds, so per-file overhead is a couple of additions
+    and a clock read.
+    """
+
+    def __init__(self, callback, interval=0.2):
+        self.callback = callback
+        self.interval = interval
+        self.phase = "move"
+        self.files_done = 0
+        self.bytes_done = 0
+        self.files_total = None
+        self.bytes_total = None
+        self.started = time.monotonic()
+        self.next_emit = 0.0
+        # Files already done when the phase started (e.g. on resume) don't
+        # count towards the rate
+        self.files_at_start = 0
+        # Bytes of files still being copied; workers add to it concurrently
+        self.bytes_partial = 0
+        self._partial_lock = threading.Lock()
+        self._thread = threading.get_ident()
+
+    def start(self, phase, files_total=None, bytes_total=None, files_done=0, bytes_done=0):
+        self.phase = phase
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.files_done = files_done
+        self.bytes_done = bytes_done
+        self.started = time.monotonic()
+        self.files_at_start = files_done
+        self.emit()
+
+    def advance(self, size=0):
+        self.files_done += 1
+        self.bytes_done += size
+        if time.monotonic() >= self.next_emit:
+            self.emit()
+
+    def partial(self, nbytes):
+        """Count bytes of a file still in flight (negative to take them back).
+
+        May be called from any thread; events are only emitted from the
+        thread that created the reporter.
+        """
+        with self._partial_lock:
+            self.bytes_partial += nbytes
+        if threading.get_ident() == self._thread and time.monotonic() >= self.next_emit:
+            self.emit()
+
+    def event(self):
+        elapsed = time.monotonic() - self.started
+        rate = (self.files_done - self.files_at_start) / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.files_total is not None and rate > 0:
+            eta = max(self.files_total - self.files_done, 0) / rate
+        return ProgressEvent(self.phase, self.files_done, self.files_total,
+                             self.bytes_done + self.bytes_partial, self.bytes_total, rate, eta)
+
+    def emit(self):
+        self.next_emit = time.monotonic() + self.interval
+        self.callback(self.event())
+
+    def finish(self):
+        self.phase = "done"
+        self.emit()
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+
+def scan_folder(folder):
+    """Yield a DirEntry for every entry directly inside `folder`.
+
+    Uses a single streaming os.scandir pass; the entries carry the file type
+    from the directory listing so callers don't need extra stat calls.
+    """
+    with os.scandir(folder) as it:
+        yield from it
+
+def _entry_is_dir(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+# Per-root folder for the organizer's own bookkeeping (journals and the like)
+STATE_DIR = ".organizer"
+
+def state_root(folder, options=None):
+    """Folder whose STATE_DIR holds the state of runs over `folder`: the
+    destination root, so a read-only source can be organized by copying.
+    """
+    if options is not None and options.dest_root:
+        return options.dest_root
+    return folder
+
+def check_dest(folder, options):
+    """Refuse to copy or link files into the folder they come from: the
+    originals stay behind, so every re-run would add another numbered copy.
+    """
+    if options.mode != "move" and options.dest_root and \
+            os.path.realpath(options.dest_root) == os.path.realpath(folder):
+        raise ValueError(f"{options.mode} mode needs an output folder other than {folder}")
+
+def category_roots(ext_map):
+    """Top-level folder names the organizer itself creates inside a root"""
+    roots = {folder.replace("\\", "/").split("/", 1)[0] for folder in as_index(ext_map).folders()}
+    # Routing rule destinations like {year}/Photos have no fixed name
+    return {root for root in roots if "{" not in root}
+
+def _is_category_dir(name, roots):
+    return name in roots or name.startswith("Other_")
+
+def _is_excluded(entry, root, patterns):
+    from fnmatch import fnmatch
+
+    rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+    return any(fnmatch(entry.name, p) or fnmatch(rel_path, p) for p in patterns)
+
+def walk_files(root, exclude=(), on_error=None):
+    """Yield a DirEntry for every regular file under `root`, category folders
+    included, with the same single-scandir-per-folder walk as iter_moves.
+    Symlinks and the organizer's own STATE_DIR are skipped.
+    """
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            entries = os.scandir(path)
+        except OSError as e:
+            if path == root:
+                raise
+            if on_error is not None:
+                on_error(path, e)
+            continue
+        with entries:
+            for entry in entries:
+                if exclude and _is_excluded(entry, root, exclude):
+                    continue
+                if entry.is_symlink():
+                    continue
+                if _entry_is_dir(entry):
+                    if not (path == root and entry.name == STATE_DIR):
+                        stack.append(entry.path)
+                    continue
+                try:
+                    if entry.is_file():
+                        yield entry
+                except OSError:
+                    continue
+
+def _make_op(entry, dest_root, folder_name, want_sizes, subfolders=()):
+    size = None
+    if want_sizes:
+        try:
+            size = entry.stat().st_size
+        except OSError:
+            size = 0
+    return MoveOp(entry.name, entry.path, os.path.join(dest_root, folder_name, *subfolders),
+                  folder_name, size)
+
+def iter_moves(plan, ext_map, options=None, want_sizes=False):
+    """Stream the MoveOps for `plan.folder`, counting skips on the plan.
+
+    Folders are walked depth-first with one scandir per directory, so only
+    the stack of pending folders is held in memory, never the file list.
+    Category folders at the root (or a destination root inside the tree) are
+    never descended into. With `want_sizes`
+    each op also carries the file size from a single stat of the entry.
+    With `plan.dir_index` set, subfolders unchanged since the last complete
+    run are not listed again; only their recorded subfolders are visited.
+    The files found are classified by classify_entries().
+    """
+    options = options or OrganizeOptions()
+    index = as_index(ext_map)
+    yield from classify_entries(plan, index, _walk_files(plan, index, options),
+                                options, want_sizes)
+
+def _walk_files(plan, index, options):
+    """The DirEntries of the files iter_moves() organizes"""
+    root = plan.folder
+    dest_root = options.dest_root or root
+    separate_dest = os.path.abspath(dest_root) != os.path.abspath(root)
+    roots = category_roots(index) if options.recursive and not separate_dest else ()
+    stack = [(root, 0)]
+
+    while stack:
+        path, depth = stack.pop()
+        if plan.dir_index is not None and path != root:
+            children = plan.dir_index.unchanged_children(path)
+            if children is not None:
+                if options.max_depth is None or depth < options.max_depth:
+                    for child in children:
+                        plan.folders.known.add(child)
+                        stack.append((child, depth + 1))
+                continue
+        try:
+            entries = os.scandir(path)
+        except OSError as e:
+            if path == root:
+                raise
+            if plan.dir_index is not None:
+                plan.dir_index.failed_dirs.add(path)
+            plan.skipped += 1
+            print(f"Error scanning {path}: {e}", file=sys.stderr)
+            continue
+
+        with entries:
+            for entry in entries:
+                if options.exclude and _is_excluded(entry, root, options.exclude):
+                    plan.skipped += 1
+                    continue
+
+                if depth == 0 and entry.name == STATE_DIR:
+                    continue
+
+                if _entry_is_dir(entry):
+                    if entry.path in plan.folders.known:
+                        # Made by this run while we were still scanning
+                        continue
+                    plan.folders.known.add(entry.path)
+                    if separate_dest and os.path.abspath(entry.path) == os.path.abspath(dest_root):
+                        continue
+                    if (options.recursive
+                            and (options.max_depth is None or depth < options.max_depth)
+                            and not entry.is_symlink()
+                            and not (depth == 0 and _is_category_dir(entry.name, roots))):
+                        stack.append((entry.path, depth + 1))
+                    else:
+                        plan.skipped += 1
+                    continue
+
+                yield entry
+
+def classify_entries(plan, ext_map, entries, options=None, want_sizes=False):
+    """Stream the MoveOps for `entries`, files under `plan.folder` given as
+    DirEntries (or anything with .name, .path and .stat()), counting skips
+    on the plan.
+
+    With `options.sniff`, files with no or an unknown extension are held
+    back in batches until their headers are read (see sniff.py); with
+    `options.date_folders`, photos and videos are held back until their
+    capture dates are read (see capture_date.py). With `plan.stats` set,
+    the time spent classifying is added to it.
+    """
+    options = options or OrganizeOptions()
+    index = as_index(ext_map)
+    root = plan.folder
+    dest_root = options.dest_root or root
+    router = index.router
+    stats = plan.stats
+    perf_counter = time.perf_counter
+
+    sniffer = None
+    if options.sniff:
+        import sniff
+        sniffer = sniff.Sniffer(
+            index,
+            None if plan.read_only
+            else os.path.join(state_root(root, options), STATE_DIR, sniff.CACHE_NAME),
+            workers=max(options.workers, 4),
+            batch_size=options.batch_size or sniff.BATCH_SIZE)
+    # Files waiting for their headers to be sniffed: (entry, fallback folder)
+    unsure = []
+
+    dater = None
+    if options.date_folders:
+        import capture_date
+        is_dated = capture_date.is_dated_category
+        dater = capture_date.Dater(
+            None if plan.read_only
+            else os.path.join(state_root(root, options), STATE_DIR, capture_date.CACHE_NAME),
+            workers=max(options.workers, 4),
+            batch_size=options.batch_size or capture_date.BATCH_SIZE)
+    # Photos and videos waiting for their capture dates: (entry, folder)
+    undated = []
+
+    def sniffed_ops():
+        folders = sniffer.resolve([entry for entry, _ in unsure])
+        for (entry, fallback), folder_name in zip(unsure, folders):
+            folder_name = index.route(entry.name, folder_name or fallback, entry.stat)
+            if folder_name is None:
+                plan.skipped += 1
+            elif dater is not None and is_dated(folder_name):
+                undated.append((entry, folder_name))
+            else:
+                yield _make_op(entry, dest_root, folder_name, want_sizes)
+        unsure.clear()
+
+    def dated_ops():
+        import hashing
+
+        items = []
+        for entry, _ in undated:
+            try:
+                items.append((entry.path, hashing.entry_stat(entry)))
+            except OSError:
+                items.append((entry.path, None))
+        dates = dater.resolve(items)
+        for (entry, folder_name), date in zip(undated, dates):
+            subfolders = (f"{date[0]:04d}", f"{date[1]:02d}") if date is not None else ()
+            yield _make_op(entry, dest_root, folder_name, want_sizes, subfolders)
+        undated.clear()
+
+    try:
+        for entry in entries:
+            if stats is not None:
+                start = perf_counter()
+            folder_name = index.classify(entry.name)
+            if sniffer is not None and (folder_name is None
+                                        or folder_name.startswith("Other_")):
+                # Routing rules apply once the content says what it is
+                unsure.append((entry, folder_name))
+                if len(unsure) >= sniffer.batch_size:
+                    yield from sniffed_ops()
+                continue
+            if router is not None:
+                # The stat, if a rule needs one, is cached on the entry
+                folder_name = router.route(entry.name, folder_name, entry.stat)
+            if stats is not None:
+                stats.phases["classify"] += perf_counter() - start
+
+            if folder_name is None:
+                plan.skipped += 1
+                continue
+
+            if dater is not None and is_dated(folder_name):
+                undated.append((entry, folder_name))
+                if len(undated) >= dater.batch_size:
+                    yield from dated_ops()
+                continue
+
+            yield _make_op(entry, dest_root, folder_name, want_sizes)
+
+        if unsure:
+            yield from sniffed_ops()
+        if undated:
+            yield from dated_ops()
+    finally:
+        if sniffer is not None:
+            sniffer.close()
+        if dater is not None:
+            dater.close()
+
+def plan_organize(folder, ext_map, options=None, want_sizes=False):
+    """Work out which files in `folder` go where without touching the disk"""
+    plan = OrganizePlan(folder)
+    plan.moves.extend(iter_moves(plan, ext_map, options, want_sizes))
+    return plan
+
+
+class PlanSummary:
+    """Per-category file counts and byte totals of a (dry-run) plan"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.categories = {}
+
+    def add(self, op):
+        size = op.size or 0
+        self.files += 1
+        self.bytes += size
+        totals = self.categories.get(op.category)
+        if totals is None:
+            totals = self.categories[op.category] = [0, 0]
+        totals[0] += 1
+        totals[1] += size
+
+    def estimate_seconds(self, files_per_second=None, bytes_per_second=None):
+        """Rough run time from rates measured on earlier runs, or None.
+
+        Same-device moves are renames and scale with the file count; copies
+        across devices scale with the bytes.
+        """
+        if not files_per_second and not bytes_per_second:
+            return None
+        seconds = 0.0
+        if files_per_second:
+            seconds += self.files / files_per_second
+        if bytes_per_second:
+            seconds += self.bytes / bytes_per_second
+        return seconds
+
+    def as_dict(self, files_per_second=None, bytes_per_second=None):
+        return {
+            "folder": self.folder,
+            "files": self.files,
+            "bytes": self.bytes,
+            "skipped": self.skipped,
+            "estimated_seconds": self.estimate_seconds(files_per_second, bytes_per_second),
+            "categories": {
+                name: {"files": files, "bytes": size}
+                for name, (files, size) in sorted(self.categories.items())
+            },
+        }
+
+    def format(self):
+        lines = [f"{self.files} files ({format_bytes(self.bytes)}) to move, "
+                 f"{self.skipped} skipped"]
+        for name, (files, size) in sorted(self.categories.items()):
+            lines.append(f"  {name}: {files} files, {format_bytes(size)}")
+        return "\n".join(lines)
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < 1024 or unit == "TB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class JsonPlanWriter:
+    """Streams moves into a JSON document, with the summary written last"""
+
+    def __init__(self, f):
+        import json
+        self._json = json
+        self.f = f
+        self.first = True
+        f.write('{"moves": [')
+
+    def write(self, op):
+        if not self.first:
+            self.f.write(",")
+        self.first = False
+        self.f.write("\n  " + self._json.dumps(
+            {"src": op.src, "dest": op.dest, "category": op.category, "size": op.size}))
+
+    def finish(self, summary_dict):
+        self.f.write("\n],\n")
+        for key, value in summary_dict.items():
+            self.f.write(f" {self._json.dumps(key)}: {self._json.dumps(value)},\n")
+        self.f.write(' "dry_run": true\n}\n')
+
+
+class CsvPlanWriter:
+    """One row per move; the summary goes to the console instead"""
+
+    def __init__(self, f):
+        import csv
+        self.writer = csv.writer(f)
+        self.writer.writerow(["src", "dest", "category", "size"])
+
+    def write(self, op):
+        self.writer.writerow([op.src, op.dest, op.category, op.size])
+
+    def finish(self, summary_dict):
+        pass
+
+
+def dry_run(folder, ext_map, options=None, out=None, fmt="json",
+            files_per_second=None, bytes_per_second=None):
+    """Plan an organize run of `folder` in one metadata pass, changing nothing.
+
+    Moves are streamed to `out` (a text file object, or None to only count)
+    as JSON or CSV; the returned PlanSummary holds the per-category totals.
+    """
+    plan = OrganizePlan(folder)
+    plan.read_only = True
+    summary = PlanSummary(folder)
+    writer = None
+    if out is not None:
+        writer = CsvPlanWriter(out) if fmt == "csv" else JsonPlanWriter(out)
+
+    for op in iter_moves(plan, ext_map, options, want_sizes=True):
+        summary.add(op)
+        if writer is not None:
+            writer.write(op)
+
+    summary.skipped = plan.skipped
+    if writer is not None:
+        writer.finish(summary.as_dict(files_per_second, bytes_per_second))
+    return summary
+
+# Returned by a worker for a move it dropped because the run was cancelled
+CANCELLED = object()
+
+def _move_one(op, mover, control=None, stats=None):
+    if stats is not None:
+        start = time.perf_counter()
+        error = _move_one(op, mover, control)
+        if error is not CANCELLED:
+            stats.op_timed(op, time.perf_counter() - start)
+        return error
+    should_stop = None
+    if control is not None:
+        if not control.checkpoint():
+            return CANCELLED
+        # Long cross-device copies also pause and cancel between chunks
+        should_stop = lambda: not control.checkpoint()
+    try:
+        mover.place(op, should_stop)
+    except CopyCancelled:
+        return CANCELLED
+    except Exception as e:
+        return e
+    return None
+
+def _bounded_map(pool, fn, items, max_pending):
+    """Like pool.map, but keeps at most `max_pending` tasks queued at once.
+
+    Yields (item, return value) pairs in completion order.
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    pending = {}
+    for item in items:
+        pending[pool.submit(fn, item)] = item
+        if len(pending) >= max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+    for future in list(pending):
+        yield pending.pop(future), future.result()
+
+def _record(result, op, error, on_result=None, progress=None, stats=None):
+    if error is CANCELLED:
+        return
+    if stats is not None:
+        stats.count(op, error)
+    if on_result is not None:
+        on_result(op, error)
+    if progress is not None:
+        progress.advance(op.size or 0)
+    if error is None:
+        if op.outcome is None:
+            result.files_moved += 1
+        elif op.outcome == RENAMED:
+            result.files_moved += 1
+            result.renamed += 1
+        elif op.outcome == SKIPPED:
+            result.files_skipped += 1
+        elif op.outcome == DUPLICATE:
+            result.duplicates += 1
+    else:
+        result.files_skipped += 1
+        result.add_error(op.src, str(error))
+        print(f"Error moving {op.filename}: {error}", file=sys.stderr)
+
+def execute_plan(plan, workers=1, moves=None, on_result=None, progress=None,
+                 control=None, mode="move", collisions="rename"):
+    """Carry out the moves of a plan and return an OrganizeResult.
+
+    `moves` defaults to `plan.moves` but may be any iterable, e.g. the
+    generator from iter_moves, so a run never has to hold the full list.
+    With `workers` > 1 the moves are spread over a bounded thread pool, which
+    mostly pays off on network shares where each move is a round-trip.
+    `on_result(op, error)` is called on the calling thread after every move,
+    and `progress` (a ProgressReporter) is advanced once per file, and by
+    bytes during cross-device copies. A RunControl in `control` can pause or
+    cancel the run between files and between the chunks of a copy. `mode`
+    and `collisions` are the transfer mode and collision policy (see
+    transfer.Mover). With `plan.stats` set, folder creation and every move
+    are timed into it, and it is finished and attached to the result.
+    """
+    result = OrganizeResult(plan.folder)
+    hashes = None
+    if collisions == "dedupe":
+        import hashing
+        hashes = hashing.HashCache(
+            None if plan.read_only
+            else os.path.join(plan.state_root, STATE_DIR, hashing.CACHE_NAME))
+    mover = Mover(progress.partial if progress is not None else None, mode, collisions, hashes)
+    start = time.perf_counter()
+    failed_folders = {}
+    stats = plan.stats
+
+    def ready(ops):
+        # Destination folders are made here, on the dispatching thread, so
+        # each one is created exactly once and workers never race on mkdir
+        for op in ops:
+            if control is not None and not control.checkpoint():
+                return
+            error = failed_folders.get(op.dest_folder)
+            if error is None and op.dest_folder not in plan.folders.known:
+                mkdir_start = time.perf_counter()
+                try:
+                    plan.folders.ensure(op.dest_folder)
+                except OSError as e:
+                    error = failed_folders[op.dest_folder] = e
+                if stats is not None:
+                    stats.add_time("mkdir", time.perf_counter() - mkdir_start)
+            if error is None:
+                yield op
+            else:
+                _record(result, op, error, on_result, progress, stats)
+
+    ops = ready(plan.moves if moves is None else moves)
+    try:
+        if workers <= 1:
+            for op in ops:
+                _record(result, op, _move_one(op, mover, control, stats), on_result,
+                        progress, stats)
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+
+            def move(op):
+                return _move_one(op, mover, control, stats)
+
+            # Counters are only touched from this thread, so no locking is needed
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for op, error in _bounded_map(pool, move, ops, workers * 4):
+                    _record(result, op, error, on_result, progress, stats)
+    finally:
+        if hashes is not None:
+            hashes.close()
+
+    result.cancelled = control is not None and control.cancelled
+    result.files_skipped += plan.skipped
+    result.elapsed = time.perf_counter() - start
+    if stats is not None:
+        stats.finish()
+        result.stats = stats
+    return result
+
+def organize(folder, ext_map_path=None, options=None, on_progress=None, control=None):
+    """Scan and organize `folder`, streaming moves as they are found.
+
+    `on_progress(event)` receives throttled ProgressEvents from the calling
+    thread. Journaled runs know the total up front once the plan is written;
+    unjournaled runs stream, so their events have no total or ETA.
+    `control` is an optional RunControl to pause or cancel the run; a
+    cancelled journaled run can be finished later with journal.resume().
+    `ext_map_path` may also be an already loaded extension dict or
+    ExtensionIndex.
+    """
+    options = options or OrganizeOptions()
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"Folder not found: {folder}")
+    check_dest(folder, options)
+    if options.dest_root:
+        os.makedirs(options.dest_root, exist_ok=True)
+    if isinstance(ext_map_path, (dict, ExtensionIndex)):
+        ext_map = as_index(ext_map_path)
+    else:
+        ext_map = load_rules(ext_map_path)
+    progress = ProgressReporter(on_progress) if on_progress is not None else None
+    plan = OrganizePlan(folder)
+    plan.state_root = state_root(folder, options)
+    if options.stats:
+        import telemetry
+        plan.stats = telemetry.RunStats()
+    on_result = None
+    if options.incremental:
+        import state_index
+        plan.dir_index = state_index.StateIndex(folder, ext_map, options)
+        on_result = plan.dir_index.on_result
+    try:
+        # Byte totals per category need the sizes too
+        moves = iter_moves(plan, ext_map, options,
+                           want_sizes=progress is not None or options.stats)
+        if plan.dir_index is not None:
+            # Files already placed whose category changed with the map go first
+            moves = itertools.chain(plan.dir_index.relocations(), moves)
+        if plan.stats is not None:
+            moves = plan.stats.timed(moves, "scan")
+        if options.journal:
+            import journal
+            result = journal.journaled_organize(folder, ext_map, options, progress, control,
+                                                plan=plan, moves=moves, on_result=on_result)
+        else:
+            if progress is not None:
+                progress.start("move")
+            result = execute_plan(plan, workers=options.workers, progress=progress,
+                                  control=control, moves=moves, on_result=on_result,
+                                  mode=options.mode, collisions=options.collisions)
+            if progress is not None:
+                progress.finish()
+        if plan.dir_index is not None:
+            plan.dir_index.finish(result)
+    finally:
+        if plan.dir_index is not None:
+            plan.dir_index.close()
+    return result
+
+
+def build_arg_parser():
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="organizer",
+        description="Organize the files in a folder by extension without starting the GUI.")
+    parser.add_argument("folder", nargs="*",
+                        help="folder to organize; several folders are organized as a batch")
+    parser.add_argument("--manifest", metavar="PATH",
+                        help="also organize the folders listed in PATH, one per line ('-' for stdin)")
+    parser.add_argument("--per-device", type=int, default=1, metavar="N",
+                        help="with several folders, how many on the same disk run at once (default: 1)")
+    parser.add_argument("-m", "--map", dest="ext_map_path", default=None,
+                        help="path to extension_map.txt (default: next to the app)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="number of concurrent moves (default: 1)")
+    parser.add_argument("-o", "--dest", dest="dest_root", default=None, metavar="DIR",
+                        help="put the category folders under DIR instead of FOLDER")
+    parser.add_argument("--mode", choices=MODES, default="move",
+                        help="move files (default), or copy, hardlink or reflink them "
+                             "and leave the originals in place")
+    parser.add_argument("--collisions", choices=COLLISION_POLICIES, default="rename",
+                        help="when a file of the same name is already there: rename (default), "
+                             "skip, overwrite, or dedupe (drop identical files, rename others)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="also organize files in subfolders")
+    parser.add_argument("--max-depth", type=int, default=None,
+                        help="with --recursive, how many folder levels to descend")
+    parser.add_argument("-x", "--exclude", action="append", default=[], metavar="PATTERN",
+                        help="leave entries matching this glob alone (repeatable)")
+    parser.add_argument("--sniff", action="store_true",
+                        help="detect the type of files with no or unknown extension by their content")
+    parser.add_argument("--date-folders", action="store_true",
+                        help="sort photos and videos into YYYY/MM subfolders by the capture "
+                             "date in their EXIF or movie header")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="keep a state index so re-runs skip unchanged subfolders and "
+                             "a map change moves only the affected files")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="don't write a journal (the run can't be resumed or undone)")
+    parser.add_argument("--resume", action="store_true",
+                        help="finish the last interrupted run of FOLDER from its journal")
+    parser.add_argument("--undo", action="store_true",
+                        help="move the files of the last journaled run of FOLDER back")
+    parser.add_argument("--progress", action="store_true", default=None,
+                        help="show progress on stderr (default: when stderr is a terminal)")
+    parser.add_argument("-q", "--quiet", dest="progress", action="store_false",
+                        help="don't show progress")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and organize new files as they arrive")
+    parser.add_argument("--debounce", type=float, default=2.0, metavar="SECONDS",
+                        help="with --watch, wait for this much quiet before a batch (default: 2)")
+    parser.add_argument("--settle", type=float, default=2.0, metavar="SECONDS",
+                        help="with --watch, a file's size and mtime must be unchanged this long (default: 2)")
+    parser.add_argument("--poll", action="store_true",
+                        help="with --watch, poll instead of using inotify")
+    parser.add_argument("--find-duplicates", action="store_true",
+                        help="report files with identical contents anywhere under FOLDER "
+                             "instead of organizing it")
+    parser.add_argument("--dupes-out", metavar="PATH",
+                        help="with --find-duplicates, write the groups as JSON to PATH ('-' for stdout)")
+    parser.add_argument("--dupes-action", choices=("hardlink", "delete"),
+                        help="with --find-duplicates, replace the extra copies with hardlinks "
+                             "or delete them")
+    parser.add_argument("--stats", action="store_true",
+                        help="print a one-line run report (phase timings, totals, "
+                             "errors, slowest file) on stderr")
+    parser.add_argument("--stats-out", metavar="PATH",
+                        help="write the full run report as JSON to PATH ('-' for stdout)")
+    parser.add_argument("--profile", choices=("cpu", "memory"),
+                        help="run under cProfile or tracemalloc and print the top "
+                             "entries on stderr")
+    parser.add_argument("--batch-size", type=int, default=None, metavar="N",
+                        help="files held in memory at once by the batched stages (sniffing, "
+                             "capture dates, undo, duplicate search); lower it to cap memory")
+    parser.add_argument("--check-map", action="store_true",
+                        help="check the extension map for conflicting extensions, bad folder "
+                             "names and broken rules, then exit")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="only report what would be moved; nothing on disk changes")
+    parser.add_argument("--plan-out", metavar="PATH",
+                        help="with --dry-run, write the move plan to PATH (.json or .csv, '-' for stdout)")
+    parser.add_argument("--rate", type=float, metavar="FILES_PER_SEC",
+                        help="with --dry-run, estimate the run time from this measured rate")
+    parser.add_argument("--byte-rate", type=float, metavar="BYTES_PER_SEC",
+                        help="with --dry-run, add copy time at this rate (cross-device runs)")
+    return parser
+
+def options_from_args(args):
+    return OrganizeOptions(recursive=args.recursive, max_depth=args.max_depth,
+                           exclude=args.exclude, workers=args.workers,
+                           journal=not args.no_journal, sniff=args.sniff,
+                           incremental=args.incremental, dest_root=args.dest_root,
+                           mode=args.mode, collisions=args.collisions,
+                           date_folders=args.date_folders,
+                           stats=bool(args.stats or args.stats_out),
+                           batch_size=args.batch_size)
+
+def run_dry_run(args):
+    if not os.path.isdir(args.folder):
+        raise FileNotFoundError(f"Folder not found: {args.folder}")
+    options = options_from_args(args)
+    check_dest(args.folder, options)
+    ext_map = load_rules(args.ext_map_path)
+    fmt = "csv" if args.plan_out and args.plan_out.lower().endswith(".csv") else "json"
+
+    if args.plan_out == "-":
+        summary = dry_run(args.folder, ext_map, options, sys.stdout, fmt,
+                          args.rate, args.byte_rate)
+        out = sys.stderr
+    elif args.plan_out:
+        with open(args.plan_out, "w", encoding="utf-8", newline="") as f:
+            summary = dry_run(args.folder, ext_map, options, f, fmt,
+                              args.rate, args.byte_rate)
+        out = sys.stdout
+    else:
+        summary = dry_run(args.folder, ext_map, options, None, fmt)
+        out = sys.stdout
+
+    print(f"Dry run of {args.folder}: {summary.format()}", file=out)
+    estimate = summary.estimate_seconds(args.rate, args.byte_rate)
+    if estimate is not None:
+        print(f"Estimated run time: {estimate:.0f}s", file=out)
+
+def run_find_duplicates(args):
+    import dupes
+
+    workers = max(args.workers, 4)
+    if args.dupes_out == "-":
+        report = dupes.run(args.folder, workers, sys.stdout, args.dupes_action,
+                           exclude=args.exclude, batch_size=args.batch_size)
+        out = sys.stderr
+    elif args.dupes_out:
+        with open(args.dupes_out, "w", encoding="utf-8") as f:
+            report = dupes.run(args.folder, workers, f, args.dupes_action,
+                               exclude=args.exclude, batch_size=args.batch_size)
+        out = sys.stdout
+    else:
+        report = dupes.run(args.folder, workers, None, args.dupes_action,
+                           exclude=args.exclude, batch_size=args.batch_size)
+        out = sys.stdout
+    print(f"Duplicates in {args.folder}: {report.summary()}", file=out)
+
+def write_stats(stats, args):
+    import json
+
+    if args.stats:
+        print(stats.log_line(), file=sys.stderr)
+    if args.stats_out == "-":
+        json.dump(stats.as_dict(), sys.stdout, indent=2)
+        print()
+    elif args.stats_out:
+        with open(args.stats_out, "w", encoding="utf-8") as f:
+            json.dump(stats.as_dict(), f, indent=2)
+
+def console_progress(stream=None):
+    """Progress callback that keeps rewriting one status line on `stream`"""
+    stream = stream or sys.stderr
+
+    def show(event):
+        line = event.format()
+        if event.fraction is not None:
+            line = f"{event.fraction * 100:5.1f}% {line}"
+        end = "\n" if event.phase == "done" else ""
+        stream.write(f"\r{line:<79}{end}")
+        stream.flush()
+    return show
+
+def install_signal_handlers(control):
+    """Ctrl-C cancels after the current file (a second one aborts), and on
+    POSIX `kill -USR1` toggles pause so a busy server can be backed off.
+    """
+    import signal
+
+    def on_interrupt(signum, frame):
+        if control.cancelled:
+            raise KeyboardInterrupt
+        print("\nCancelling after the current file (Ctrl-C again to abort)...",
+              file=sys.stderr)
+        control.cancel()
+
+    def on_toggle_pause(signum, frame):
+        if control.paused:
+            control.resume()
+            print("\nResumed", file=sys.stderr)
+        else:
+            control.pause()
+            print("\nPaused (send SIGUSR1 again to resume)", file=sys.stderr)
+
+    signal.signal(signal.SIGINT, on_interrupt)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, on_toggle_pause)
+
+def run_watch(args, control):
+    import watch
+
+    def report(result):
+        if result.files_moved or result.error_count:
+            stamp = time.strftime("%H:%M:%S")
+            print(f"[{stamp}] {result.summary()}", flush=True)
+
+    try:
+        if not os.path.isdir(args.folder):
+            raise FileNotFoundError(f"Folder not found: {args.folder}")
+        print(f"Watching {args.folder} (Ctrl-C to stop)", flush=True)
+        watch.watch(args.folder, load_rules(args.ext_map_path), options_from_args(args),
+                    debounce=args.debounce, settle=args.settle,
+                    use_inotify=False if args.poll else None,
+                    control=control, on_batch=report)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+def run_check_map(args):
+    filepath = args.ext_map_path or default_extension_map_path()
+    with open(filepath, "r", encoding="utf-8") as f:
+        problems = validate_rules(f.read())
+    for lineno, level, message in problems:
+        print(f"{filepath}:{lineno}: {level}: {message}")
+    errors = sum(1 for _, level, _ in problems if level == "error")
+    print(f"{filepath}: {errors} errors, {len(problems) - errors} warnings",
+          file=sys.stderr)
+    return 1 if errors else 0
+
+def run_batch(args, folders, control):
+    import batch
+    import json
+
+    def folder_done(entry):
+        if entry.error is not None:
+            print(f"Error: {entry.folder}: {entry.error}", file=sys.stderr)
+            return
+        print(f"Organized {entry.folder}: {entry.result.summary()}", flush=True)
+        if args.stats and entry.result.stats is not None:
+            print(entry.result.stats.log_line(), file=sys.stderr)
+
+    # Several folders update at once, so there is no single progress line
+    report = batch.organize_many(folders, args.ext_map_path, options_from_args(args),
+                                 per_device=args.per_device, control=control,
+                                 on_folder_done=folder_done)
+    print(f"Batch: {report.summary()}")
+    if args.stats_out == "-":
+        json.dump(report.as_dict(), sys.stdout, indent=2)
+        print()
+    elif args.stats_out:
+        with open(args.stats_out, "w", encoding="utf-8") as f:
+            json.dump(report.as_dict(), f, indent=2)
+    if report.cancelled:
+        return 130
+    return 0 if not report.errors else 2
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.check_map:
+        try:
+            return run_check_map(args)
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    folders = list(args.folder)
+    if args.manifest:
+        import batch
+        try:
+            folders += batch.read_manifest(args.manifest)
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    if not folders:
+        parser.error("no folder given")
+    batch_run = len(folders) > 1
+    if batch_run and (args.find_duplicates or args.dry_run or args.watch
+                      or args.resume or args.undo):
+        parser.error("this mode takes a single folder")
+    if args.mode != "move" and not args.dest_root:
+        parser.error(f"--mode {args.mode} leaves the originals in place; give an output folder with --dest")
+    args.folder = folders[0]
+    show_progress = args.progress
+    if show_progress is None:
+        show_progress = sys.stderr.isatty()
+    on_progress = console_progress() if show_progress else None
+    if args.find_duplicates:
+        try:
+            run_find_duplicates(args)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        return 0
+    if args.dry_run:
+        try:
+            run_dry_run(args)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    control = RunControl()
+    install_signal_handlers(control)
+    if args.watch:
+        return run_watch(args, control)
+    if batch_run:
+        try:
+            return run_batch(args, folders, control)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    try:
+        if args.resume or args.undo:
+            import journal
+            if args.undo:
+                result = journal.undo(args.folder, dest_root=args.dest_root,
+                                      batch_size=args.batch_size)
+            else:
+                result = journal.resume(args.folder, workers=args.workers,
+                                        on_progress=on_progress, control=control,
+                                        dest_root=args.dest_root)
+        elif args.profile:
+            import telemetry
+            with telemetry.profiled(args.profile):
+                result = organize(args.folder, args.ext_map_path, options_from_args(args),
+                                  on_progress, control)
+        else:
+            result = organize(args.folder, args.ext_map_path, options_from_args(args),
+                              on_progress, control)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    action = "Undid" if args.undo else "Organized"
+    print(f"{action} {result.folder}: {result.summary()}")
+    if result.stats is not None:
+        write_stats(result.stats, args)
+    if result.cancelled and result.files_remaining is not None:
+        print(f"Run `--resume {args.folder}` to finish it.")
+    if result.cancelled:
+        return 130
+    return 0 if not result.error_count else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""Routing rules: send files somewhere else by size, age or name.
+
+`rule:` lines in extension_map.txt refine the folder a file's extension (or
+glob:/re: pattern) picked. Conditions come first, all of which must hold,
+then `->` and the destination:
+
+    rule: in=Videos/* size>4GB -> Videos/Large
+    rule: age>1y -> Archive/{year}
+    rule: name=IMG_* -> Camera
+    rule: ext=JPG,HEIC name=DSC* -> Camera/{year}/{month}
+
+Conditions:
+
+    ext=A,B        the file's last extension is one of these
+    in=GLOB        the folder the extension map picked matches (e.g. Videos/*)
+    name=GLOB      the file name matches (any case)
+    re=REGEX       the regular expression is found in the file name
+    size>N, size<N, size>=N, size<=N
+                   N in bytes or with a unit: KB, MB, GB, TB (powers of 1024)
+    age>N, age<N   time since last modified; N with a unit: h, d, w, m (30
+                   days) or y (365 days)
+
+Destinations may use {year}, {month} and {day} of the modification time,
+{category} (the folder the map picked) and {ext}. Rules are tried in file
+order and the first match wins; files no rule matches keep the map's folder.
+
+Compiling turns the rules into a table keyed by (extension, folder) of the
+rules that can still match, filled in as new keys are seen, so a file is
+only checked against those: its name pattern, then integer comparisons on
+its size and mtime. The stat result comes from the scan's DirEntry, and is
+only asked for when a remaining rule looks at size or age.
+"""
+import re
+import time
+from fnmatch import translate
+from string import Formatter
+
+ARROW = "->"
+
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+              "G": 1024 ** 3, "GB": 1024 ** 3, "T": 1024 ** 4, "TB": 1024 ** 4}
+AGE_UNITS = {"H": 3600, "D": 86400, "W": 7 * 86400, "M": 30 * 86400, "Y": 365 * 86400}
+FIELDS = {"year", "month", "day", "category", "ext"}
+# (extension, folder) combinations remembered; more are evaluated uncached
+MAX_KEYS = 4096
+
+_COMPARISON = re.compile(r"^(size|age)\s*(>=|<=|>|<)\s*([\d.]+)\s*([a-z]*)$", re.IGNORECASE)
+
+
+def _parse_amount(text, unit, units, what):
+    unit = unit.upper()
+    if unit not in units:
+        raise ValueError(f"Unknown {what} unit {unit!r}; use one of {', '.join(u for u in units if u)}")
+    return float(text) * units[unit]
+
+
+class Rule:
+    """One compiled `rule:` line"""
+    __slots__ = ('text', 'exts', 'folder_re', 'name_re', 'min_size', 'max_size',
+                 'min_age', 'max_age', 'destination', 'template', 'dated')
+
+    def __init__(self, conditions, destination):
+        self.text = f"{conditions} {ARROW} {destination}"
+        self.exts = None
+        self.folder_re = None
+        self.name_re = None
+        # Inclusive bounds; None when unbounded
+        self.min_size = self.max_size = None
+        self.min_age = self.max_age = None
+        name_parts = []
+        for term in conditions.split():
+            self._add_condition(term, name_parts)
+        if name_parts:
+            self.name_re = re.compile("".join(f"(?={p})" for p in name_parts), re.DOTALL)
+
+        destination = destination.strip().replace("\\", "/").strip("/")
+        if not destination or ".." in destination.split("/"):
+            raise ValueError(f"Invalid rule destination {destination!r}")
+        fields = {field for _, field, _, _ in Formatter().parse(destination) if field is not None}
+        unknown = fields - FIELDS
+        if unknown:
+            raise ValueError(f"Unknown field {{{sorted(unknown)[0]}}} in rule destination; "
+                             f"use {', '.join('{' + f + '}' for f in sorted(FIELDS))}")
+        self.destination = destination
+        self.template = bool(fields)
+        self.dated = bool(fields & {"year", "month", "day"})
+
+    def _add_condition(self, term, name_parts):
+        match = _COMPARISON.match(term)
+        if match is not None:
+            what, op, amount, unit = match.groups()
+            if what.lower() == "size":
+                value = _parse_amount(amount, unit, SIZE_UNITS, "size")
+                lo, hi = "min_size", "max_size"
+            else:
+                value = _parse_amount(amount, unit or "D", AGE_UNITS, "age")
+                lo, hi = "min_age", "max_age"
+            if op == ">":
+                setattr(self, lo, value + (1 if lo == "min_size" else 0))
+            elif op == ">=":
+                setattr(self, lo, value)
+            elif op == "<":
+                setattr(self, hi, value - (1 if hi == "max_size" else 0))
+            else:
+                setattr(self, hi, value)
+            return
+        key, sep, value = term.partition("=")
+        key = key.lower()
+        if not sep or not value:
+            raise ValueError(f"Invalid rule condition {term!r}")
+        if key == "ext":
+            self.exts = {ext.strip().lstrip(".").upper() for ext in value.split(",") if ext.strip()}
+        elif key == "in":
+            self.folder_re = re.compile(translate(value.replace("\\", "/")))
+        elif key == "name":
+            name_parts.append(f"(?i:{translate(value)})")
+        elif key == "re":
+            try:
+                re.compile(value)
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression {value!r}: {e}")
+            name_parts.append(f".*?(?:{value})")
+        else:
+            raise ValueError(f"Unknown rule condition {key!r}; "
+                             "use ext, in, name, re, size or age")
+
+    @property
+    def needs_stat(self):
+        return (self.min_size is not None or self.max_size is not None
+                or self.min_age is not None or self.max_age is not None or self.dated)
+
+    def accepts(self, ext, folder):
+        """Whether the rule can match files with this extension and map folder"""
+        if self.exts is not None and ext not in self.exts:
+            return False
+        if self.folder_re is not None and (folder is None or self.folder_re.match(folder) is None):
+            return False
+        return True
+
+    def matches(self, name, st, now):
+        if self.name_re is not None and self.name_re.match(name) is None:
+            return False
+        if self.min_size is not None and st.st_size < self.min_size:
+            return False
+        if self.max_size is not None and st.st_size > self.max_size:
+            return False
+        if self.min_age is not None or self.max_age is not None:
+            age = now - st.st_mtime
+            if self.min_age is not None and age < self.min_age:
+                return False
+            if self.max_age is not None and age > self.max_age:
+                return False
+        return True
+
+    def folder_for(self, ext, folder, st):
+        if not self.template:
+            return self.destination
+        fields = {"category": folder or "", "ext": ext}
+        if self.dated:
+            t = time.localtime(st.st_mtime)
+            fields.update(year=f"{t.tm_year:04d}", month=f"{t.tm_mon:02d}", day=f"{t.tm_mday:02d}")
+        return self.destination.format(**fields)
+
+
+class _NoStat:
+    """Stand-in stat for rules that never look at it"""
+    st_size = 0
+    st_mtime = 0.0
+
+
+class RuleSet:
+    """Compiled `rule:` lines of an extension map"""
+
+    def __init__(self, rules):
+        self.rules = [Rule(conditions, destination) for conditions, destination in rules]
+        # (ext, folder) -> (rules that can match, whether any needs a stat)
+        self._candidates = {}
+
+    def _candidates_for(self, ext, folder):
+        key = (ext, folder)
+        found = self._candidates.get(key)
+        if found is None:
+            rules = tuple(rule for rule in self.rules if rule.accepts(ext, folder))
+            found = (rules, any(rule.needs_stat for rule in rules))
+            if len(self._candidates) < MAX_KEYS:
+                self._candidates[key] = found
+        return found
+
+    def route(self, name, folder, stat=None):
+        """Folder for the file `name` that the map sent to `folder` (None if
+        it skipped it). `stat()` returns the file's stat result; it is only
+        called when a rule needs the size or modification time.
+        """
+        dot = name.rfind(".")
+        ext = name[dot + 1:].upper() if dot > 0 else ""
+        rules, needs_stat = self._candidates_for(ext, folder)
+        if not rules:
+            return folder
+        st = _NoStat
+        if needs_stat:
+            if stat is None:
+                return folder
+            try:
+                st = stat()
+            except OSError:
+                return folder
+        now = time.time()
+        for rule in rules:
+            if rule.matches(name, st, now):
+                return rule.folder_for(ext, folder, st)
+        return folder
+
+    def folders(self):
+        """Rule destinations, with any {fields} left in"""
+        return [rule.destination for rule in self.rules]
+
+
+def parse_rule(line):
+    """(conditions, destination) of a `rule:` line, without the prefix"""
+    conditions, sep, destination = line.rpartition(ARROW)
+    if not sep:
+        raise ValueError(f"Rule without {ARROW!r}: {line!r}")
+    return conditions.strip(), destination.strip()
@@ -0,0 +1,145 @@
+"""Content sniffing for files with a missing or unknown extension.
+
+Only the first HEADER_SIZE bytes of a file are read and matched against a
+small built-in magic-number table. The detected extension is then routed
+through the active extension map (falling back to DEFAULT_EXTENSION_MAP),
+so a PNG saved as `.dat` ends up in `Images/PNG Images`.
+
+Headers are read in batches on a thread pool, and results are cached in
+<root>/.organizer/sniff-cache.sqlite by (inode, size, mtime), so re-runs
+over the same share don't read those bytes again.
+"""
+import hashing
+
+HEADER_SIZE = 512
+BATCH_SIZE = 256
+CACHE_NAME = "sniff-cache.sqlite"
+
+# (offset, magic bytes, extension); first match wins, so longer and more
+# specific signatures come before shorter ones
+MAGIC_TABLE = [
+    (0, b"\x89PNG\r\n\x1a\n", "PNG"),
+    (0, b"\xff\xd8\xff", "JPG"),
+    (0, b"GIF87a", "GIF"),
+    (0, b"GIF89a", "GIF"),
+    (0, b"II*\x00", "TIFF"),
+    (0, b"MM\x00*", "TIFF"),
+    (0, b"8BPS", "PSD"),
+    (0, b"\x00\x00\x01\x00", "ICO"),
+    (0, b"%PDF-", "PDF"),
+    (0, b"%!PS", "EPS"),
+    (0, b"{\\rtf", "RTF"),
+    (0, b"7z\xbc\xaf\x27\x1c", "7Z"),
+    (0, b"Rar!\x1a\x07", "RAR"),
+    (0, b"\xfd7zXZ\x00", "XZ"),
+    (0, b"\x1f\x8b", "GZ"),
+    (0, b"BZh", "BZ2"),
+    (0, b"fLaC", "FLAC"),
+    (0, b"OggS", "OGG"),
+    (0, b"ID3", "MP3"),
+    (0, b"\xff\xfb", "MP3"),
+    (0, b"\xff\xf3", "MP3"),
+    (0, b"FLV\x01", "FLV"),
+    (0, b"wOFF", "WOFF"),
+    (0, b"wOF2", "WOFF2"),
+    (0, b"OTTO", "OTF"),
+    (0, b"\x00\x01\x00\x00\x00", "TTF"),
+    (0, b"MZ", "EXE"),
+    (0, b"BM", "BMP"),
+    (0, b"<?xml", "XML"),
+]
+
+FTYP_BRANDS = {
+    b"qt  ": "MOV",
+    b"M4A ": "M4A",
+    b"M4V ": "M4V",
+    b"heic": "HEIC",
+    b"heix": "HEIC",
+    b"mif1": "HEIC",
+    b"3gp4": "3GP",
+    b"3gp5": "3GP",
+    b"f4v ": "F4V",
+}
+
+RIFF_TYPES = {
+    b"WAVE": "WAV",
+    b"AVI ": "AVI",
+    b"WEBP": "WEBP",
+}
+
+
+def sniff_bytes(header):
+    """Return the extension (upper case) the header bytes look like, or None"""
+    # Container formats that need a second look before the plain table
+    if header[4:8] == b"ftyp":
+        return FTYP_BRANDS.get(header[8:12], "MP4")
+    if header[:4] == b"RIFF":
+        return RIFF_TYPES.get(header[8:12])
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "WEBM" if b"webm" in header else "MKV"
+    if header[:4] == b"PK\x03\x04":
+        if header[30:58] == b"mimetypeapplication/epub+zip":
+            return "EPUB"
+        return "ZIP"
+
+    for offset, magic, ext in MAGIC_TABLE:
+        if header.startswith(magic, offset):
+            return ext
+    return None
+
+def read_header(path):
+    with open(path, "rb") as f:
+        return f.read(HEADER_SIZE)
+
+def sniff_file(path):
+    return sniff_bytes(read_header(path))
+
+def _sniffed_bytes(path):
+    """sniff_file() as the value stored in the cache; b"" when nothing matched"""
+    return (sniff_file(path) or "").encode("ascii")
+
+
+class Sniffer:
+    """Resolves batches of DirEntries to destination folders by content"""
+
+    def __init__(self, index, cache_path=None, workers=4, batch_size=BATCH_SIZE):
+        from organizer import DEFAULT_EXTENSION_MAP, parse_extension_map
+
+        self.index = index
+        self.defaults = parse_extension_map(DEFAULT_EXTENSION_MAP)
+        self.cache = hashing.HashCache(cache_path)
+        self.workers = workers
+        self.batch_size = batch_size
+        self._pool = None
+
+    def folder_for(self, ext):
+        if not ext:
+            return None
+        return self.index.suffixes.get(ext) or self.defaults.get(ext)
+
+    def ext_of(self, entry):
+        """Extension the content of `entry` looks like, or None"""
+        try:
+            st = hashing.entry_stat(entry)
+            value = self.cache.file_hash(entry.path, st, "sniff", _sniffed_bytes)
+        except OSError:
+            # Unreadable for now; nothing is cached, so the next run tries again
+            return None
+        return value.decode("ascii") or None
+
+    def resolve(self, entries):
+        """Detected destination folder (or None) for each DirEntry, in order"""
+        if self.workers > 1 and len(entries) > 1:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            exts = list(self._pool.map(self.ext_of, entries))
+        else:
+            exts = [self.ext_of(entry) for entry in entries]
+        return [self.folder_for(ext) for ext in exts]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.cache.close()
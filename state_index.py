@@ -0,0 +1,223 @@
+"""Persistent per-root index for incremental re-runs.
+
+Kept in .organizer/state.sqlite under the destination root, it records:
+
+  * every file the organizer has placed, with its category, so that when
+    extension_map.txt changes only the files whose category actually
+    changed are moved again (found by extension, without walking the
+    category folders);
+  * the mtime of every subfolder visited by a recursive run, so folders
+    where nothing was added or removed since are not listed again;
+  * the rules and walk options of the last complete run.
+
+A re-run therefore only lists the root, the subfolders that changed, and
+looks at the handful of files it has not seen before.
+"""
+import json
+import os
+import sqlite3
+
+from organizer import SKIPPED, STATE_DIR, MoveOp, state_root
+
+INDEX_NAME = "state.sqlite"
+COMMIT_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,      -- relative to the destination root
+    name TEXT NOT NULL,
+    ext TEXT NOT NULL,          -- last extension part, upper case
+    category TEXT NOT NULL,
+    sniffed INTEGER NOT NULL    -- category came from the content, not the name
+);
+CREATE INDEX IF NOT EXISTS files_ext ON files (ext);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,      -- relative to the organized folder
+    parent TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+"""
+
+
+def _last_ext(name):
+    parts = name.lstrip(".").rsplit(".", 1)
+    return parts[1].upper() if len(parts) == 2 else ""
+
+def _options_key(options):
+    return json.dumps([options.recursive, options.max_depth, list(options.exclude),
+                       options.sniff, options.date_folders])
+
+
+class StateIndex:
+    """Open index for one root; only used from the run's dispatching thread"""
+
+    def __init__(self, root, rules, options):
+        self.root = root
+        self.dest_root = options.dest_root or root
+        self.rules = rules
+        state_dir = os.path.join(state_root(root, options), STATE_DIR)
+        os.makedirs(state_dir, exist_ok=True)
+        # The executor calls back from the thread that runs the organize, which
+        # is not necessarily the one that opened the index
+        self.db = sqlite3.connect(os.path.join(state_dir, INDEX_NAME), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.pending = 0
+
+        self.old_rules = self._get_meta("rules")
+        self.options_key = _options_key(options)
+        # Directory mtimes are only trusted when the rules and walk options
+        # match the run that recorded them
+        self.trust_dirs = (self._get_meta("options") == self.options_key
+                           and self.old_rules == rules.describe())
+        # path -> mtime_ns taken before the folder was listed
+        self.visited = {}
+        self.failed_dirs = set()
+
+    def _get_meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.root)
+
+    def _dest_rel(self, path):
+        return os.path.relpath(path, self.dest_root)
+
+    def _maybe_commit(self):
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.db.commit()
+            self.pending = 0
+
+    # -- files ---------------------------------------------------------------
+
+    def on_result(self, op, error):
+        """execute_plan hook: remember where each moved file now lives"""
+        if error is not None:
+            self.failed_dirs.add(os.path.dirname(op.src))
+            return
+        if op.outcome == SKIPPED:
+            return
+        if op.mode == "move":
+            # A relocation within the destination
+            self.db.execute("DELETE FROM files WHERE path = ?", (self._dest_rel(op.src),))
+        dest = op.dest
+        expected = self.rules.route(op.filename, self.rules.classify(op.filename),
+                                    lambda: os.stat(dest))
+        self.db.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+            (self._dest_rel(dest), op.filename, _last_ext(op.filename), op.category,
+             int(expected != op.category)))
+        self._maybe_commit()
+
+    def relocations(self):
+        """Yield MoveOps for placed files whose category changed with the rules.
+        Year/month subfolders from date_folders go along when the new
+        category is dated too.
+        """
+        from capture_date import is_dated_category
+
+        new_rules = self.rules.describe()
+        old_rules = self.old_rules
+        if old_rules is None or old_rules == new_rules:
+            return
+
+        if (old_rules["patterns"] != new_rules["patterns"]
+                or old_rules.get("rules", []) != new_rules["rules"]):
+            # Any name may match a changed pattern or routing rule, so check
+            # every file
+            exts = None
+        else:
+            old, new = old_rules["suffixes"], new_rules["suffixes"]
+            changed = {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+            exts = sorted({key.rsplit(".", 1)[-1] for key in changed})
+            if not exts:
+                return
+
+        # Page by rowid so rows rewritten by on_result don't upset the cursor
+        last = 0
+        while True:
+            if exts is None:
+                rows = self.db.execute(
+                    "SELECT rowid, path, name, category FROM files "
+                    "WHERE rowid > ? AND sniffed = 0 ORDER BY rowid LIMIT 1000",
+                    (last,)).fetchall()
+            else:
+                marks = ",".join("?" * len(exts))
+                rows = self.db.execute(
+                    f"SELECT rowid, path, name, category FROM files "
+                    f"WHERE rowid > ? AND sniffed = 0 AND ext IN ({marks}) "
+                    f"ORDER BY rowid LIMIT 1000",
+                    (last, *exts)).fetchall()
+            if not rows:
+                return
+            for rowid, rel, name, category in rows:
+                last = rowid
+                src = os.path.join(self.dest_root, rel)
+                folder_name = self.rules.route(name, self.rules.classify(name),
+                                               lambda: os.stat(src))
+                if folder_name is None or folder_name == category:
+                    continue
+                if not os.path.lexists(src):
+                    # Moved or deleted by someone else since
+                    self.db.execute("DELETE FROM files WHERE rowid = ?", (rowid,))
+                    continue
+                subfolders = ()
+                if is_dated_category(folder_name):
+                    sub = os.path.relpath(os.path.dirname(rel), category)
+                    if sub != os.curdir and not sub.startswith(os.pardir):
+                        subfolders = sub.split(os.sep)
+                # Already organized files are moved whatever the run's mode
+                yield MoveOp(name, src, os.path.join(self.dest_root, folder_name, *subfolders),
+                             folder_name, mode="move")
+
+    # -- directories ---------------------------------------------------------
+
+    def unchanged_children(self, path):
+        """Recorded subfolders of `path` if nothing in it changed since the last
+        complete run, otherwise None (the folder has to be listed).
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        # Taken before listing, so anything arriving during the run, and the
+        # run's own moves out of the folder, make it be listed again next time
+        self.visited[path] = mtime
+        if not self.trust_dirs:
+            return None
+        rel = self._rel(path)
+        row = self.db.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (rel,)).fetchone()
+        if row is None or row[0] != mtime:
+            return None
+        children = self.db.execute("SELECT path FROM dirs WHERE parent = ?", (rel,)).fetchall()
+        return [os.path.join(self.root, child) for (child,) in children]
+
+    # -- end of run ----------------------------------------------------------
+
+    def finish(self, result):
+        """Store directory mtimes and the rules, if the run went all the way"""
+        if not result.cancelled:
+            self.db.execute("DELETE FROM dirs")
+            rows = []
+            for path, mtime in self.visited.items():
+                if path in self.failed_dirs:
+                    continue
+                rel = self._rel(path)
+                rows.append((rel, os.path.dirname(rel), mtime))
+            self.db.executemany("INSERT INTO dirs VALUES (?, ?, ?)", rows)
+            self._set_meta("options", self.options_key)
+            if not result.errors:
+                self._set_meta("rules", self.rules.describe())
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
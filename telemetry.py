@@ -0,0 +1,161 @@
+"""Structured run telemetry: where the time went and what happened to the files.
+
+A RunStats hung on an OrganizePlan (plan.stats) is filled in by the engine:
+
+  * time per phase: scan (listing folders and stat()ing entries), classify,
+    mkdir and move. With several workers, move time is summed over all of
+    them, so it can exceed the wall time;
+  * files and bytes per category;
+  * errors counted by errno name (ENOENT, EACCES...) or exception type;
+  * the N slowest single-file operations.
+
+It exports as a JSON-friendly dict or a one-line key=value summary for logs.
+Collecting it costs a couple of clock reads per file, so it is off unless
+asked for. `profiled()` wraps a run in cProfile or tracemalloc.
+"""
+import errno
+import heapq
+import sys
+import threading
+import time
+
+PHASES = ("scan", "classify", "mkdir", "move")
+SLOWEST = 10
+
+
+def error_key(error):
+    code = getattr(error, "errno", None)
+    if code is not None:
+        return errno.errorcode.get(code, str(code))
+    return type(error).__name__
+
+
+class RunStats:
+    """Telemetry of one run; see the module docstring"""
+
+    def __init__(self, slowest=SLOWEST):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        # category -> [files, bytes]
+        self.categories = {}
+        self.errors = {}
+        self.slowest_count = slowest
+        # Min-heap of (seconds, sequence, src, dest), so the fastest of the
+        # slow ops is the one dropped
+        self._slowest = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.wall = None
+
+    def timed(self, items, phase="scan"):
+        """Pass `items` through, adding the time spent producing each to `phase`"""
+        perf_counter = time.perf_counter
+        it = iter(items)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.phases[phase] += perf_counter() - start
+                return
+            self.phases[phase] += perf_counter() - start
+            yield item
+
+    def add_time(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def op_timed(self, op, seconds):
+        """Record how long one file took; safe to call from worker threads"""
+        with self._lock:
+            self.phases["move"] += seconds
+            self._seq += 1
+            entry = (seconds, self._seq, op.src, op.dest)
+            if len(self._slowest) < self.slowest_count:
+                heapq.heappush(self._slowest, entry)
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def count(self, op, error):
+        if error is not None:
+            key = error_key(error)
+            self.errors[key] = self.errors.get(key, 0) + 1
+            return
+        totals = self.categories.get(op.category)
+        if totals is None:
+            totals = self.categories[op.category] = [0, 0]
+        totals[0] += 1
+        totals[1] += op.size or 0
+
+    def finish(self):
+        self.wall = time.perf_counter() - self._start
+
+    def as_dict(self):
+        phases = dict(self.phases)
+        # Classifying happens inside the scan generator, so take it out
+        phases["scan"] = max(phases["scan"] - phases["classify"], 0.0)
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": round(self.wall, 6) if self.wall is not None else None,
+            "phase_seconds": {k: round(v, 6) for k, v in phases.items()},
+            "categories": {k: {"files": v[0], "bytes": v[1]}
+                           for k, v in sorted(self.categories.items())},
+            "errors": dict(sorted(self.errors.items())),
+            "slowest": [{"seconds": round(s, 6), "src": src, "dest": dest}
+                        for s, _, src, dest in sorted(self._slowest, reverse=True)],
+        }
+
+    def log_line(self):
+        """Compact key=value summary for log files"""
+        data = self.as_dict()
+        files = sum(v[0] for v in self.categories.values())
+        size = sum(v[1] for v in self.categories.values())
+        parts = [f"wall={data['wall_seconds'] or 0:.3f}s", f"files={files}", f"bytes={size}"]
+        parts += [f"{k}={v:.3f}s" for k, v in data["phase_seconds"].items()]
+        parts.append(f"categories={len(self.categories)}")
+        if self.errors:
+            parts.append("errors=" + ",".join(f"{k}:{v}" for k, v in data["errors"].items()))
+        if self._slowest:
+            slowest = max(self._slowest)
+            parts.append(f"slowest={slowest[0]:.3f}s:{slowest[2]}")
+        return "organizer " + " ".join(parts)
+
+
+class profiled:
+    """Context manager running the body under cProfile ("cpu") or tracemalloc
+    ("memory") and printing the top `limit` entries to `stream` afterwards.
+    """
+
+    def __init__(self, kind, stream=None, limit=20):
+        if kind not in ("cpu", "memory"):
+            raise ValueError(f"Unknown profile kind {kind!r}; use cpu or memory")
+        self.kind = kind
+        self.stream = stream or sys.stderr
+        self.limit = limit
+
+    def __enter__(self):
+        if self.kind == "cpu":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            import tracemalloc
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.kind == "cpu":
+            import pstats
+            self.profiler.disable()
+            pstats.Stats(self.profiler, stream=self.stream).sort_stats(
+                "cumulative").print_stats(self.limit)
+        else:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"tracemalloc: {current / 1024:.0f} KB still allocated, "
+                  f"peak {peak / 1024:.0f} KB", file=self.stream)
+            for stat in snapshot.statistics("lineno")[:self.limit]:
+                print(f"  {stat}", file=self.stream)
+        return False
@@ -0,0 +1,422 @@
+"""Moving files to their destination folders.
+
+shutil.move tries a rename and, when that fails across devices, silently
+falls back to a small-buffer copy with no progress. Here the device of
+every source and destination folder is looked up once per run, so:
+
+  * same-device moves are a single atomic os.rename;
+  * cross-device moves are copied with copy_file_range (which lets NFS,
+    CIFS and CoW filesystems copy on the server or share blocks), then
+    sendfile, then plain reads into a large reusable buffer, whichever
+    the platform supports. The copy goes to a temporary name next to the
+    destination and is renamed into place once complete, so an interrupted
+    copy never leaves a truncated file under the real name, and the source
+    is only deleted after that.
+
+Copies report bytes as they go, so a multi-GB video shows progress instead
+of a stalled file count.
+
+When a file of the same name is already at the destination, the collision
+policy decides: "rename" picks the next free "name (n).ext", "skip" leaves
+the file where it is, "overwrite" replaces the existing one, and "dedupe"
+drops the incoming file if it is identical (same size, then same hash) and
+renames it otherwise.
+
+Besides moving, files can be placed by copy (the source is left alone, e.g.
+on read-only media), hardlink or reflink. Hardlinks and reflinks cost no
+data I/O but need both ends on one filesystem (and reflinks a CoW one such
+as Btrfs or XFS); where they can't be made the file is copied instead.
+"""
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+
+# Bytes per copy call; each call is one progress report and cancel check
+COPY_CHUNK = 8 * 1024 * 1024
+# Read/write buffer for the portable fallback
+COPY_BUFFER = 1024 * 1024
+# ioctl number of Linux FICLONE (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+MODES = ("move", "copy", "hardlink", "reflink")
+COLLISION_POLICIES = ("rename", "skip", "overwrite", "dedupe")
+
+# What Mover.place did besides a plain placement, kept in MoveOp.outcome
+RENAMED = "renamed"
+SKIPPED = "skipped"
+DUPLICATE = "duplicate"
+
+# errnos meaning "this copy primitive doesn't work for these two files"
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF, errno.ENOTTY,
+                getattr(errno, "EOPNOTSUPP", errno.EINVAL),
+                getattr(errno, "ENOTSUP", errno.EINVAL)}
+
+# errnos meaning "this filesystem doesn't do hardlinks"
+_NO_HARDLINKS = {errno.EPERM, errno.EMLINK, errno.ENOSYS,
+                 getattr(errno, "EOPNOTSUPP", errno.EPERM),
+                 getattr(errno, "ENOTSUP", errno.EPERM)}
+
+
+class CopyCancelled(Exception):
+    """Raised out of copy_file when `should_stop` says so; nothing is left behind"""
+
+
+def _copy_range(infd, outfd, on_bytes, should_stop):
+    copied = 0
+    while True:
+        if should_stop is not None and should_stop():
+            raise CopyCancelled()
+        n = os.copy_file_range(infd, outfd, COPY_CHUNK)
+        if n == 0:
+            return copied
+        copied += n
+        if on_bytes is not None:
+            on_bytes(n)
+
+def _copy_sendfile(infd, outfd, on_bytes, should_stop):
+    copied = 0
+    while True:
+        if should_stop is not None and should_stop():
+            raise CopyCancelled()
+        n = os.sendfile(outfd, infd, copied, COPY_CHUNK)
+        if n == 0:
+            return copied
+        copied += n
+        if on_bytes is not None:
+            on_bytes(n)
+
+def _copy_buffered(infd, outfd, on_bytes, should_stop):
+    buf = bytearray(COPY_BUFFER)
+    view = memoryview(buf)
+    copied = 0
+    since_check = 0
+    while True:
+        n = os.readv(infd, [buf]) if hasattr(os, "readv") else _read_into(infd, buf)
+        if n == 0:
+            if on_bytes is not None and since_check:
+                on_bytes(since_check)
+            return copied
+        written = 0
+        while written < n:
+            written += os.write(outfd, view[written:n])
+        copied += n
+        since_check += n
+        if since_check >= COPY_CHUNK:
+            if on_bytes is not None:
+                on_bytes(since_check)
+            since_check = 0
+            if should_stop is not None and should_stop():
+                raise CopyCancelled()
+
+def _read_into(fd, buf):
+    data = os.read(fd, len(buf))
+    buf[:len(data)] = data
+    return len(data)
+
+def _copy_strategies():
+    strategies = []
+    if hasattr(os, "copy_file_range"):
+        strategies.append(_copy_range)
+    # sendfile only takes a regular file as output on Linux
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        strategies.append(_copy_sendfile)
+    return strategies
+
+
+def copy_file(src, dest, on_bytes=None, should_stop=None, overwrite=True):
+    """Copy `src` to `dest` with its metadata, through a temporary name.
+
+    `on_bytes(n)` is called as data is copied. When `should_stop()` returns
+    True between chunks the partial copy is removed and CopyCancelled raised.
+    Without `overwrite`, a file already at `dest` raises FileExistsError.
+    """
+    tmp = _temp_path(dest)
+    reported = 0
+
+    def count(n):
+        nonlocal reported
+        reported += n
+        if on_bytes is not None:
+            on_bytes(n)
+
+    try:
+        with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+            infd, outfd = fsrc.fileno(), fdst.fileno()
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(infd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            done = False
+            for strategy in _copy_strategies():
+                try:
+                    strategy(infd, outfd, count, should_stop)
+                    done = True
+                    break
+                except OSError as e:
+                    # Only fall back if nothing was written, otherwise the
+                    # error is real (disk full, I/O error...)
+                    if e.errno not in _UNSUPPORTED or reported:
+                        raise
+            if not done:
+                _copy_buffered(infd, outfd, count, should_stop)
+        shutil.copystat(src, tmp)
+        _finish(tmp, dest, overwrite)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        # Bytes of an unfinished copy no longer count as done
+        if on_bytes is not None and reported:
+            on_bytes(-reported)
+        raise
+    return reported
+
+
+def numbered_name(filename, n):
+    """"photo.jpg" -> "photo (n).jpg", keeping compound extensions like .tar.gz"""
+    stem, ext = os.path.splitext(filename)
+    if stem.lower().endswith(".tar"):
+        stem, ext = stem[:-4], stem[-4:] + ext
+    return f"{stem} ({n}){ext}"
+
+def _temp_path(dest):
+    folder, name = os.path.split(dest)
+    return os.path.join(folder, f".{name}.{os.getpid()}.part")
+
+def rename_new(src, dest):
+    """Rename `src` to `dest`, raising FileExistsError rather than replacing
+    a file that is already there, even one that appeared a moment ago
+    """
+    if os.name == "nt":
+        # Windows' rename never replaces an existing file
+        os.rename(src, dest)
+        return
+    try:
+        # link() fails atomically if `dest` exists, unlike rename()
+        os.link(src, dest, follow_symlinks=False)
+    except OSError as e:
+        if e.errno not in _NO_HARDLINKS:
+            raise
+        # A filesystem without hardlinks: check, then rename
+        if os.path.lexists(dest):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dest)
+        os.rename(src, dest)
+        return
+    os.unlink(src)
+
+def _make_link(make, dest, overwrite):
+    """Create a link at `dest` with `make(path)`; os.link and os.symlink
+    refuse an existing path, so an overwrite goes through a temporary name
+    """
+    if not overwrite:
+        make(dest)
+        return
+    tmp = _temp_path(dest)
+    make(tmp)
+    try:
+        os.replace(tmp, dest)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _finish(tmp, dest, overwrite):
+    """Move a completed temporary file into place"""
+    if overwrite:
+        os.replace(tmp, dest)
+    else:
+        rename_new(tmp, dest)
+
+def reflink_file(src, dest, overwrite=True):
+    """Make `dest` a copy-on-write clone of `src`; OSError if the filesystem can't"""
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflinks are only supported on Linux")
+    import fcntl
+
+    tmp = _temp_path(dest)
+    try:
+        with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, tmp)
+        _finish(tmp, dest, overwrite)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class Mover:
+    """Places files in `mode`, renaming or linking within a device and
+    copying across devices.
+
+    The device of each folder is stat()ed once and cached, so deciding how
+    to place a file costs two dict lookups. Safe to share between threads.
+    `on_bytes(n)` follows the bytes of copies still in flight; they are
+    taken back once a copy is done, as the caller then counts the file whole.
+    """
+
+    def __init__(self, on_bytes=None, mode="move", collisions="rename", hashes=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown transfer mode {mode!r}; use one of {', '.join(MODES)}")
+        if collisions not in COLLISION_POLICIES:
+            raise ValueError(f"Unknown collision policy {collisions!r}; "
+                             f"use one of {', '.join(COLLISION_POLICIES)}")
+        self.on_bytes = on_bytes
+        self.mode = mode
+        self.collisions = collisions
+        # hashing.HashCache for the dedupe policy
+        self.hashes = hashes
+        # Destinations being written right now, so two workers never pick
+        # the same free name
+        self._claimed = set()
+        self._devices = {}
+        # (source folder, destination folder) pairs where a rename or link
+        # failed even though st_dev matched, e.g. across bind mounts
+        self._no_rename = set()
+        # Likewise for filesystems that turned down a reflink
+        self._no_reflink = set()
+        self._lock = threading.Lock()
+        self.renamed = 0
+        self.linked = 0
+        self.copied = 0
+        self.bytes_copied = 0
+
+    def device(self, folder):
+        dev = self._devices.get(folder)
+        if dev is None:
+            dev = self._devices[folder] = os.stat(folder).st_dev
+        return dev
+
+    def same_device(self, src_folder, dest_folder):
+        if (src_folder, dest_folder) in self._no_rename:
+            return False
+        return self.device(src_folder) == self.device(dest_folder)
+
+    def _claim(self, dest):
+        with self._lock:
+            if dest in self._claimed:
+                return False
+            self._claimed.add(dest)
+            return True
+
+    def _release(self, dest):
+        with self._lock:
+            self._claimed.discard(dest)
+
+    def place(self, op, should_stop=None):
+        """Put the file of a MoveOp into its destination folder, applying the
+        collision policy. Sets `op.outcome` (None, RENAMED, SKIPPED or
+        DUPLICATE), and `op.filename` to the name the file (or its identical
+        twin) ends up under.
+        """
+        mode = op.mode or self.mode
+        name = op.filename
+        n = 0
+        while True:
+            dest = os.path.join(op.dest_folder, name)
+            if not self._claim(dest):
+                # Another worker is placing a file under this name right now
+                if self.collisions == "overwrite":
+                    time.sleep(0.01)
+                    continue
+                exists = True
+            else:
+                # Checked after claiming: a finished file exists on disk
+                # before its claim is released
+                exists = os.path.lexists(dest)
+            if not exists or self.collisions == "overwrite":
+                break
+            self._release(dest)
+
+            if self.collisions == "skip":
+                op.outcome = SKIPPED
+                return
+            if self.collisions == "dedupe" and os.path.lexists(dest):
+                from hashing import same_content
+                try:
+                    duplicate = same_content(op.src, dest, self.hashes)
+                except OSError:
+                    duplicate = False
+                if duplicate:
+                    if mode == "move":
+                        os.unlink(op.src)
+                    op.outcome = DUPLICATE
+                    # The name of the identical file
+                    op.filename = name
+                    return
+            n += 1
+            name = numbered_name(op.filename, n)
+
+        try:
+            self.move(op.src, dest, should_stop, mode,
+                      overwrite=self.collisions == "overwrite")
+        finally:
+            self._release(dest)
+        op.outcome = RENAMED if n else None
+        op.filename = name
+
+    def move(self, src, dest, should_stop=None, mode=None, overwrite=False):
+        """Place the file `src` at the path `dest` (not a folder).
+
+        `mode` overrides the Mover's mode for this one file. A file already
+        at `dest` is replaced with `overwrite`, otherwise FileExistsError is
+        raised.
+        """
+        mode = mode or self.mode
+        pair = (os.path.dirname(src), os.path.dirname(dest))
+        same_device = self.same_device(*pair)
+
+        if same_device and mode == "move":
+            try:
+                if overwrite:
+                    os.replace(src, dest)
+                else:
+                    rename_new(src, dest)
+                with self._lock:
+                    self.renamed += 1
+                return
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                self._no_rename.add(pair)
+        elif same_device and mode == "hardlink":
+            try:
+                _make_link(lambda path: os.link(src, path, follow_symlinks=False),
+                           dest, overwrite)
+                with self._lock:
+                    self.linked += 1
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+                self._no_rename.add(pair)
+        elif same_device and mode == "reflink" and pair not in self._no_reflink \
+                and not os.path.islink(src):
+            try:
+                reflink_file(src, dest, overwrite)
+                with self._lock:
+                    self.linked += 1
+                return
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                self._no_reflink.add(pair)
+
+        if os.path.islink(src):
+            target = os.readlink(src)
+            _make_link(lambda path: os.symlink(target, path), dest, overwrite)
+            size = 0
+        else:
+            size = copy_file(src, dest, self.on_bytes, should_stop, overwrite)
+            if self.on_bytes is not None and size:
+                # The finished file is counted whole once its op completes
+                self.on_bytes(-size)
+        if mode == "move":
+            os.unlink(src)
+        with self._lock:
+            self.copied += 1
+            self.bytes_copied += size
@@ -0,0 +1,265 @@
+"""Watch-folder mode: keep organizing files as they arrive in a drop folder.
+
+On Linux the folder is watched with inotify (through ctypes, no extra
+packages); elsewhere, or with `use_inotify=False`, it is polled, and only
+re-listed when the folder's own mtime changes. Either way the work per
+batch scales with the number of new files, not with the folder size.
+
+New names are collected until the folder has been quiet for `debounce`
+seconds (or for at most `max_delay` seconds during a constant stream), then each file must show the same size and mtime on two looks at
+least `settle` seconds apart before it is moved, so files that are still
+being written are left alone.
+"""
+import os
+import stat
+import struct
+import sys
+import time
+
+from organizer import (
+    STATE_DIR,
+    FolderCache,
+    OrganizePlan,
+    RunControl,
+    as_index,
+    category_roots,
+    check_dest,
+    classify_entries,
+    execute_plan,
+    iter_moves,
+    state_root,
+)
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Reports names created, written or moved into `folder` (not recursive)"""
+
+    def __init__(self, folder):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder}")
+
+    def wait(self, timeout):
+        """Names that changed within `timeout` seconds, or None if events were lost"""
+        import select
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if length and not mask & IN_ISDIR:
+                    name = data[offset:offset + length].rstrip(b"\0")
+                    names.add(os.fsdecode(name))
+                offset += length
+
+    def discard(self, names):
+        pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback watcher; re-lists the folder only when its mtime changes"""
+
+    def __init__(self, folder, interval=2.0):
+        self.folder = folder
+        self.interval = interval
+        self.mtime = None
+        self.names = set()
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return set()
+        if mtime == self.mtime:
+            return set()
+        self.mtime = mtime
+        with os.scandir(self.folder) as it:
+            names = {entry.name for entry in it if not entry.is_dir()}
+        new = names - self.names
+        self.names = names
+        return new
+
+    def discard(self, names):
+        """Forget `names` once their files have left the folder, so a new
+        file of the same name is reported even before the next listing
+        """
+        self.names.difference_update(names)
+
+    def close(self):
+        pass
+
+
+def make_watcher(folder, use_inotify=None, poll_interval=2.0):
+    if use_inotify is None:
+        use_inotify = sys.platform.startswith("linux")
+    if use_inotify:
+        try:
+            return InotifyWatcher(folder)
+        except OSError as e:
+            print(f"inotify unavailable ({e}); polling instead", file=sys.stderr)
+    return PollingWatcher(folder, poll_interval)
+
+
+class Arrival:
+    """A settled new file, standing in for the DirEntry classify_entries()
+    expects; its stat is the one the stability check took
+    """
+    __slots__ = ("name", "path", "_stat")
+
+    def __init__(self, folder, name, st):
+        self.name = name
+        self.path = os.path.join(folder, name)
+        self._stat = st
+
+    def stat(self):
+        return self._stat
+
+
+class StabilityTracker:
+    """Decides when newly seen files have stopped changing"""
+
+    def __init__(self, settle):
+        self.settle = settle
+        # name -> ((size, mtime_ns), time first seen with that signature)
+        self.pending = {}
+
+    def touch(self, name):
+        self.pending[name] = None
+
+    def ready(self, folder, now):
+        """Remove and return (name, stat) for the files whose size and mtime
+        have settled
+        """
+        ready = []
+        for name, seen in list(self.pending.items()):
+            try:
+                st = os.stat(os.path.join(folder, name))
+            except OSError:
+                del self.pending[name]
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                del self.pending[name]
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if seen is None or seen[0] != sig:
+                self.pending[name] = (sig, now)
+            elif now - seen[1] >= self.settle:
+                del self.pending[name]
+                ready.append((name, st))
+        return ready
+
+
+def watch(folder, ext_map, options, debounce=2.0, settle=2.0, poll_interval=2.0,
+          max_delay=30.0, use_inotify=None, initial_pass=True, control=None,
+          on_batch=None):
+    """Organize `folder` now and then keep organizing new arrivals until
+    `control` is cancelled. `on_batch(result)` is called after each batch.
+    """
+    check_dest(folder, options)
+    index = as_index(ext_map)
+    control = control or RunControl()
+    dest_root = options.dest_root or folder
+    roots = category_roots(index) if dest_root == folder else ()
+
+    watcher = make_watcher(folder, use_inotify, poll_interval)
+    tracker = StabilityTracker(settle)
+    # Shared by every batch so each category folder is made once per session
+    folders = FolderCache()
+    last_event = 0.0
+    # When the oldest name still waiting for a batch was seen
+    batch_started = None
+
+    def new_plan():
+        plan = OrganizePlan(folder)
+        plan.folders = folders
+        plan.state_root = state_root(folder, options)
+        return plan
+
+    try:
+        if initial_pass:
+            # Started after the watcher so nothing arriving meanwhile is missed
+            plan = new_plan()
+            result = execute_plan(plan, workers=options.workers, control=control,
+                                  moves=iter_moves(plan, index, options), mode=options.mode,
+                                  collisions=options.collisions)
+            if on_batch is not None:
+                on_batch(result)
+
+        while control.checkpoint():
+            timeout = min(debounce, settle) if tracker.pending else 1.0
+            names = watcher.wait(timeout)
+            now = time.monotonic()
+            if names is None:
+                # The kernel queue overflowed: fall back to one full listing
+                with os.scandir(folder) as it:
+                    names = {entry.name for entry in it if not entry.is_dir()}
+            for name in names:
+                if name == STATE_DIR or name in roots:
+                    continue
+                tracker.touch(name)
+                last_event = now
+                if batch_started is None:
+                    batch_started = now
+
+            if not tracker.pending:
+                batch_started = None
+                continue
+            if now - last_event < debounce and now - batch_started < max_delay:
+                continue
+            ready = tracker.ready(folder, now)
+            if not ready:
+                continue
+            batch_started = now if tracker.pending else None
+
+            # Sniffed and dated the same way as the initial pass
+            plan = new_plan()
+            moves = list(classify_entries(plan, index,
+                                          [Arrival(folder, name, st) for name, st in ready],
+                                          options))
+            if not moves:
+                continue
+            result = execute_plan(plan, workers=options.workers, moves=moves,
+                                  control=control, mode=options.mode,
+                                  collisions=options.collisions)
+            # op.filename may now be the numbered or duplicate's name
+            watcher.discard(os.path.basename(op.src) for op in moves
+                            if not os.path.lexists(op.src))
+            if on_batch is not None:
+                on_batch(result)
+    finally:
+        watcher.close()